@@ -1,11 +1,32 @@
 import os
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from src.routers import project_router, label_router, auth_router
+from src.core import config
+from src.core.compression import CompressionMiddleware
+from src.core.request_timing import RequestTimingMiddleware
+from src.core.ocr_jobs import job_manager
+from src.core.bulk_detection import bulk_detection
+from src.core.previews import previews
+from src.database.database import init_db
+from src.routers import (
+    project_router, label_router, auth_router, engine_router, job_router, storage_router, metrics_router
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    if config.OCR_PRELOAD_ENGINES:
+        job_manager.preload(config.OCR_PRELOAD_ENGINES)
+    if config.BULK_DETECTION_RESUME:
+        bulk_detection.resume_interrupted()
+    yield
+    job_manager.shutdown()
+    previews.shutdown()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
 def read_root():
@@ -17,8 +38,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Trace-Id"],
 )
 
+if config.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware, minimum_size=config.COMPRESSION_MINIMUM_SIZE)
+
+if config.METRICS_ENABLED or config.TRACING_ENABLED:
+    # Added last so it is outermost and times everything, compression included
+    app.add_middleware(RequestTimingMiddleware)
+
 if not os.path.exists("uploads"):
     os.makedirs("uploads")
 
@@ -26,6 +55,11 @@ app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 app.include_router(project_router.router)
 app.include_router(label_router.router)
 app.include_router(auth_router.router)
+app.include_router(engine_router.router)
+app.include_router(job_router.router)
+app.include_router(storage_router.router)
+if config.METRICS_ENABLED:
+    app.include_router(metrics_router.router)
 
 if __name__ == "__main__":
   uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,186 @@
+"""HTTP load test of the annotation workflow: upload, detect, label edit, export.
+
+Run from app-backend/:
+    python -m benchmarks.bench_api_load [--users 8] [--iterations 10] [--engine stub] [--save]
+    python -m benchmarks.bench_api_load --url http://localhost:8000 --engine onnx
+
+Without ``--url`` the app is served by uvicorn inside this process, from a
+temporary working directory (fresh database, uploads and caches), with
+detection jobs on threads so the stub engine is visible to them and the OCR
+cache off so every detection really runs. Each virtual user creates its own
+project and repeats: upload one synthetic page, list it, detect text on it,
+edit the first label and, every ``--export-every`` iterations, download the
+project export. Reports throughput and p50/p95/p99 latency per operation.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from benchmarks import results as bench_results
+from benchmarks.synthetic_pages import encode, make_page
+
+OPERATIONS = ("upload", "list", "detect", "edit", "export")
+
+def _start_server(stub_args: dict) -> tuple:
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'load.db')}"
+    os.environ["OCR_WORKER_MODE"] = "thread"
+    os.environ["OCR_CACHE_ENABLED"] = "0"
+
+    import uvicorn
+    from app import app
+
+    if stub_args is not None:
+        from benchmarks import stub_engine
+        stub_engine.install(**stub_args)
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="bench-server", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise SystemExit("Server failed to start")
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return f"http://127.0.0.1:{port}", server, thread
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return {"mean_ms": statistics.fmean(samples) * 1000, "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+async def _user(client, user: int, pages: list, args, timings: dict, errors: dict):
+    async def timed(operation: str, request):
+        started = time.perf_counter()
+        try:
+            response = await request
+            response.raise_for_status()
+            return response
+        except Exception:
+            errors[operation] += 1
+            return None
+        finally:
+            timings[operation].append(time.perf_counter() - started)
+
+    response = await client.post("/api/projects", json={"name": f"load-{user}", "mode": "bbox"})
+    response.raise_for_status()
+    project_id = response.json()["id"]
+    last_image_id = None
+    for iteration in range(args.iterations):
+        page = pages[(user * args.iterations + iteration) % len(pages)]
+        files = [("files", (f"u{user}-{iteration}.jpg", page, "image/jpeg"))]
+        if await timed("upload", client.post(f"/api/projects/{project_id}/images/upload", files=files)) is None:
+            continue
+        params = {"limit": 1} if last_image_id is None else {"limit": 1, "cursor": last_image_id}
+        response = await timed("list", client.get(f"/api/projects/{project_id}/images", params=params))
+        if response is None or not response.json():
+            continue
+        last_image_id = response.json()[0]["id"]
+
+        response = await timed("detect", client.post(
+            f"/api/projects/{project_id}/images/{last_image_id}/detect-text",
+            params={"engine": args.engine_name, "use_cache": "false"},
+        ))
+        labels = response.json() if response is not None else []
+        if labels:
+            await timed("edit", client.put(f"/api/labels/{labels[0]['id']}", json={"text": "edited"}))
+        if args.export_every and (iteration + 1) % args.export_every == 0:
+            await timed("export", client.get(f"/api/labels/project/{project_id}/export"))
+
+async def _run(base_url: str, pages: list, args) -> dict:
+    import httpx
+
+    timings, errors = defaultdict(list), defaultdict(int)
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(_user(client, user, pages, args, timings, errors) for user in range(args.users)))
+        wall = time.perf_counter() - started
+
+    operations = {}
+    for operation in OPERATIONS:
+        samples = timings.get(operation)
+        if samples:
+            operations[operation] = dict(
+                _percentiles(samples), count=len(samples), errors=errors[operation], throughput_per_s=len(samples) / wall
+            )
+    requests = sum(len(samples) for samples in timings.values())
+    return {
+        "engine": args.engine,
+        "users": args.users,
+        "iterations": args.iterations,
+        "wall_s": wall,
+        "requests": requests,
+        "errors": sum(errors.values()),
+        "throughput_per_s": requests / wall,
+        "operations": operations,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="target a running server instead of an in-process one")
+    parser.add_argument("--engine", default="stub", choices=["stub", "easyocr", "paddle", "onnx"])
+    parser.add_argument("--users", type=int, default=8, help="concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=10, help="uploads per user")
+    parser.add_argument("--export-every", type=int, default=5, help="export after every N uploads, 0 = never")
+    parser.add_argument("--pages", type=int, default=16, help="distinct synthetic pages to cycle through")
+    parser.add_argument("--width", type=int, default=1600)
+    parser.add_argument("--height", type=int, default=1200)
+    parser.add_argument("--lines", type=int, default=20)
+    parser.add_argument("--stub-detect-ms", type=float, default=50.0)
+    parser.add_argument("--stub-recognize-ms", type=float, default=20.0, help="per recognizer batch")
+    parser.add_argument("--stub-per-crop-ms", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--save", action="store_true", help="save under benchmarks/results/ for later comparison")
+    args = parser.parse_args()
+    if args.url and args.engine == "stub":
+        parser.error("--engine stub only works with the in-process server")
+    args.engine_name = "onnx" if args.engine == "stub" else args.engine
+    output = os.path.abspath(args.output) if args.output else None
+
+    pages = [encode(make_page(seed, args.width, args.height, args.lines)[0]) for seed in range(args.pages)]
+    server = None
+    if args.url:
+        base_url = args.url
+    else:
+        stub_args = None
+        if args.engine == "stub":
+            stub_args = {
+                "detect_ms": args.stub_detect_ms,
+                "recognize_ms": args.stub_recognize_ms,
+                "per_crop_ms": args.stub_per_crop_ms,
+            }
+        base_url, server, thread = _start_server(stub_args)
+
+    try:
+        results = asyncio.run(_run(base_url, pages, args))
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join(timeout=30)
+
+    print(
+        f"{results['engine']}: {results['users']} users x {results['iterations']} iterations, "
+        f"{results['requests']} requests in {results['wall_s']:.1f}s ({results['throughput_per_s']:.1f}/s), "
+        f"{results['errors']} errors"
+    )
+    print(f"{'operation':<10}{'count':>7}{'errors':>8}{'per s':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for operation, r in results["operations"].items():
+        print(
+            f"{operation:<10}{r['count']:>7}{r['errors']:>8}{r['throughput_per_s']:>8.2f}"
+            f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+        )
+    if output or args.save:
+        saved_args = {key: value for key, value in vars(args).items() if key != "engine_name"}
+        path = bench_results.save("api_load", results, saved_args, output)
+        print(f"Saved {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Authentication overhead per request, with and without the token cache.
+
+Run from app-backend/:  python -m benchmarks.bench_auth_overhead [--requests 2000] [--logins 20]
+
+``dependency`` times ``get_current_user`` alone: "uncached" clears the token
+cache before every call (JWT decode + one SELECT on users, the old path),
+"cached" hits it. ``http`` compares an unauthenticated endpoint with
+``/api/auth/me`` through the full ASGI stack. ``login`` times bcrypt
+verification on the dedicated executor while other requests keep flowing.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'auth.db')}"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app import app  # noqa: E402
+from src.core.auth import create_access_token, get_current_user, token_cache  # noqa: E402
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return {"mean_ms": statistics.fmean(samples) * 1000, "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+def bench_dependency(token: str, requests: int, cached: bool) -> dict:
+    async def measure():
+        timings = []
+        await get_current_user(token)
+        for _ in range(requests):
+            if not cached:
+                token_cache.clear()
+            started = time.perf_counter()
+            await get_current_user(token)
+            timings.append(time.perf_counter() - started)
+        return timings
+    return _percentiles(asyncio.run(measure()))
+
+def bench_http(client: TestClient, path: str, headers: dict, requests: int, cached: bool = True) -> dict:
+    timings = []
+    for _ in range(requests):
+        if not cached:
+            token_cache.clear()
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        timings.append(time.perf_counter() - started)
+        response.raise_for_status()
+    return _percentiles(timings)
+
+def bench_login(client: TestClient, logins: int) -> dict:
+    timings = []
+    for _ in range(logins):
+        started = time.perf_counter()
+        client.post("/api/auth/token", data={"username": "bench", "password": "bench-password"}).raise_for_status()
+        timings.append(time.perf_counter() - started)
+    return _percentiles(timings)
+
+def run(requests: int, logins: int) -> dict:
+    with TestClient(app) as client:
+        client.post(
+            "/api/auth/register",
+            json={"username": "bench", "email": "bench@example.com", "password": "bench-password"},
+        ).raise_for_status()
+        token = create_access_token({"sub": "bench"})
+        headers = {"Authorization": f"Bearer {token}"}
+        return {
+            "dependency": {
+                "uncached": bench_dependency(token, requests, cached=False),
+                "cached": bench_dependency(token, requests, cached=True),
+            },
+            "http": {
+                "no_auth": bench_http(client, "/", {}, requests),
+                "uncached": bench_http(client, "/api/auth/me", headers, requests, cached=False),
+                "cached": bench_http(client, "/api/auth/me", headers, requests),
+            },
+            "login": {"bcrypt": bench_login(client, logins)},
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run(args.requests, args.logins)
+    print(f"{'scenario':<12}{'setup':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for scenario, setups in results.items():
+        for setup, r in setups.items():
+            print(f"{scenario:<12}{setup:<10}{r['mean_ms']:>10.3f}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Per-request database overhead, before and after startup-time schema init and SQLite tuning.
+
+Run from app-backend/:  python -m benchmarks.bench_db_overhead [--requests 2000] [--writes 500]
+
+"before" reproduces the old setup: default SQLite pragmas and
+``Base.metadata.create_all`` inside every ``get_db`` call. "after" is the
+current ``src.database.database`` configuration.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from src.database.database import _set_sqlite_pragmas
+from src.models import detection_run, label, project, user  # noqa: F401
+from src.models.base import Base
+from src.models.label import Label
+from src.models.project import Image, Project
+
+def _make_session_factory(path: str, tuned: bool):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    if tuned:
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _seed(Session) -> int:
+    db = Session()
+    project = Project(name="bench", mode="bbox")
+    db.add(project)
+    db.flush()
+    image = Image(project_id=project.id, filename="a.png", file_path="uploads/a.png")
+    db.add(image)
+    db.commit()
+    image_id = image.id
+    db.close()
+    return image_id
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return {"mean_ms": statistics.fmean(samples) * 1000, "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+def bench_read_requests(engine, Session, image_id: int, requests: int, create_all_per_request: bool):
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        if create_all_per_request:
+            Base.metadata.create_all(bind=engine)
+        db = Session()
+        try:
+            db.query(Label).filter(Label.image_id == image_id).all()
+        finally:
+            db.close()
+        timings.append(time.perf_counter() - started)
+    return _percentiles(timings)
+
+def bench_label_writes(Session, image_id: int, writes: int):
+    # One commit per label, like an annotator saving boxes one by one
+    timings = []
+    db = Session()
+    try:
+        for i in range(writes):
+            started = time.perf_counter()
+            db.add(Label(image_id=image_id, x=i, y=i, width=10, height=10, text="x"))
+            db.commit()
+            timings.append(time.perf_counter() - started)
+    finally:
+        db.close()
+    return _percentiles(timings)
+
+def run(requests: int, writes: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, tuned, create_all in (("before", False, True), ("after", True, False)):
+            path = os.path.join(tmp, f"{name}.db")
+            engine, Session = _make_session_factory(path, tuned)
+            image_id = _seed(Session)
+            results[name] = {
+                "read_request": bench_read_requests(engine, Session, image_id, requests, create_all),
+                "label_write": bench_label_writes(Session, image_id, writes),
+            }
+            engine.dispose()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--writes", type=int, default=500)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run(args.requests, args.writes)
+    print(f"{'scenario':<14}{'setup':<8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for scenario in ("read_request", "label_write"):
+        for setup in ("before", "after"):
+            r = results[setup][scenario]
+            print(f"{scenario:<14}{setup:<8}{r['mean_ms']:>10.3f}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""The ``llm`` engine against the in-process mock server: concurrency, rate limits, retries, cache.
+
+Run from app-backend/:
+    python -m benchmarks.bench_llm_engine [--mode crops|page] [--images 8] [--latency-ms 300] [--error-rate 0.1]
+
+Pages are processed from several threads at once, like detection jobs in
+thread mode, twice: cold, then again with every reply in the on-disk cache.
+In ``crops`` mode the stub detector finds the synthetic text lines and the
+LLM reads the crops ``--crops-per-request`` at a time; in ``page`` mode the
+LLM gets whole pages. Reports wall time, requests sent and refused, the
+highest number of requests the server saw in flight and cache hits.
+"""
+import argparse
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", default="crops", choices=["crops", "page"])
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--lines", type=int, default=30)
+    parser.add_argument("--threads", type=int, default=4, help="pages processed at once")
+    parser.add_argument("--crops-per-request", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM_MAX_CONCURRENCY")
+    parser.add_argument("--rpm", type=float, default=0, help="LLM_REQUESTS_PER_MINUTE, 0 = unlimited")
+    parser.add_argument("--server-rpm", type=int, default=0, help="requests a minute the mock accepts")
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    from benchmarks import mock_llm_server
+    base_url, server_stats, _ = mock_llm_server.start(
+        latency_ms=args.latency_ms, error_rate=args.error_rate, requests_per_minute=args.server_rpm
+    )
+    from benchmarks.stub_engine import StubDetector
+    from benchmarks.synthetic_pages import make_page
+    from src.core import config, llm_engine
+
+    # load_models() reads these when the engine loads
+    config.LLM_BASE_URL = base_url
+    config.LLM_MODEL = "mock"
+    config.LLM_CROPS_PER_REQUEST = args.crops_per_request
+    config.LLM_MAX_CONCURRENCY = args.concurrency
+    config.LLM_REQUESTS_PER_MINUTE = args.rpm
+    config.LLM_TOKENS_PER_MINUTE = 0
+    config.LLM_CACHE_ENABLED = True
+    config.LLM_CACHE_DIR = tempfile.mkdtemp()
+    from src.core.engine_registry import EngineHandle, register_engine
+    from src.services.text_recognition_service import TextRecognitionService
+
+    def load():
+        models = llm_engine.load_models()
+        if args.mode == "crops":
+            models["detector"] = StubDetector()
+        return models
+
+    handle = EngineHandle("llm", load, lambda models: None, version=f"mock-{args.mode}", thread_safe=True)
+    register_engine(handle)
+    pages = [make_page(seed, 1600, 1200, args.lines)[0] for seed in range(args.images)]
+    import numpy as np
+    arrays = [np.asarray(page) for page in pages]
+    service = TextRecognitionService("llm", tile_min_side=0)
+    cache = handle.load()["recognizer"].cache
+
+    for run in ("cold", "cached"):
+        requests_before = server_stats["requests"]
+        hits_before = cache.hits
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            labels = list(pool.map(service.process_image, arrays))
+        wall = time.perf_counter() - started
+        print(
+            f"{run:<7} {len(arrays)} pages, {sum(map(len, labels))} labels in {wall:.2f}s; "
+            f"{server_stats['requests'] - requests_before} requests, cache hits {cache.hits - hits_before}"
+        )
+    print(
+        f"server: {server_stats['completed']} completed, {server_stats['injected_errors']} injected errors, "
+        f"{server_stats['rate_limited']} refused over --server-rpm, max {server_stats['max_in_flight']} in flight"
+    )
+
+if __name__ == "__main__":
+    main()
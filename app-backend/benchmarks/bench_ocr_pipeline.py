@@ -0,0 +1,150 @@
+"""Per-stage timings of TextRecognitionService on synthetic pages.
+
+Run from app-backend/:
+    python -m benchmarks.bench_ocr_pipeline [--engine stub|easyocr|paddle|onnx] [--images 50] [--save]
+
+Every page is written to disk as a JPEG first and processed from its path,
+like a detection job does. Stages: ``decode`` (read + decode + EXIF),
+``detect``, ``crop`` (slicing views out of the decoded buffer; EasyOCR crops
+inside ``recognize``), ``recognize`` and ``persist`` (bulk label insert into
+a throwaway SQLite database). ``model_load_s`` is the one-time engine load,
+and one warm-up page is processed before anything is measured.
+
+``--tile-min-side`` overrides OCR_TILE_MIN_SIDE, e.g. ``--height 6000
+--tile-min-side 4000`` against ``--tile-min-side 0`` compares tiled with
+whole-image detection.
+
+``--engine stub`` needs no models: its detector finds the synthetic text
+lines with a projection profile and the ``--stub-*-ms`` sleeps stand in for
+model latency, so the numbers isolate everything around the models.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from typing import Optional
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'pipeline.db')}"
+
+from benchmarks import results as bench_results  # noqa: E402
+from benchmarks import stub_engine  # noqa: E402
+from benchmarks.synthetic_pages import encode, make_page  # noqa: E402
+from src.core.engine_registry import get_engine  # noqa: E402
+from src.database.database import SessionLocal, init_db  # noqa: E402
+from src.models.project import Image, Project  # noqa: E402
+from src.services.label_service import LabelService  # noqa: E402
+from src.services.text_recognition_service import TextRecognitionService  # noqa: E402
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return {"mean_ms": statistics.fmean(samples) * 1000, "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+def _pages(count: int, width: int, height: int, lines: int) -> list:
+    paths = []
+    for seed in range(count + 1):
+        image, _ = make_page(seed, width, height, lines)
+        path = os.path.join(_tmp, f"page-{seed}.jpg")
+        with open(path, "wb") as f:
+            f.write(encode(image))
+        paths.append(path)
+    return paths
+
+def _seed_images(paths: list) -> list:
+    db = SessionLocal()
+    try:
+        project = Project(name="bench", mode="bbox")
+        db.add(project)
+        db.flush()
+        images = [Image(project_id=project.id, filename=os.path.basename(p), file_path=p) for p in paths]
+        db.add_all(images)
+        db.commit()
+        return [image.id for image in images]
+    finally:
+        db.close()
+
+def run(engine: str, count: int, width: int, height: int, lines: int, stub_args: dict,
+        tile_min_side: Optional[int] = None) -> dict:
+    init_db()
+    if engine == "stub":
+        stub_engine.install(**stub_args)
+    paths = _pages(count, width, height, lines)
+    image_ids = _seed_images(paths)
+
+    current = {}
+    service = TextRecognitionService(
+        "onnx" if engine == "stub" else engine,
+        on_stage=lambda stage, seconds: current.__setitem__(stage, current.get(stage, 0.0) + seconds),
+        tile_min_side=tile_min_side,
+    )
+    started = time.perf_counter()
+    get_engine(service.engine).load(warmup=False)
+    model_load = time.perf_counter() - started
+    service.process_image(paths[0])
+
+    stages = defaultdict(list)
+    totals, labels_per_page = [], []
+    db = SessionLocal()
+    try:
+        wall_started = time.perf_counter()
+        for path, image_id in zip(paths[1:], image_ids[1:]):
+            current.clear()
+            started = time.perf_counter()
+            labels = service.process_image(path)
+            persist_started = time.perf_counter()
+            LabelService(db).create_labels(image_id, labels, replace=True)
+            current["persist"] = time.perf_counter() - persist_started
+            totals.append(time.perf_counter() - started)
+            labels_per_page.append(len(labels))
+            for stage, seconds in current.items():
+                stages[stage].append(seconds)
+        wall = time.perf_counter() - wall_started
+    finally:
+        db.close()
+
+    return {
+        "engine": engine,
+        "version": get_engine(service.engine).version,
+        "images": count,
+        "labels_per_image": statistics.fmean(labels_per_page),
+        "model_load_s": model_load,
+        "throughput_per_s": count / wall,
+        "stages": {stage: _percentiles(samples) for stage, samples in stages.items()},
+        "total": _percentiles(totals),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engine", default="stub", choices=["stub", "easyocr", "paddle", "onnx"])
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--width", type=int, default=1600)
+    parser.add_argument("--height", type=int, default=1200)
+    parser.add_argument("--lines", type=int, default=20)
+    parser.add_argument("--tile-min-side", type=int, help="tile images with a longer side past this; 0 = never")
+    parser.add_argument("--stub-detect-ms", type=float, default=0.0)
+    parser.add_argument("--stub-recognize-ms", type=float, default=0.0, help="per recognizer batch")
+    parser.add_argument("--stub-per-crop-ms", type=float, default=0.0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--save", action="store_true", help="save under benchmarks/results/ for later comparison")
+    args = parser.parse_args()
+
+    stub_args = {
+        "detect_ms": args.stub_detect_ms, "recognize_ms": args.stub_recognize_ms, "per_crop_ms": args.stub_per_crop_ms,
+    }
+    results = run(args.engine, args.images, args.width, args.height, args.lines, stub_args, args.tile_min_side)
+    print(
+        f"{results['engine']}: {results['images']} images, {results['labels_per_image']:.1f} labels/image, "
+        f"model load {results['model_load_s']:.2f}s, {results['throughput_per_s']:.2f} images/s"
+    )
+    print(f"{'stage':<12}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, r in list(results["stages"].items()) + [("total", results["total"])]:
+        print(f"{stage:<12}{r['mean_ms']:>10.2f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+    if args.output or args.save:
+        path = bench_results.save("ocr_pipeline", results, vars(args), args.output)
+        print(f"Saved {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Accuracy vs. latency of the OCR engines on a labeled project export.
+
+Run from app-backend/:
+    python -m benchmarks.compare_engines path/to/export [--engines easyocr,paddle,onnx:fp32,onnx:int8] [--limit 50]
+
+``path/to/export`` is an unzipped project export (``images/`` plus PaddleOCR
+style ``labels/*.txt``), so the ground truth is whatever annotators saved.
+Each engine runs in its own process, which keeps model memory and thread
+pools from interfering; ``onnx:fp32`` and ``onnx:int8`` set ONNX_QUANTIZED
+for that process. Per engine it reports model load time, per-image latency
+after one warm-up image, detection precision/recall/F1 (IoU >= --iou against
+labeled boxes) and the character error rate of texts on matched boxes.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff")
+
+def load_dataset(export_dir: str, limit: int = 0) -> list:
+    samples = []
+    for name in sorted(os.listdir(os.path.join(export_dir, "images"))):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        label_path = os.path.join(export_dir, "labels", os.path.splitext(name)[0] + ".txt")
+        if not os.path.exists(label_path):
+            continue
+        with open(label_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        boxes = []
+        for entry in entries:
+            xs = [point[0] for point in entry["points"]]
+            ys = [point[1] for point in entry["points"]]
+            boxes.append(((min(xs), min(ys), max(xs), max(ys)), entry["transcription"]))
+        samples.append((os.path.join(export_dir, "images", name), boxes))
+        if limit and len(samples) >= limit:
+            break
+    return samples
+
+def _iou(a, b) -> float:
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+def _edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+def score(predicted: list, truth: list, iou_threshold: float) -> dict:
+    """Greedy one-to-one matching by IoU, best pairs first."""
+    pairs = sorted(
+        ((_iou(p_box, t_box), p, t) for p, (p_box, _) in enumerate(predicted) for t, (t_box, _) in enumerate(truth)),
+        reverse=True,
+    )
+    used_p, used_t = set(), set()
+    errors = characters = exact = 0
+    for iou, p, t in pairs:
+        if iou < iou_threshold:
+            break
+        if p in used_p or t in used_t:
+            continue
+        used_p.add(p)
+        used_t.add(t)
+        predicted_text, true_text = predicted[p][1], truth[t][1]
+        errors += _edit_distance(predicted_text, true_text)
+        characters += len(true_text)
+        exact += predicted_text == true_text
+    return {
+        "matched": len(used_p), "predicted": len(predicted), "truth": len(truth),
+        "char_errors": errors, "characters": characters, "exact": exact,
+    }
+
+def run_engine(spec: str, samples: list, iou_threshold: float) -> dict:
+    from src.services.text_recognition_service import TextRecognitionService
+
+    service = TextRecognitionService(spec.partition(":")[0])
+    started = time.perf_counter()
+    service._handle.load(warmup=False)
+    load_seconds = time.perf_counter() - started
+    service.process_image(samples[0][0])
+
+    timings = []
+    totals = {"matched": 0, "predicted": 0, "truth": 0, "char_errors": 0, "characters": 0, "exact": 0}
+    for path, truth in samples:
+        started = time.perf_counter()
+        labels = service.process_image(path)
+        timings.append(time.perf_counter() - started)
+        predicted = [
+            ((label["x"], label["y"], label["x"] + label["width"], label["y"] + label["height"]), label["text"])
+            for label in labels
+        ]
+        for key, value in score(predicted, truth, iou_threshold).items():
+            totals[key] += value
+
+    timings.sort()
+    pick = lambda q: timings[min(len(timings) - 1, int(q * len(timings)))] * 1000
+    precision = totals["matched"] / totals["predicted"] if totals["predicted"] else 0.0
+    recall = totals["matched"] / totals["truth"] if totals["truth"] else 0.0
+    return {
+        "engine": spec,
+        "version": service._handle.version,
+        "images": len(samples),
+        "load_seconds": load_seconds,
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "p50_ms": pick(0.5),
+        "p95_ms": pick(0.95),
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "cer": totals["char_errors"] / totals["characters"] if totals["characters"] else 0.0,
+        "exact_match": totals["exact"] / totals["matched"] if totals["matched"] else 0.0,
+    }
+
+def _spawn(spec: str, args) -> dict:
+    env = dict(os.environ)
+    variant = spec.partition(":")[2]
+    if variant:
+        env["ONNX_QUANTIZED"] = "1" if variant == "int8" else "0"
+    command = [
+        sys.executable, "-m", "benchmarks.compare_engines", args.export_dir,
+        "--worker", spec, "--limit", str(args.limit), "--iou", str(args.iou),
+    ]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {"engine": spec, "error": completed.stderr.strip().splitlines()[-1:] or ["failed"]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("export_dir")
+    parser.add_argument("--engines", default="easyocr,paddle,onnx:fp32,onnx:int8")
+    parser.add_argument("--limit", type=int, default=0, help="only the first N labeled images")
+    parser.add_argument("--iou", type=float, default=0.5)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    samples = load_dataset(args.export_dir, args.limit)
+    if not samples:
+        raise SystemExit(f"No labeled images under {args.export_dir}")
+    if args.worker:
+        print(json.dumps(run_engine(args.worker, samples, args.iou)))
+        return
+
+    results = [_spawn(spec.strip(), args) for spec in args.engines.split(",") if spec.strip()]
+    print(f"{len(samples)} images, IoU >= {args.iou}")
+    print(f"{'engine':<12}{'load s':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'prec':>7}{'recall':>7}{'f1':>7}{'cer':>7}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['engine']:<12}  failed: {r['error'][0] if r['error'] else ''}")
+            continue
+        print(
+            f"{r['engine']:<12}{r['load_seconds']:>8.1f}{r['mean_ms']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+            f"{r['precision']:>7.3f}{r['recall']:>7.3f}{r['f1']:>7.3f}{r['cer']:>7.3f}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"images": len(samples), "iou": args.iou, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
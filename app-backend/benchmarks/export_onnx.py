@@ -0,0 +1,184 @@
+"""Export the paddle engine's models to ONNX and quantize them to int8.
+
+Run from app-backend/:  python -m benchmarks.export_onnx [--calibration-dir uploads/blobs]
+
+Writes into ONNX_MODEL_DIR (see src/core/onnx_engine.py for the file names):
+
+* ``det.onnx``: PP-OCRv4 DB detector, converted from the PaddleX inference
+  model with the ``paddle2onnx`` CLI.
+* ``rec_encoder.onnx`` / ``rec_decoder.onnx`` + ``rec_config.json``: VietOCR
+  ``vgg_transformer`` split into CNN + transformer encoder and one decoder
+  step, so greedy decoding can run as a loop over onnxruntime calls.
+* ``*.int8.onnx``: the recognizer is dynamically quantized (int8 weights,
+  activations quantized on the fly), which suits its MatMul-heavy
+  transformer. The detector is a convolutional network where dynamic
+  quantization gains little, so it is only quantized statically when
+  ``--calibration-dir`` provides representative images.
+
+Needs the export-only packages: torch, vietocr, paddlex, paddle2onnx, onnx, onnxruntime.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import subprocess
+import sys
+
+from src.core import config
+from src.core.onnx_engine import DET_MODEL, REC_CONFIG, REC_DECODER, REC_ENCODER, _quantized_name, preprocess_det
+
+def export_recognizer(output_dir: str, opset: int):
+    import torch
+    from vietocr.tool.config import Cfg
+    from vietocr.tool.predictor import Predictor
+
+    cfg = Cfg.load_config_from_name("vgg_transformer")
+    cfg["device"] = "cpu"
+    cfg["cnn"]["pretrained"] = False
+    model = Predictor(cfg).model.eval()
+
+    class Encoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.cnn = model.cnn
+            self.transformer = model.transformer
+
+        def forward(self, img):
+            return self.transformer.forward_encoder(self.cnn(img))
+
+    class Decoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.transformer = model.transformer
+
+        def forward(self, tgt, memory):
+            output, _ = self.transformer.forward_decoder(tgt, memory)
+            return torch.softmax(output, dim=-1)
+
+    dataset = cfg["dataset"]
+    image = torch.rand(2, 3, dataset["image_height"], 160)
+    with torch.no_grad():
+        memory = Encoder()(image)
+        tgt = torch.ones(3, 2, dtype=torch.long)
+        torch.onnx.export(
+            Encoder(), (image,), os.path.join(output_dir, REC_ENCODER), opset_version=opset,
+            input_names=["img"], output_names=["memory"],
+            dynamic_axes={"img": {0: "batch", 3: "width"}, "memory": {0: "sequence", 1: "batch"}},
+        )
+        torch.onnx.export(
+            Decoder(), (tgt, memory), os.path.join(output_dir, REC_DECODER), opset_version=opset,
+            input_names=["tgt", "memory"], output_names=["probs"],
+            dynamic_axes={
+                "tgt": {0: "length", 1: "batch"},
+                "memory": {0: "sequence", 1: "batch"},
+                "probs": {0: "batch", 1: "length"},
+            },
+        )
+
+    with open(os.path.join(output_dir, REC_CONFIG), "w", encoding="utf-8") as f:
+        json.dump({
+            "vocab": cfg["vocab"],
+            "image_height": dataset["image_height"],
+            "image_min_width": dataset["image_min_width"],
+            "image_max_width": dataset["image_max_width"],
+            "max_seq_length": cfg["transformer"].get("max_seq_length", 128),
+            "sos": 1,
+            "eos": 2,
+        }, f, ensure_ascii=False, indent=2)
+
+def export_detector(output_dir: str, model_name: str, model_dir: str, opset: int):
+    if model_dir is None:
+        from paddlex import create_model
+        # Downloads the official inference model on first use
+        model_dir = create_model(model_name).model_dir
+    subprocess.run([
+        "paddle2onnx",
+        "--model_dir", str(model_dir),
+        "--model_filename", "inference.pdmodel",
+        "--params_filename", "inference.pdiparams",
+        "--save_file", os.path.join(output_dir, DET_MODEL),
+        "--opset_version", str(opset),
+    ], check=True)
+
+def quantize_recognizer(output_dir: str):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    for name in (REC_ENCODER, REC_DECODER):
+        quantize_dynamic(
+            os.path.join(output_dir, name),
+            os.path.join(output_dir, _quantized_name(name)),
+            op_types_to_quantize=["MatMul", "Gemm"],
+            weight_type=QuantType.QInt8,
+        )
+
+def quantize_detector(output_dir: str, calibration_dir: str, samples: int):
+    import cv2
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    paths = [
+        path for path in glob.glob(os.path.join(calibration_dir, "**", "*"), recursive=True)
+        if path.lower().endswith((".jpg", ".jpeg", ".png", ".bmp", ".webp"))
+    ]
+    if not paths:
+        raise SystemExit(f"No calibration images under {calibration_dir}")
+    random.Random(0).shuffle(paths)
+    source = os.path.join(output_dir, DET_MODEL)
+    input_name = onnx.load(source).graph.input[0].name
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(paths[:samples])
+
+        def get_next(self):
+            for path in self._paths:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {input_name: preprocess_det(image, config.ONNX_DET_LIMIT_SIDE)}
+            return None
+
+    quantize_static(
+        source,
+        os.path.join(output_dir, _quantized_name(DET_MODEL)),
+        Reader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output-dir", default=config.ONNX_MODEL_DIR)
+    parser.add_argument("--det-model", default="PP-OCRv4_server_det", help="PaddleX model name, e.g. PP-OCRv4_mobile_det")
+    parser.add_argument("--det-model-dir", help="local PaddleX inference model instead of downloading --det-model")
+    parser.add_argument("--skip-det", action="store_true")
+    parser.add_argument("--skip-rec", action="store_true")
+    parser.add_argument("--no-quantize", action="store_true", help="only write the float models")
+    parser.add_argument("--calibration-dir", help="images for static int8 quantization of the detector")
+    parser.add_argument("--calibration-samples", type=int, default=64)
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    if not args.skip_det:
+        print(f"Exporting detector {args.det_model}")
+        export_detector(args.output_dir, args.det_model, args.det_model_dir, args.opset)
+    if not args.skip_rec:
+        print("Exporting VietOCR vgg_transformer")
+        export_recognizer(args.output_dir, args.opset)
+    if args.no_quantize:
+        return
+    if not args.skip_rec:
+        print("Quantizing recognizer (dynamic int8)")
+        quantize_recognizer(args.output_dir)
+    if not args.skip_det:
+        if args.calibration_dir:
+            print(f"Quantizing detector (static int8, {args.calibration_samples} calibration images)")
+            quantize_detector(args.output_dir, args.calibration_dir, args.calibration_samples)
+        else:
+            print("Detector left in float32; pass --calibration-dir to quantize it", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
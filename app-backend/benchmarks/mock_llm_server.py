@@ -0,0 +1,135 @@
+"""OpenAI-compatible mock of a multimodal chat completions endpoint, for the ``llm`` engine.
+
+Run from app-backend/:
+    python -m benchmarks.mock_llm_server [--port 8100] [--latency-ms 300] [--error-rate 0.1] [--rpm 120]
+    LLM_BASE_URL=http://127.0.0.1:8100/v1 python -m src.core.text_recognition page.jpg --engine llm
+
+Crop requests get one ``"mock WxH"`` text per image back. Page requests get
+the text lines of ``synthetic_pages``-like images, found by the stub
+detector. ``--error-rate`` answers that share of requests with 429 or 503,
+and more than ``--rpm`` requests a minute are refused with 429 and a
+``Retry-After``, so retries and client-side rate limiting can be watched
+in ``GET /stats``.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import random
+import threading
+import time
+from collections import deque
+
+def create_app(latency_ms: float = 0.0, error_rate: float = 0.0, requests_per_minute: int = 0, seed: int = 0):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+    from PIL import Image
+    from benchmarks.stub_engine import StubDetector
+
+    app = FastAPI()
+    rng = random.Random(seed)
+    detector = StubDetector()
+    stats = {"requests": 0, "completed": 0, "images": 0, "injected_errors": 0, "rate_limited": 0,
+             "in_flight": 0, "max_in_flight": 0}
+    recent = deque()
+
+    def _error(status: int, retry_after: float):
+        return JSONResponse({"error": {"message": "mock error", "code": status}}, status_code=status,
+                            headers={"Retry-After": str(retry_after)})
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        import numpy as np
+
+        body = await request.json()
+        stats["requests"] += 1
+        now = time.monotonic()
+        while recent and now - recent[0] > 60:
+            recent.popleft()
+        if requests_per_minute and len(recent) >= requests_per_minute:
+            stats["rate_limited"] += 1
+            return _error(429, round(60 - (now - recent[0]), 2))
+        recent.append(now)
+        if rng.random() < error_rate:
+            stats["injected_errors"] += 1
+            return _error(rng.choice((429, 503)), 0.1)
+
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            content = body["messages"][-1]["content"]
+            prompt = next(part["text"] for part in content if part["type"] == "text")
+            images = []
+            for part in content:
+                if part["type"] == "image_url":
+                    data = base64.b64decode(part["image_url"]["url"].split(",", 1)[1])
+                    images.append(Image.open(io.BytesIO(data)).convert("RGB"))
+            stats["images"] += len(images)
+            await asyncio.sleep(latency_ms / 1000)
+
+            if len(images) == 1 and "Find every line" in prompt:
+                boxes = detector.predict(np.asarray(images[0]))
+                reply = {"lines": [
+                    {"text": f"mock line {i}", "bbox": box["bbox"]} for i, box in enumerate(boxes)
+                ]}
+            else:
+                reply = {"texts": [f"mock {image.width}x{image.height}" for image in images]}
+        finally:
+            stats["in_flight"] -= 1
+        stats["completed"] += 1
+        prompt_tokens = len(prompt) // 4 + 85 * len(images)
+        completion_tokens = len(json.dumps(reply)) // 4
+        return {
+            "id": f"mock-{stats['requests']}",
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "```json\n" + json.dumps(reply) + "\n```"},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    app.state.stats = stats
+    return app
+
+def start(host: str = "127.0.0.1", port: int = 0, **options) -> tuple:
+    """Serve the mock from a background thread; returns ``(base_url, stats, server)``."""
+    import uvicorn
+
+    app = create_app(**options)
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="mock-llm", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise SystemExit("Mock LLM server failed to start")
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return f"http://{host}:{port}/v1", app.state.stats, server
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0, help="refuse requests past this many a minute; 0 = never")
+    args = parser.parse_args()
+    app = create_app(args.latency_ms, args.error_rate, args.rpm)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Save benchmark results with enough context to compare them across commits.
+
+Run from app-backend/:  python -m benchmarks.results old.json new.json [--threshold 5]
+
+Saved files land in ``benchmarks/results/<name>-<commit>-<timestamp>.json``
+and record the commit, whether the tree was dirty, the machine and the
+arguments next to the numbers. The comparison prints every numeric value
+present in both files with its relative change and flags latency (``*_ms``,
+``*_s``) increases and throughput (``*_per_s``) drops beyond the threshold;
+latency changes below ``--noise-ms`` are never flagged.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(
+            ["git", *args], capture_output=True, text=True, check=True, cwd=os.path.dirname(RESULTS_DIR)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def environment() -> dict:
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD") or "unknown",
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def save(name: str, results: dict, args: dict, path: str = None) -> str:
+    """Write ``results`` plus environment and arguments; returns the file path."""
+    env = environment()
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = env["timestamp"].replace(":", "").replace("-", "")
+        path = os.path.join(RESULTS_DIR, f"{name}-{env['commit']}{'-dirty' if env['dirty'] else ''}-{stamp}.json")
+    with open(path, "w") as f:
+        json.dump({"benchmark": name, "environment": env, "args": args, "results": results}, f, indent=2)
+    return path
+
+def _flatten(value, prefix: str = ""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, float(value)
+
+def compare(old: dict, new: dict, threshold: float, noise_ms: float = 0.5) -> int:
+    """Print the changes; returns how many metrics regressed beyond ``threshold`` percent."""
+    before = dict(_flatten(old.get("results", old)))
+    after = dict(_flatten(new.get("results", new)))
+    regressions = 0
+    width = max((len(key) for key in after if key in before), default=10)
+    for key, value in after.items():
+        if key not in before:
+            continue
+        base = before[key]
+        change = (value - base) / base * 100 if base else 0.0
+        if key.endswith("_per_s"):
+            worse = change < -threshold
+        elif key.endswith(("_ms", "_s")):
+            delta_ms = (value - base) * (1 if key.endswith("_ms") else 1000)
+            worse = change > threshold and delta_ms >= noise_ms
+        else:
+            worse = False
+        regressions += worse
+        print(f"{key:<{width}}  {base:>12.3f}  {value:>12.3f}  {change:>+8.1f}%{'  REGRESSION' if worse else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=5.0, help="percent change counted as a regression")
+    parser.add_argument("--noise-ms", type=float, default=0.5, help="ignore latency changes smaller than this")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    for label, data in (("old", old), ("new", new)):
+        env = data.get("environment", {})
+        print(f"{label}: {env.get('commit', '?')}{' (dirty)' if env.get('dirty') else ''} {env.get('timestamp', '')}")
+    sys.exit(1 if compare(old, new, args.threshold, args.noise_ms) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Model-free OCR engine for benchmarking everything around the models.
+
+The stub plugs into the registry under the ``onnx`` name, since it speaks the
+same ``detector.predict`` / ``recognizer.recognize`` interface, so the whole
+service/API path runs unchanged. Detection is a cheap row/column projection
+that finds the lines of ``synthetic_pages``; optional sleeps stand in for
+model latency so queueing and concurrency behave realistically.
+"""
+import time
+from typing import List, Sequence
+from src.core.engine_registry import EngineHandle, register_engine
+
+class StubDetector:
+    def __init__(self, latency_ms: float = 0.0, threshold: int = 128, min_gap: int = 40):
+        self.latency_ms = latency_ms
+        self.threshold = threshold
+        self.min_gap = min_gap
+
+    def _runs(self, mask) -> List[tuple]:
+        import numpy as np
+
+        padded = np.concatenate([[False], mask, [False]])
+        edges = np.flatnonzero(padded[1:] != padded[:-1])
+        return list(zip(edges[::2], edges[1::2]))
+
+    def predict(self, image) -> List[dict]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        # One channel is plenty for dark text on a grey page
+        ink = image[:, :, 1] < self.threshold
+        boxes = []
+        for top, bottom in self._runs(ink.any(axis=1)):
+            if bottom - top < 4:
+                continue
+            columns = self._runs(ink[top:bottom].any(axis=0))
+            # Merge runs separated by less than min_gap: letters and words of one line
+            start, end = columns[0]
+            for left, right in columns[1:] + [(None, None)]:
+                if left is not None and left - end < self.min_gap:
+                    end = right
+                    continue
+                boxes.append({"bbox": [float(start), float(top), float(end), float(bottom)], "score": 1.0})
+                if left is not None:
+                    start, end = left, right
+        return boxes
+
+class StubRecognizer:
+    def __init__(self, latency_ms: float = 0.0, per_crop_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.per_crop_ms = per_crop_ms
+
+    def recognize(self, images: Sequence, max_batch_size: int = 32, bucket_width: int = 64) -> List[str]:
+        batches = -(-len(images) // max(1, max_batch_size))
+        delay = batches * self.latency_ms + len(images) * self.per_crop_ms
+        if delay:
+            time.sleep(delay / 1000)
+        return [f"stub {image.shape[1]}x{image.shape[0]}" for image in images]
+
+def install(detect_ms: float = 0.0, recognize_ms: float = 0.0, per_crop_ms: float = 0.0) -> EngineHandle:
+    """Replace the ``onnx`` engine of this process with the stub."""
+    handle = EngineHandle(
+        "onnx",
+        lambda: {"detector": StubDetector(detect_ms), "recognizer": StubRecognizer(recognize_ms, per_crop_ms)},
+        lambda models: None,
+        version=f"stub:{detect_ms}:{recognize_ms}:{per_crop_ms}",
+        thread_safe=True,
+    )
+    register_engine(handle)
+    return handle
@@ -0,0 +1,54 @@
+"""Synthetic text pages for offline benchmarks: reproducible, no dataset needed."""
+import io
+import random
+from typing import List, Tuple
+
+WORDS = (
+    "hóa đơn tổng cộng ngày tháng năm số lượng đơn giá thành tiền khách hàng địa chỉ "
+    "điện thoại mã số thuế thanh toán tiền mặt chuyển khoản cảm ơn quý khách invoice total "
+    "date quantity price amount customer address phone tax payment cash transfer"
+).split()
+
+def _font(size: int):
+    from PIL import ImageFont
+    try:
+        return ImageFont.load_default(size=size)
+    except (TypeError, OSError):
+        # Pillow < 10.1 or no FreeType: fixed-size bitmap font, ASCII only
+        return ImageFont.load_default()
+
+def make_page(seed: int, width: int = 1600, height: int = 1200, lines: int = 20,
+              font_size: int = 28) -> Tuple["Image.Image", List[dict]]:
+    """Dark text lines on a light, slightly noisy background.
+
+    Returns the RGB image and its ground truth as label dicts
+    (``x``, ``y``, ``width``, ``height``, ``text``), one per line.
+    """
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    background = 235 + rng.randrange(20)
+    image = Image.new("RGB", (width, height), (background,) * 3)
+    draw = ImageDraw.Draw(image)
+    font = _font(font_size)
+    for _ in range(width * height // 2000):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.point((x, y), fill=(rng.randrange(160, 230),) * 3)
+
+    labels = []
+    line_height = height // max(1, lines)
+    for row in range(lines):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 7)))
+        x = rng.randint(20, max(20, width // 4))
+        y = row * line_height + rng.randint(0, max(0, line_height - font_size - 4))
+        left, top, right, bottom = draw.textbbox((x, y), text, font=font)
+        if right >= width or bottom >= height:
+            continue
+        draw.text((x, y), text, fill=(rng.randrange(0, 60),) * 3, font=font)
+        labels.append({"x": left, "y": top, "width": right - left, "height": bottom - top, "text": text})
+    return image, labels
+
+def encode(image, format: str = "JPEG", quality: int = 90) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, quality=quality)
+    return buffer.getvalue()
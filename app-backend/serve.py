@@ -0,0 +1,258 @@
+"""Production server: load the OCR models once, then fork workers that share them.
+
+Run from app-backend/:  python serve.py [--workers 4] [--threads-per-worker 2] [--port 8000]
+
+The parent process creates the schema, binds the socket, loads and warms up
+OCR_PRELOAD_ENGINES and then forks ``--workers`` uvicorn workers. Weights
+loaded before the fork are shared copy-on-write, so N workers cost roughly
+one copy of the models rather than N. Inference runs on threads inside each
+worker (OCR_WORKER_MODE is forced to "thread"): worker process pools would
+load private copies again.
+
+Each worker caps torch, OpenMP, BLAS and onnxruntime at
+``--threads-per-worker`` threads so together they do not oversubscribe the
+CPU. The parent warms models up single-threaded because OpenMP thread pools
+do not survive fork(). Engines that are not fork-safe (onnx) are loaded by
+each worker instead.
+
+OCR job status and results and the state of bulk detection runs are kept
+in the database, so any worker can answer for jobs and runs another worker
+accepted. Each run is processed by the worker holding its lease; every
+worker, restarted ones included, takes over runs whose worker died when it
+starts. Metrics are aggregated over all workers.
+
+The parent logs resident (RSS), proportional (PSS), shared and private
+memory of itself and every worker once the workers are up, then every
+SERVER_MEMORY_REPORT_SECONDS and on SIGUSR1. Dead workers are restarted;
+SIGTERM or SIGINT stops the server.
+"""
+import argparse
+import gc
+import glob
+import logging
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+from src.core import config
+
+logger = logging.getLogger("serve")
+
+_THREAD_ENV = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+def memory_usage(pid: int) -> dict:
+    """Memory of one process in MB, from /proc (Linux)."""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                parts = rest.split()
+                if len(parts) == 2 and parts[1] == "kB":
+                    values[key] = int(parts[0])
+    except OSError:
+        # Kernels before 4.14: statm has no PSS and no private/shared split of dirty pages
+        page_kb = os.sysconf("SC_PAGE_SIZE") // 1024
+        with open(f"/proc/{pid}/statm") as f:
+            _, resident, shared = (int(v) for v in f.read().split()[:3])
+        values = {"Rss": resident * page_kb, "Shared_Clean": shared * page_kb, "Private_Clean": (resident - shared) * page_kb}
+    mb = lambda *keys: sum(values.get(key, 0) for key in keys) / 1024
+    return {
+        "rss_mb": mb("Rss"),
+        "pss_mb": mb("Pss") if "Pss" in values else None,
+        "shared_mb": mb("Shared_Clean", "Shared_Dirty"),
+        "private_mb": mb("Private_Clean", "Private_Dirty"),
+    }
+
+def _bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def _prepare_metrics_dir():
+    # prometheus_client reads this on import; every worker writes its own files there
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for stale in glob.glob(os.path.join(path, "*.db")):
+            os.remove(stale)
+    else:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="ocr-metrics-")
+
+def _preload(engines: list):
+    from src.core.engine_registry import get_engine
+
+    for name in engines:
+        handle = get_engine(name)
+        if not handle.fork_safe:
+            logger.info("Engine %s is not fork-safe, each worker loads its own copy", name)
+            continue
+        try:
+            handle.load(warmup=config.OCR_WARMUP)
+        except Exception:
+            # Logged by the registry; workers retry on first use
+            pass
+
+def _run_worker(index: int, sock: socket.socket, threads: int):
+    import uvicorn
+
+    for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGUSR1):
+        signal.signal(sig, signal.SIG_DFL)
+    for var in _THREAD_ENV:
+        os.environ[var] = str(threads)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+    if config.ONNX_INTRA_OP_THREADS == 0:
+        config.ONNX_INTRA_OP_THREADS = threads
+
+    from app import app
+
+    logger.info("Worker %d (pid %d) serving with %d threads", index, os.getpid(), threads)
+    server = uvicorn.Server(uvicorn.Config(app, log_level="info", timeout_graceful_shutdown=config.SERVER_GRACEFUL_TIMEOUT))
+    server.run(sockets=[sock])
+
+class Supervisor:
+    def __init__(self, sock: socket.socket, workers: int, threads: int, report_seconds: int):
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self.report_seconds = report_seconds
+        self.children = {}  # pid -> worker index
+        self.stopping = False
+        self.report_requested = False
+
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(index, self.sock, self.threads)
+            except BaseException:
+                logger.exception("Worker %d crashed", index)
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = index
+
+    def report(self):
+        rows = [("parent", os.getpid())] + [(f"worker {i}", pid) for pid, i in sorted(self.children.items(), key=lambda c: c[1])]
+        lines = [f"{'process':<10}{'pid':>8}{'rss MB':>10}{'pss MB':>10}{'shared MB':>11}{'private MB':>12}"]
+        total_pss = 0.0
+        for role, pid in rows:
+            try:
+                usage = memory_usage(pid)
+            except OSError:
+                continue
+            total_pss += usage["pss_mb"] or usage["rss_mb"]
+            pss = f"{usage['pss_mb']:.1f}" if usage["pss_mb"] is not None else "-"
+            lines.append(
+                f"{role:<10}{pid:>8}{usage['rss_mb']:>10.1f}{pss:>10}{usage['shared_mb']:>11.1f}{usage['private_mb']:>12.1f}"
+            )
+        lines.append(f"total PSS {total_pss:.1f} MB (what the server really costs; RSS counts shared pages once per process)")
+        logger.info("Memory per process:\n%s", "\n".join(lines))
+
+    def _on_signal(self, signum, frame):
+        if signum == signal.SIGUSR1:
+            self.report_requested = True
+        else:
+            self.stopping = True
+
+    def _reap(self):
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            index = self.children.pop(pid, None)
+            if index is None:
+                continue
+            from src.core import metrics
+            metrics.mark_process_dead(pid)
+            if not self.stopping:
+                logger.warning("Worker %d (pid %d) exited with code %d, restarting", index, pid, os.waitstatus_to_exitcode(status))
+                time.sleep(1)
+                self.spawn(index)
+
+    def run(self):
+        for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGUSR1):
+            signal.signal(sig, self._on_signal)
+        for index in range(self.workers):
+            self.spawn(index)
+        # First report once the workers had time to import and start up
+        next_report = time.monotonic() + 15
+        while not self.stopping:
+            self._reap()
+            if self.report_requested or time.monotonic() >= next_report:
+                self.report_requested = False
+                self.report()
+                next_report = time.monotonic() + self.report_seconds if self.report_seconds else float("inf")
+            time.sleep(0.5)
+        self.shutdown()
+
+    def shutdown(self):
+        logger.info("Stopping %d workers", len(self.children))
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + config.SERVER_GRACEFUL_TIMEOUT + 5
+        while self.children and time.monotonic() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                self.children.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in self.children:
+            logger.warning("Worker pid %d did not stop in time, killing it", pid)
+            os.kill(pid, signal.SIGKILL)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=config.SERVER_WORKERS)
+    parser.add_argument("--threads-per-worker", type=int, default=config.SERVER_THREADS_PER_WORKER)
+    parser.add_argument("--memory-report-seconds", type=int, default=config.SERVER_MEMORY_REPORT_SECONDS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(name)s %(levelname)s %(message)s")
+
+    if not hasattr(os, "fork"):
+        raise SystemExit("serve.py needs fork(); use `uvicorn app:app` on this platform")
+    workers = max(1, args.workers)
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    if config.OCR_WORKER_MODE != "thread":
+        logger.info("Running OCR jobs on threads inside each worker (OCR_WORKER_MODE=%s ignored)", config.OCR_WORKER_MODE)
+        config.OCR_WORKER_MODE = "thread"
+    _prepare_metrics_dir()
+
+    # Single-threaded in the parent; each worker raises the limit after fork
+    for var in _THREAD_ENV:
+        os.environ[var] = "1"
+    sock = _bind(args.host, args.port)
+
+    from src.database.database import engine, init_db
+    init_db()
+    # No pooled connections may be inherited by the workers
+    engine.dispose()
+    started = time.perf_counter()
+    _preload(config.OCR_PRELOAD_ENGINES)
+    import app  # noqa: F401  everything the workers need, imported while memory is still shared
+    logger.info(
+        "Preloaded %s in %.1fs; starting %d workers with %d threads each on %s:%d",
+        ", ".join(config.OCR_PRELOAD_ENGINES) or "no engines", time.perf_counter() - started,
+        workers, threads, args.host, args.port,
+    )
+    # Keep the garbage collector from touching (and so un-sharing) every preloaded object
+    gc.freeze()
+    Supervisor(sock, workers, threads, args.memory_report_seconds).run()
+
+if __name__ == "__main__":
+    main()
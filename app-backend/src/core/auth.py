@@ -1,12 +1,21 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+from . import config
 from ..models.user import User
-from ..database.database import get_db
+from ..database.database import SessionLocal
 
 # Configuration
 SECRET_KEY = "your-secret-key-here"  # Change this to a secure secret key
@@ -16,19 +25,106 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 
+# bcrypt is deliberately slow; a small dedicated pool keeps a burst of logins
+# from occupying the threads every other sync endpoint runs on
+_password_executor = ThreadPoolExecutor(max_workers=config.AUTH_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+@dataclass(frozen=True)
+class UserPrincipal:
+    """The authenticated user, detached from any database session."""
+    id: int
+    username: str
+    email: str
+
+class TokenCache:
+    """Verified token -> principal, kept for a short TTL and never past the token's expiry."""
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # Keep digests, not bearer tokens, in memory
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[UserPrincipal]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return principal
+
+    def put(self, token: str, principal: UserPrincipal, token_expires_at: Optional[float] = None):
+        lifetime = self.ttl_seconds
+        if token_expires_at is not None:
+            lifetime = min(lifetime, token_expires_at - time.time())
+        if lifetime <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (principal, time.monotonic() + lifetime)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for key in [k for k, (principal, _) in self._entries.items() if principal.id == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+token_cache = TokenCache(config.AUTH_TOKEN_CACHE_TTL_SECONDS, config.AUTH_TOKEN_CACHE_SIZE)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_tokens(mapper, connection, target: User):
+    # By id, which stays valid even when the username itself was changed
+    token_cache.invalidate_user(target.id)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.wrap_future(_password_executor.submit(verify_password, plain_password, hashed_password))
+
+async def get_password_hash_async(password: str) -> str:
+    return await asyncio.wrap_future(_password_executor.submit(get_password_hash, password))
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+def _load_principal(username: str) -> Optional[UserPrincipal]:
+    db = SessionLocal()
+    try:
+        row = db.query(User.id, User.username, User.email).filter(User.username == username).first()
+    finally:
+        db.close()
+    return UserPrincipal(*row) if row else None
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserPrincipal:
+    # No get_db dependency: a cache hit should not even cost a threadpool hop for a session
+    principal = token_cache.get(token)
+    if principal is not None:
+        return principal
+
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
@@ -42,7 +138,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
+    principal = await run_in_threadpool(_load_principal, username)
+    if principal is None:
         raise credentials_exception
-    return user 
\ No newline at end of file
+    token_cache.put(token, principal, payload.get("exp"))
+    return principal
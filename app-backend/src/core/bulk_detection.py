@@ -0,0 +1,427 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import case, insert, update
+from sqlalchemy.orm import Session
+from . import config
+from .ocr_jobs import job_manager
+from .ownership import current_owner, owner_alive
+from ..database.database import SessionLocal
+from ..models.detection_run import DetectionRun, DetectionRunItem
+from ..models.label import Label
+from ..models.project import Image
+
+logger = logging.getLogger(__name__)
+
+FINISHED_RUN_STATUSES = ("completed", "cancelled", "failed")
+
+def run_to_dict(run: DetectionRun) -> dict:
+    return {
+        "run_id": run.id,
+        "project_id": run.project_id,
+        "engine": run.engine,
+        "scope": run.scope,
+        "use_cache": run.use_cache,
+        "status": run.status,
+        "total": run.total,
+        "processed": run.succeeded + run.failed + run.skipped,
+        "succeeded": run.succeeded,
+        "failed": run.failed,
+        "skipped": run.skipped,
+        "created_at": run.created_at.isoformat() if run.created_at else None,
+        "updated_at": run.updated_at.isoformat() if run.updated_at else None,
+    }
+
+def _lease_free(run: DetectionRun) -> bool:
+    """Whether no live worker is processing ``run``."""
+    if run.driver is None or run.heartbeat_at is None:
+        return True
+    if run.heartbeat_at < time.time() - config.BULK_DETECTION_LEASE_SECONDS:
+        return True
+    return not owner_alive(run.driver)
+
+def _lease_unchanged(run: DetectionRun) -> tuple:
+    """Conditions that only match while the run's lease is still as ``run`` saw it."""
+    return tuple(
+        column.is_(None) if value is None else column == value
+        for column, value in ((DetectionRun.driver, run.driver), (DetectionRun.heartbeat_at, run.heartbeat_at))
+    )
+
+class RunEventPoller:
+    """Progress events of a run rebuilt from the database, for runs another worker processes."""
+
+    def __init__(self, run_id: int):
+        self.run_id = run_id
+        self.since = datetime.utcnow()
+        self.sent = set()  # image ids
+
+    def mark_sent(self, event: dict):
+        if event.get("image_id") is not None:
+            self.sent.add(event["image_id"])
+
+    def poll(self) -> List[dict]:
+        db = SessionLocal()
+        try:
+            run = db.get(DetectionRun, self.run_id)
+            if run is None:
+                return []
+            items = (
+                db.query(DetectionRunItem)
+                .filter(
+                    DetectionRunItem.run_id == self.run_id,
+                    DetectionRunItem.status != "pending",
+                    DetectionRunItem.updated_at >= self.since,
+                )
+                .order_by(DetectionRunItem.updated_at, DetectionRunItem.id)
+                .all()
+            )
+            progress = dict(run_to_dict(run), images_per_second=None)
+            events = []
+            for item in items:
+                self.since = max(self.since, item.updated_at)
+                if item.image_id in self.sent:
+                    continue
+                self.sent.add(item.image_id)
+                events.append(dict(
+                    progress, type="image", image_id=item.image_id, image_status=item.status,
+                    labels=item.label_count, error=item.error,
+                ))
+            if run.status in FINISHED_RUN_STATUSES:
+                events.append(dict(progress, type="done"))
+            return events
+        finally:
+            db.close()
+
+class _RunState:
+    def __init__(self):
+        self.started_at = time.time()
+        self.processed = 0  # in this process, for throughput
+        self.cancel_requested = False
+        self.leased = True
+        self.checked_at = 0.0
+        self.renewed_at = 0.0
+        self.subscribers: List[tuple] = []
+        self.thread: Optional[threading.Thread] = None
+
+class BulkDetectionManager:
+    """Drives project-wide detect-text runs through the OCR job manager.
+
+    Progress is stored per image in ``detection_run_items`` so a run that was
+    interrupted by a restart continues with the images that are still pending.
+    Live progress is pushed to asyncio subscribers as plain dict events.
+
+    A run is processed by one server worker at a time: the worker holds a
+    lease on the run row (``driver``, ``heartbeat_at``) and renews it while it
+    works, and any worker can take over a run whose lease went stale or whose
+    driver process is gone. Cancelling sets a flag on the row that the driver
+    checks about once a second.
+    """
+
+    def __init__(self):
+        self._states: Dict[int, _RunState] = {}
+        self._lock = threading.Lock()
+
+    def create_run(self, db: Session, project_id: int, engine: str, scope: str, use_cache: bool = True) -> dict:
+        query = db.query(Image.id).filter(Image.project_id == project_id)
+        if scope == "unlabeled":
+            query = query.filter(~Image.labels.any())
+        image_ids = [image_id for (image_id,) in query.order_by(Image.id)]
+
+        run = DetectionRun(
+            project_id=project_id, engine=engine, scope=scope, use_cache=use_cache, total=len(image_ids)
+        )
+        if not image_ids:
+            run.status = "completed"
+        db.add(run)
+        db.flush()
+        if image_ids:
+            db.execute(
+                insert(DetectionRunItem),
+                [{"run_id": run.id, "image_id": image_id, "status": "pending"} for image_id in image_ids],
+            )
+        db.commit()
+        db.refresh(run)
+        if run.status == "running":
+            self.start(run.id)
+        return run_to_dict(run)
+
+    def get_run(self, run_id: int) -> Optional[dict]:
+        db = SessionLocal()
+        try:
+            run = db.get(DetectionRun, run_id)
+            if run is None:
+                return None
+            snapshot = run_to_dict(run)
+            snapshot.update(self._throughput(run_id))
+            return snapshot
+        finally:
+            db.close()
+
+    def is_driving(self, run_id: int) -> bool:
+        """Whether this process is working through the run."""
+        with self._lock:
+            state = self._states.get(run_id)
+        return state is not None and state.thread is not None and state.thread.is_alive()
+
+    def start(self, run_id: int) -> bool:
+        """Work through the run here, unless a live worker already does."""
+        with self._lock:
+            state = self._states.get(run_id)
+            if state is not None and state.thread is not None and state.thread.is_alive():
+                return False
+            if not self._claim(run_id):
+                return False
+            state = state or _RunState()
+            state.cancel_requested = False
+            state.leased = True
+            state.started_at = state.renewed_at = time.time()
+            state.processed = 0
+            self._states[run_id] = state
+            state.thread = threading.Thread(
+                target=self._drive, args=(run_id,), name=f"bulk-detect-{run_id}", daemon=True
+            )
+            state.thread.start()
+            return True
+
+    def _claim(self, run_id: int) -> bool:
+        db = SessionLocal()
+        try:
+            run = db.get(DetectionRun, run_id)
+            if run is None or run.status != "running":
+                return False
+            # A lease of this very process is left over from a drive that already ended
+            if run.driver != current_owner() and not _lease_free(run):
+                return False
+            claimed = db.execute(
+                update(DetectionRun)
+                .where(DetectionRun.id == run_id, DetectionRun.status == "running", *_lease_unchanged(run))
+                .values(driver=current_owner(), heartbeat_at=time.time(), updated_at=DetectionRun.updated_at)
+            ).rowcount
+            db.commit()
+            return claimed > 0
+        finally:
+            db.close()
+
+    def resume(self, db: Session, run_id: int) -> Optional[dict]:
+        run = db.get(DetectionRun, run_id)
+        if run is None:
+            return None
+        if run.status != "completed":
+            run.status = "running"
+            run.cancel_requested = False
+            db.commit()
+            self.start(run_id)
+        return run_to_dict(run)
+
+    def resume_interrupted(self):
+        """Take over runs still marked running whose worker stopped.
+
+        Safe to call from every worker: only one of them claims each run.
+        """
+        db = SessionLocal()
+        try:
+            run_ids = [run_id for (run_id,) in db.query(DetectionRun.id).filter(DetectionRun.status == "running")]
+        finally:
+            db.close()
+        for run_id in run_ids:
+            if self.start(run_id):
+                logger.info("Resuming bulk detection run %s", run_id)
+
+    def cancel(self, run_id: int) -> bool:
+        """Stop a run processed by any worker; False if it is not running."""
+        db = SessionLocal()
+        try:
+            run = db.get(DetectionRun, run_id)
+            if run is None or run.status != "running":
+                return False
+            if not self.is_driving(run_id) and _lease_free(run):
+                # Nobody is working on it who could finish the cancellation
+                statement = update(DetectionRun).where(*_lease_unchanged(run)).values(
+                    status="cancelled", driver=None, heartbeat_at=None
+                )
+            else:
+                statement = update(DetectionRun).values(cancel_requested=True, updated_at=DetectionRun.updated_at)
+            changed = db.execute(
+                statement.where(DetectionRun.id == run_id, DetectionRun.status == "running")
+            ).rowcount
+            db.commit()
+        finally:
+            db.close()
+        with self._lock:
+            state = self._states.get(run_id)
+        if changed and state is not None:
+            state.cancel_requested = True
+        return changed > 0
+
+    def subscribe(self, run_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._states.setdefault(run_id, _RunState())
+            state.subscribers.append((loop, queue))
+        return queue
+
+    def unsubscribe(self, run_id: int, queue: asyncio.Queue):
+        with self._lock:
+            state = self._states.get(run_id)
+            if state is not None:
+                state.subscribers = [s for s in state.subscribers if s[1] is not queue]
+
+    def _publish(self, run_id: int, event: dict):
+        with self._lock:
+            state = self._states.get(run_id)
+            subscribers = list(state.subscribers) if state else []
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # The subscriber's loop is gone
+                self.unsubscribe(run_id, queue)
+
+    def _throughput(self, run_id: int) -> dict:
+        state = self._states.get(run_id)
+        if state is None:
+            return {"images_per_second": None}
+        elapsed = max(time.time() - state.started_at, 1e-6)
+        return {"images_per_second": round(state.processed / elapsed, 3)}
+
+    def _check(self, db: Session, run_id: int, state: _RunState):
+        """Pick up cancellation from other workers and renew the lease, at most once a second."""
+        now = time.time()
+        if now - state.checked_at < 1:
+            return
+        state.checked_at = now
+        if now - state.renewed_at >= config.BULK_DETECTION_LEASE_SECONDS / 3:
+            state.renewed_at = now
+            renewed = db.execute(
+                update(DetectionRun)
+                .where(DetectionRun.id == run_id, DetectionRun.driver == current_owner())
+                .values(heartbeat_at=now, updated_at=DetectionRun.updated_at)
+            ).rowcount
+            if not renewed:
+                logger.warning("Bulk detection run %s was taken over by another worker", run_id)
+                state.leased = False
+        if db.query(DetectionRun.cancel_requested).filter(DetectionRun.id == run_id).scalar():
+            state.cancel_requested = True
+        db.commit()
+
+    def _finish_item(self, db: Session, run: DetectionRun, item: DetectionRunItem, status: str,
+                     label_count: int = 0, error: Optional[str] = None):
+        image_id = item.image_id
+        # Conditional, so an image is counted once even if the run changed hands meanwhile
+        finished = db.execute(
+            update(DetectionRunItem)
+            .where(DetectionRunItem.id == item.id, DetectionRunItem.status == "pending")
+            .values(status=status, label_count=label_count, error=error)
+        ).rowcount
+        if finished:
+            counter = {"succeeded": DetectionRun.succeeded, "skipped": DetectionRun.skipped}.get(
+                status, DetectionRun.failed
+            )
+            db.execute(update(DetectionRun).where(DetectionRun.id == run.id).values({counter: counter + 1}))
+        db.commit()
+        if not finished:
+            return
+
+        self._states[run.id].processed += 1
+        event = run_to_dict(run)
+        event.update(self._throughput(run.id))
+        event.update({
+            "type": "image",
+            "image_id": image_id,
+            "image_status": status,
+            "labels": label_count,
+            "error": error,
+        })
+        self._publish(run.id, event)
+
+    def _collect(self, db: Session, run: DetectionRun, state: _RunState, in_flight: dict, return_when):
+        # Wakes up regularly to keep the lease while jobs are slow
+        done, _ = wait(list(in_flight), timeout=1, return_when=return_when)
+        for future in done:
+            item, job = in_flight.pop(future)
+            if job.status == "succeeded":
+                self._finish_item(db, run, item, "succeeded", label_count=len(job.result))
+            elif job.status == "failed":
+                self._finish_item(db, run, item, "failed", error=job.error)
+            # Cancelled jobs stay pending so resuming the run picks them up again
+        self._check(db, run.id, state)
+
+    def _drive(self, run_id: int):
+        state = self._states[run_id]
+        db = SessionLocal()
+        run = None
+        try:
+            run = db.get(DetectionRun, run_id)
+            items = (
+                db.query(DetectionRunItem, Image.file_path, Image.blob_sha256)
+                .outerjoin(Image, Image.id == DetectionRunItem.image_id)
+                .filter(DetectionRunItem.run_id == run_id, DetectionRunItem.status == "pending")
+                .order_by(DetectionRunItem.image_id)
+                .all()
+            )
+            window = 2 * config.ocr_job_workers(run.engine)
+            in_flight: dict = {}
+
+            for item, file_path, content_hash in items:
+                self._check(db, run_id, state)
+                if state.cancel_requested or not state.leased:
+                    break
+                while len(in_flight) >= window:
+                    self._collect(db, run, state, in_flight, FIRST_COMPLETED)
+
+                if file_path is None:
+                    self._finish_item(db, run, item, "failed", error="Image no longer exists")
+                    continue
+                if run.scope == "unlabeled" and db.query(Label.id).filter(Label.image_id == item.image_id).first():
+                    # Labeled since the run was created, or persisted just before a restart
+                    self._finish_item(db, run, item, "skipped")
+                    continue
+
+                job = job_manager.submit(
+                    run.engine, run.project_id, item.image_id, file_path,
+                    replace=run.scope == "all", use_cache=run.use_cache, content_hash=content_hash,
+                )
+                in_flight[job.done] = (item, job)
+
+            if state.cancel_requested or not state.leased:
+                for _, job in in_flight.values():
+                    job_manager.cancel(job.id)
+            while in_flight:
+                self._collect(db, run, state, in_flight, FIRST_COMPLETED)
+
+            # A cancellation that came in after the last image still counts
+            status = "cancelled" if state.cancel_requested else case(
+                (DetectionRun.cancel_requested, "cancelled"), else_="completed"
+            )
+            self._release(db, run_id, status)
+        except Exception:
+            logger.exception("Bulk detection run %s failed", run_id)
+            db.rollback()
+            if run is not None:
+                self._release(db, run_id, "failed")
+        finally:
+            # A worker that took the run over reports its end
+            if run is not None and state.leased:
+                db.refresh(run)
+                event = {"type": "done"}
+                event.update(run_to_dict(run))
+                event.update(self._throughput(run_id))
+                self._publish(run_id, event)
+            db.close()
+
+    def _release(self, db: Session, run_id: int, status):
+        released = db.execute(
+            update(DetectionRun)
+            .where(DetectionRun.id == run_id, DetectionRun.driver == current_owner())
+            .values(status=status, driver=None, heartbeat_at=None)
+        ).rowcount
+        db.commit()
+        if not released:
+            self._states[run_id].leased = False
+
+bulk_detection = BulkDetectionManager()
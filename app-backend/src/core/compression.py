@@ -0,0 +1,114 @@
+import gzip
+from typing import Optional
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from . import config
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+def _negotiate(accept_encoding: str) -> Optional[str]:
+    offered = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        offered[coding.strip().lower()] = quality
+    for coding in (("br", "gzip") if brotli is not None else ("gzip",)):
+        if offered.get(coding, 0) > 0:
+            return coding
+    return None
+
+def _compress(coding: str, body: bytes) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=config.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=config.COMPRESSION_GZIP_LEVEL)
+
+def strip_encoding_suffix(etag: str) -> str:
+    """Undo the per-encoding suffix this middleware adds to strong ETags."""
+    for coding in ("br", "gzip"):
+        suffix = f'-{coding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+class CompressionMiddleware:
+    """Brotli (when installed) or gzip for complete JSON and text bodies.
+
+    Streaming responses (exports, SSE) pass through untouched. A strong ETag
+    gets an encoding suffix, because the compressed bytes are a different
+    representation; ``etag_matches`` strips it again.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, thread_minimum_size: int = 256 * 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_minimum_size = thread_minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        coding = _negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+                passthrough = (
+                    "content-encoding" in headers
+                    or message["status"] in (204, 206, 304)
+                    or not media_type.startswith(COMPRESSIBLE_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if start is not None and (message.get("more_body", False) or len(body) < self.minimum_size):
+                # Streamed or small: send as-is
+                passthrough = True
+                await send(start)
+                start = None
+                await send(message)
+                return
+            if start is None:
+                await send(message)
+                return
+
+            if len(body) >= self.thread_minimum_size:
+                body = await anyio.to_thread.run_sync(_compress, coding, body)
+            else:
+                body = _compress(coding, body)
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = coding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f'{etag[:-1]}-{coding}"'
+            await send(start)
+            start = None
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
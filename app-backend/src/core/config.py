@@ -0,0 +1,135 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def _get_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+def _get_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+def _get_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+def _get_list(name: str, default: str = "") -> list[str]:
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+# Database
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+DB_POOL_SIZE = _get_int("DB_POOL_SIZE", 10)  # ignored for SQLite
+DB_MAX_OVERFLOW = _get_int("DB_MAX_OVERFLOW", 20)
+DB_POOL_TIMEOUT = _get_int("DB_POOL_TIMEOUT", 30)
+DB_POOL_RECYCLE = _get_int("DB_POOL_RECYCLE", 1800)
+SQLITE_CACHE_SIZE_KB = _get_int("SQLITE_CACHE_SIZE_KB", 64 * 1024)
+SQLITE_MMAP_SIZE_MB = _get_int("SQLITE_MMAP_SIZE_MB", 256)
+SQLITE_BUSY_TIMEOUT_MS = _get_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+
+# Auth
+AUTH_TOKEN_CACHE_TTL_SECONDS = _get_int("AUTH_TOKEN_CACHE_TTL_SECONDS", 60)  # 0 disables the cache
+AUTH_TOKEN_CACHE_SIZE = _get_int("AUTH_TOKEN_CACHE_SIZE", 10000)
+AUTH_HASH_WORKERS = _get_int("AUTH_HASH_WORKERS", 2)  # threads for bcrypt hashing and verification
+AUTH_PROTECT_LABELS = _get_bool("AUTH_PROTECT_LABELS", False)  # require a bearer token on /api/labels
+
+# Uploads
+UPLOAD_CHUNK_SIZE = _get_int("UPLOAD_CHUNK_SIZE", 1024 * 1024)
+BLOB_DIR = os.getenv("BLOB_DIR", "uploads/blobs")  # content-addressed image store, served under /uploads
+BLOB_GRACE_SECONDS = _get_int("BLOB_GRACE_SECONDS", 600)  # blob files stored or reused this recently are never unlinked
+
+# Response compression
+COMPRESSION_ENABLED = _get_bool("COMPRESSION_ENABLED", True)
+COMPRESSION_MINIMUM_SIZE = _get_int("COMPRESSION_MINIMUM_SIZE", 1024)  # bytes
+COMPRESSION_GZIP_LEVEL = _get_int("COMPRESSION_GZIP_LEVEL", 6)
+COMPRESSION_BROTLI_QUALITY = _get_int("COMPRESSION_BROTLI_QUALITY", 5)  # used when the brotli package is installed
+
+# Image previews
+PREVIEW_DIR = os.getenv("PREVIEW_DIR", "cache/previews")
+PREVIEW_TILE_SIZE = _get_int("PREVIEW_TILE_SIZE", 512)
+PREVIEW_THUMBNAIL_SIZES = [int(size) for size in _get_list("PREVIEW_THUMBNAIL_SIZES", "256,1024")]  # long side, px
+PREVIEW_QUALITY = _get_int("PREVIEW_QUALITY", 85)  # JPEG quality
+PREVIEW_WORKERS = _get_int("PREVIEW_WORKERS", 2)
+PREVIEW_ON_UPLOAD = _get_bool("PREVIEW_ON_UPLOAD", True)  # otherwise generated on first request
+PREVIEW_MAX_AGE = _get_int("PREVIEW_MAX_AGE", 365 * 24 * 3600)  # Cache-Control max-age, seconds
+
+# OCR engines
+OCR_PRELOAD_ENGINES = _get_list("OCR_PRELOAD_ENGINES")  # e.g. "easyocr,paddle"
+OCR_WARMUP = _get_bool("OCR_WARMUP", True)
+OCR_RECOGNIZER_BATCH_SIZE = _get_int("OCR_RECOGNIZER_BATCH_SIZE", 32)
+OCR_RECOGNIZER_BUCKET_WIDTH = _get_int("OCR_RECOGNIZER_BUCKET_WIDTH", 64)  # px after resize
+OCR_MAX_IMAGE_PIXELS = _get_int("OCR_MAX_IMAGE_PIXELS", 50_000_000)  # larger images are decoded downscaled; 0 = never
+# Images with a longer side past OCR_TILE_MIN_SIDE are detected in overlapping
+# tiles at full resolution instead of being shrunk to the detector's input size
+OCR_TILE_MIN_SIDE = _get_int("OCR_TILE_MIN_SIDE", 4000)  # px; 0 = never tile
+OCR_TILE_SIZE = _get_int("OCR_TILE_SIZE", 960)  # px, about the detectors' own input size
+OCR_TILE_OVERLAP = _get_int("OCR_TILE_OVERLAP", 160)  # px, should exceed the tallest text line
+OCR_TILE_WORKERS = _get_int("OCR_TILE_WORKERS", 2)  # tiles detected at once, thread-safe engines only
+
+# ONNX Runtime engine ("onnx"), models written by benchmarks/export_onnx.py
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "models/onnx")
+ONNX_QUANTIZED = _get_bool("ONNX_QUANTIZED", True)  # use the *.int8.onnx files when present
+ONNX_INTRA_OP_THREADS = _get_int("ONNX_INTRA_OP_THREADS", 0)  # 0 = one per physical core
+ONNX_INTER_OP_THREADS = _get_int("ONNX_INTER_OP_THREADS", 1)
+ONNX_DET_LIMIT_SIDE = _get_int("ONNX_DET_LIMIT_SIDE", 960)  # longest side fed to the detector, px
+
+# LLM engine ("llm"): any OpenAI-compatible chat completions endpoint that accepts images
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.openai.com/v1")
+LLM_API_KEY = os.getenv("LLM_API_KEY", "")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_DETECTOR = os.getenv("LLM_DETECTOR", "")  # "onnx" or "paddle" finds the boxes and the LLM reads the crops; "" = whole pages
+LLM_CROPS_PER_REQUEST = _get_int("LLM_CROPS_PER_REQUEST", 16)
+LLM_PAGE_MAX_SIDE = _get_int("LLM_PAGE_MAX_SIDE", 2048)  # whole pages are sent downscaled to this, px; 0 = as is
+LLM_MAX_CONCURRENCY = _get_int("LLM_MAX_CONCURRENCY", 8)  # requests in flight, per process
+LLM_REQUESTS_PER_MINUTE = _get_float("LLM_REQUESTS_PER_MINUTE", 60)  # per process; 0 = unlimited
+LLM_TOKENS_PER_MINUTE = _get_float("LLM_TOKENS_PER_MINUTE", 200_000)  # estimated up front, corrected from usage; 0 = unlimited
+LLM_MAX_TOKENS = _get_int("LLM_MAX_TOKENS", 2048)  # per reply
+LLM_TIMEOUT_SECONDS = _get_float("LLM_TIMEOUT_SECONDS", 120)
+LLM_MAX_RETRIES = _get_int("LLM_MAX_RETRIES", 4)
+LLM_JSON_MODE = _get_bool("LLM_JSON_MODE", True)  # ask for response_format=json_object
+LLM_CACHE_ENABLED = _get_bool("LLM_CACHE_ENABLED", True)
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "cache/llm")
+LLM_CACHE_MAX_MB = _get_int("LLM_CACHE_MAX_MB", 256)
+
+# OCR result cache
+OCR_CACHE_ENABLED = _get_bool("OCR_CACHE_ENABLED", True)
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "cache/ocr")
+OCR_CACHE_MAX_MB = _get_int("OCR_CACHE_MAX_MB", 512)
+OCR_CACHE_VERSION = os.getenv("OCR_CACHE_VERSION", "1")  # bump to invalidate every entry
+
+# OCR job queue
+OCR_WORKER_MODE = os.getenv("OCR_WORKER_MODE", "process")  # "process" or "thread"
+OCR_JOB_WORKERS = _get_int("OCR_JOB_WORKERS", 1)  # per engine, override with OCR_JOB_WORKERS_<ENGINE>
+OCR_JOB_TTL_SECONDS = _get_int("OCR_JOB_TTL_SECONDS", 3600)
+
+def ocr_job_workers(engine: str) -> int:
+    return max(1, _get_int(f"OCR_JOB_WORKERS_{engine.upper()}", OCR_JOB_WORKERS))
+
+# Observability
+METRICS_ENABLED = _get_bool("METRICS_ENABLED", True)  # Prometheus /metrics and request timing
+TRACING_ENABLED = _get_bool("TRACING_ENABLED", False)
+TRACING_FILE = os.getenv("TRACING_FILE", "logs/traces.jsonl")  # spans as JSON lines
+TRACING_SAMPLE_RATE = _get_float("TRACING_SAMPLE_RATE", 1.0)  # fraction of traces recorded
+
+# Production server (serve.py)
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = _get_int("SERVER_PORT", 8000)
+SERVER_WORKERS = _get_int("SERVER_WORKERS", 2)
+SERVER_THREADS_PER_WORKER = _get_int("SERVER_THREADS_PER_WORKER", 0)  # torch/OpenMP/ONNX threads; 0 = cores / workers
+SERVER_MEMORY_REPORT_SECONDS = _get_int("SERVER_MEMORY_REPORT_SECONDS", 300)  # 0 = only on SIGUSR1
+SERVER_GRACEFUL_TIMEOUT = _get_int("SERVER_GRACEFUL_TIMEOUT", 30)
+
+# Label region queries and merging
+SPATIAL_INDEX_CACHE_IMAGES = _get_int("SPATIAL_INDEX_CACHE_IMAGES", 256)  # per-image label indexes kept in memory
+LABEL_MERGE_IOU = _get_float("LABEL_MERGE_IOU", 0.5)  # detections overlapping a label this much are not added again
+
+# Bulk detection
+BULK_DETECTION_RESUME = _get_bool("BULK_DETECTION_RESUME", True)  # restart interrupted runs on startup
+BULK_DETECTION_LEASE_SECONDS = _get_int("BULK_DETECTION_LEASE_SECONDS", 30)  # silence before a run's worker counts as gone
+
+# Dataset export
+EXPORT_CROP_WORKERS = _get_int("EXPORT_CROP_WORKERS", os.cpu_count() or 1)
+EXPORT_LMDB_MAP_SIZE_GB = _get_int("EXPORT_LMDB_MAP_SIZE_GB", 64)  # virtual size, the file only grows as needed
@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Literal
+from . import config, metrics
+
+logger = logging.getLogger(__name__)
+
+EngineName = Literal["easyocr", "paddle", "onnx", "llm"]
+
+def _load_easyocr() -> dict:
+    import easyocr
+    return {"reader": easyocr.Reader(['vi'])}
+
+def _load_paddle() -> dict:
+    import torch
+    from paddlex import create_model
+    from vietocr.tool.predictor import Predictor
+    from vietocr.tool.config import Cfg
+
+    config = Cfg.load_config_from_name('vgg_transformer')
+    config['device'] = 'cuda:0' if torch.cuda.is_available() else 'cpu'
+    config['cnn']['pretrained'] = False
+    return {
+        "detector": create_model("PP-OCRv4_server_det"),
+        "recognizer": Predictor(config),
+    }
+
+def _load_onnx() -> dict:
+    from .onnx_engine import load_models
+    return load_models()
+
+def _load_llm() -> dict:
+    from .llm_engine import load_models
+    return load_models()
+
+def _warmup_image():
+    import numpy as np
+    # Small white canvas with a dark bar so detectors have something to look at
+    image = np.full((64, 256, 3), 255, dtype=np.uint8)
+    image[24:40, 16:240] = 0
+    return image
+
+def _warmup_easyocr(models: dict):
+    models["reader"].readtext(_warmup_image())
+
+def _warmup_paddle(models: dict):
+    from PIL import Image
+    image = _warmup_image()
+    list(models["detector"].predict(image))
+    models["recognizer"].predict(Image.fromarray(image[16:48, :]))
+
+def _warmup_onnx(models: dict):
+    image = _warmup_image()
+    models["detector"].predict(image)
+    models["recognizer"].recognize([image[16:48, :]])
+
+class EngineHandle:
+    """Lazily loaded, process-wide OCR engine.
+
+    Models are loaded at most once per process. Inference goes through
+    ``acquire()`` which serializes access, since neither the torch nor the
+    paddle predictors are safe to call from several threads at once.
+    ``thread_safe`` models are not serialized and may also be called from
+    several threads by one caller, e.g. one per detection tile.
+    ``fork_safe`` engines may be loaded before the server forks its workers
+    and then shared copy-on-write; the others must be loaded in each worker.
+    """
+
+    def __init__(self, name: str, loader: Callable[[], dict], warmup: Callable[[dict], None], version: str,
+                 fork_safe: bool = True, thread_safe: bool = False):
+        self.name = name
+        # Identifies the models behind this engine, part of the OCR cache key
+        self.version = version
+        self.fork_safe = fork_safe
+        self.thread_safe = thread_safe
+        self._loader = loader
+        self._warmup = warmup
+        self._models = None
+        self._load_lock = threading.Lock()
+        self._use_lock = threading.Lock()
+        self.error: str | None = None
+        self.load_seconds: float | None = None
+        self.warmed_up = False
+
+    @property
+    def ready(self) -> bool:
+        return self._models is not None
+
+    def load(self, warmup: bool = True) -> dict:
+        if self._models is not None:
+            return self._models
+        with self._load_lock:
+            if self._models is None:
+                started = time.perf_counter()
+                try:
+                    models = self._loader()
+                    if warmup:
+                        self._warmup(models)
+                        self.warmed_up = True
+                except Exception as exc:
+                    self.error = str(exc)
+                    metrics.record_model_load(self.name, None, ok=False)
+                    logger.exception("Failed to load OCR engine %s", self.name)
+                    raise
+                self.error = None
+                self.load_seconds = time.perf_counter() - started
+                metrics.record_model_load(self.name, self.load_seconds, ok=True)
+                self._models = models
+                logger.info("Loaded OCR engine %s in %.2fs", self.name, self.load_seconds)
+        return self._models
+
+    @contextmanager
+    def acquire(self) -> Iterator[dict]:
+        # Lazy loads skip the warm-up pass, the caller's own request warms the model
+        models = self.load(warmup=False)
+        if self.thread_safe:
+            yield models
+            return
+        with self._use_lock:
+            yield models
+
+    def status(self) -> dict:
+        return {
+            "engine": self.name,
+            "ready": self.ready,
+            "warmed_up": self.warmed_up,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+
+def _onnx_version() -> str:
+    from .onnx_engine import model_version
+    return model_version()
+
+def _llm_version() -> str:
+    from .llm_engine import model_version
+    return model_version()
+
+_ENGINES: Dict[str, EngineHandle] = {
+    "easyocr": EngineHandle("easyocr", _load_easyocr, _warmup_easyocr, version="easyocr-vi"),
+    "paddle": EngineHandle(
+        "paddle", _load_paddle, _warmup_paddle, version="PP-OCRv4_server_det+vietocr-vgg_transformer"
+    ),
+    # onnxruntime sessions own thread pools, which do not survive fork(), and run() is thread-safe
+    "onnx": EngineHandle(
+        "onnx", _load_onnx, _warmup_onnx, version=_onnx_version(), fork_safe=False, thread_safe=True
+    ),
+    # No warm-up: it would be a paid request. The HTTP client runs on its own thread, which
+    # fork() does not copy; requests from many threads share its limits, unless a paddle detector is in use
+    "llm": EngineHandle(
+        "llm", _load_llm, lambda models: None, version=_llm_version(), fork_safe=False,
+        thread_safe=config.LLM_DETECTOR != "paddle",
+    ),
+}
+
+def get_engine(name: str) -> EngineHandle:
+    try:
+        return _ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unsupported engine: {name}")
+
+def register_engine(handle: EngineHandle):
+    """Add or replace an engine by name, e.g. a stub for offline benchmarks."""
+    _ENGINES[handle.name] = handle
+
+def available_engines() -> list[str]:
+    return list(_ENGINES)
+
+def preload_engines(names: Iterable[str], warmup: bool = True):
+    for name in names:
+        try:
+            get_engine(name).load(warmup=warmup)
+        except Exception:
+            # Already logged; the engine stays not-ready and will retry on first use
+            pass
+
+def start_preload(names: Iterable[str], warmup: bool = True) -> threading.Thread:
+    """Preload engines in a background thread so startup is not blocked."""
+    thread = threading.Thread(
+        target=preload_engines, args=(list(names), warmup), name="ocr-preload", daemon=True
+    )
+    thread.start()
+    return thread
+
+def engine_status() -> list[dict]:
+    return [handle.status() for handle in _ENGINES.values()]
@@ -0,0 +1,23 @@
+from fastapi import Request, Response
+from .compression import strip_encoding_suffix
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's ``If-None-Match`` already names ``etag``."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak validators still match for GET revalidation (RFC 9110, 13.1.2)
+    candidates = [strip_encoding_suffix(candidate.strip().removeprefix("W/")) for candidate in header.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+def set_etag(response: Response, etag: str):
+    # no-cache: keep the body, but revalidate it before every reuse
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
+def not_modified(etag: str) -> Response:
+    response = Response(status_code=304)
+    set_etag(response, etag)
+    return response
@@ -0,0 +1,129 @@
+import io
+import math
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Literal, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# numpy is only imported when pixels are actually turned into arrays, so
+# PIL-only users such as the preview store do not need it
+ImageSource = Union[str, bytes, "np.ndarray"]
+
+# EXIF orientations that swap width and height
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+def _orientation_transform(orientation: int):
+    from PIL import Image
+    return {
+        2: Image.Transpose.FLIP_LEFT_RIGHT,
+        3: Image.Transpose.ROTATE_180,
+        4: Image.Transpose.FLIP_TOP_BOTTOM,
+        5: Image.Transpose.TRANSPOSE,
+        6: Image.Transpose.ROTATE_270,
+        7: Image.Transpose.TRANSVERSE,
+        8: Image.Transpose.ROTATE_90,
+    }.get(orientation)
+
+@dataclass
+class DecodedImage:
+    """Pixels of one image, decoded once and shared by every pipeline stage.
+
+    ``array`` is a C-contiguous ``H x W x 3`` uint8 buffer in ``channel_order``,
+    already rotated upright according to EXIF. ``scale`` is its size relative
+    to the upright original; it is below 1 only when a huge image was decoded
+    at reduced resolution, and coordinates found on ``array`` must be divided
+    by it to land in original-image space.
+    """
+    array: "np.ndarray"
+    channel_order: Literal["RGB", "BGR"]
+    width: int
+    height: int
+    scale: float = 1.0
+
+    def crop(self, x: float, y: float, width: float, height: float) -> Optional["np.ndarray"]:
+        """Zero-copy view of a box given in decoded-array coordinates, clamped to the image."""
+        rows, columns = self.array.shape[:2]
+        left, top = max(0, math.floor(x)), max(0, math.floor(y))
+        right, bottom = min(columns, math.ceil(x + width)), min(rows, math.ceil(y + height))
+        if right <= left or bottom <= top:
+            return None
+        return self.array[top:bottom, left:right]
+
+    def rgb(self, view: "np.ndarray") -> "np.ndarray":
+        """``view`` in RGB order, still without copying."""
+        return view if self.channel_order == "RGB" else view[:, :, ::-1]
+
+    def to_original(self, x: float, y: float, width: float, height: float) -> Tuple[float, float, float, float]:
+        if self.scale == 1.0:
+            return x, y, width, height
+        return x / self.scale, y / self.scale, width / self.scale, height / self.scale
+
+def _swap_channels(array: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+    try:
+        import cv2
+        # In place: no second full-size buffer
+        return cv2.cvtColor(array, cv2.COLOR_RGB2BGR, dst=array)
+    except ImportError:
+        return np.ascontiguousarray(array[:, :, ::-1])
+
+def open_upright(source: Union[str, bytes], max_pixels: Optional[int] = None):
+    """Open an image as an upright RGB PIL image, optionally decoded at reduced size.
+
+    Returns ``(image, original_width, original_height)`` where the original
+    size is that of the upright full-resolution image. JPEGs over
+    ``max_pixels`` are decoded at 1/2, 1/4 or 1/8 scale straight from the DCT,
+    so the full-size bitmap is never held in memory.
+    """
+    from PIL import Image
+
+    original = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    image = original
+    width, height = image.size
+    orientation = image.getexif().get(0x0112, 1)
+    if orientation in _TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+
+    if max_pixels and width * height > max_pixels:
+        ratio = (max_pixels / (width * height)) ** 0.5
+        # draft() only ever scales down to at least the requested size; no-op for non-JPEG
+        image.draft("RGB", (int(image.width * ratio), int(image.height * ratio)))
+        if image.width * image.height > max_pixels:
+            ratio = (max_pixels / (image.width * image.height)) ** 0.5
+            image = image.resize((max(1, int(image.width * ratio)), max(1, int(image.height * ratio))), Image.BILINEAR)
+    # Unlike ImageOps.exif_transpose this does not copy upright images
+    transform = _orientation_transform(orientation)
+    if transform is not None:
+        image = image.transpose(transform)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if image is not original:
+        original.close()
+    return image, width, height
+
+def decode_image(source: ImageSource, channel_order: Literal["RGB", "BGR"] = "RGB",
+                 max_pixels: Optional[int] = None) -> DecodedImage:
+    """Decode a path, encoded bytes or an ``H x W x 3`` RGB array exactly once."""
+    import numpy as np
+
+    if isinstance(source, np.ndarray):
+        array = source
+        if array.ndim == 2:
+            array = np.repeat(array[:, :, None], 3, axis=2)
+        elif array.shape[2] == 4:
+            array = array[:, :, :3]
+        if channel_order == "BGR":
+            array = np.ascontiguousarray(array[:, :, ::-1])
+        array = np.ascontiguousarray(array, dtype=np.uint8)
+        height, width = array.shape[:2]
+        return DecodedImage(array, channel_order, width, height)
+
+    image, width, height = open_upright(source, max_pixels)
+    try:
+        array = np.array(image)
+    finally:
+        image.close()
+    if channel_order == "BGR":
+        array = _swap_channels(array)
+    return DecodedImage(array, channel_order, width, height, scale=array.shape[1] / width)
@@ -0,0 +1,365 @@
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import logging
+import math
+import random
+import threading
+import time
+from typing import Any, Coroutine, List, Optional, Sequence
+from . import config
+from .ocr_cache import OCRResultCache
+from .recognition_batching import _to_pil
+
+logger = logging.getLogger(__name__)
+
+# Part of every cache key and of the engine version: bump when a prompt changes
+PROMPT_VERSION = "1"
+
+CROPS_PROMPT = (
+    "Each image is one line of text cropped from a scanned document, most likely in Vietnamese. "
+    "Transcribe each image exactly, keeping diacritics, digits and punctuation. "
+    'Reply with JSON only: {"texts": [...]} holding one string per image, in the order given; '
+    'use "" for an image without readable text.'
+)
+PAGE_PROMPT = (
+    "Find every line of text in this scanned document image ({width}x{height} pixels), "
+    "most likely in Vietnamese, and transcribe it exactly. "
+    'Reply with JSON only: {{"lines": [{{"text": "...", "bbox": [x1, y1, x2, y2]}}]}} '
+    "with each bbox in pixels of this image, top to bottom."
+)
+
+# Worth retrying: rate limited, overloaded or a transient server error
+_RETRY_STATUSES = (408, 409, 429, 500, 502, 503, 504)
+_BACKOFF_BASE_SECONDS = 1.0
+_BACKOFF_MAX_SECONDS = 60.0
+
+class LlmError(RuntimeError):
+    pass
+
+class AsyncRateLimiter:
+    """Token bucket holding up to ``per_minute`` units, refilled continuously; 0 disables it."""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self._available = float(per_minute)
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._available = min(self.per_minute, self._available + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1):
+        if self.per_minute <= 0:
+            return
+        # A request larger than the whole bucket still goes through, on an otherwise empty minute
+        amount = min(amount, self.per_minute)
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # One waiter at a time, so large requests are not starved by small ones
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._available >= amount:
+                    self._available -= amount
+                    return
+                await asyncio.sleep((amount - self._available) * 60 / self.per_minute)
+
+    def correct(self, amount: float):
+        """Charge (or refund, if negative) the difference between actual and estimated usage."""
+        if self.per_minute > 0:
+            self._refill()
+            self._available = min(self.per_minute, self._available - amount)
+
+def _parse_json(reply: str) -> Any:
+    # Models without a JSON mode like to wrap the object in a ```json fence
+    start, end = reply.find("{"), reply.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        return json.loads(reply[start:end + 1])
+    except ValueError:
+        return None
+
+def _image_tokens(width: int, height: int) -> int:
+    # OpenAI's high-detail pricing: 85 tokens plus 170 per 512 px tile
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+class LlmClient:
+    """Chat completions against an OpenAI-compatible endpoint.
+
+    Requests run on one event loop in a background thread, over a pooled
+    ``httpx.AsyncClient``, so any number of caller threads share the same
+    connections, concurrency limit and request/token rate limits. Failed
+    requests are retried with exponential backoff and jitter, honouring
+    ``Retry-After``.
+    """
+
+    def __init__(self, base_url: str, api_key: str, model: str, max_concurrency: int,
+                 requests_per_minute: float, tokens_per_minute: float, timeout: float,
+                 max_retries: int, max_tokens: int, json_mode: bool):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_tokens = max_tokens
+        self.json_mode = json_mode
+        self.requests = AsyncRateLimiter(requests_per_minute)
+        self.tokens = AsyncRateLimiter(tokens_per_minute)
+        self._http = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True)
+        self._thread.start()
+
+    def run(self, coroutine: Coroutine):
+        """Run a coroutine on the client's loop from any other thread and wait for it."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def _client(self):
+        import httpx
+
+        if self._http is None:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._http
+
+    async def chat(self, content: List[dict], estimated_tokens: int) -> str:
+        """One user message in, the reply's text out."""
+        import httpx
+
+        client = self._client()
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": content}],
+            "temperature": 0,
+            "max_tokens": self.max_tokens,
+        }
+        if self.json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        estimated_tokens += self.max_tokens
+
+        for attempt in range(self.max_retries + 1):
+            await self.requests.acquire()
+            await self.tokens.acquire(estimated_tokens)
+            retry_after = None
+            async with self._semaphore:
+                try:
+                    response = await client.post("/chat/completions", json=payload)
+                except httpx.TransportError as exc:
+                    error = f"{type(exc).__name__}: {exc}"
+                else:
+                    if response.status_code == 200:
+                        try:
+                            body = response.json()
+                            used = (body.get("usage") or {}).get("total_tokens")
+                            reply = body["choices"][0]["message"]["content"] or ""
+                            if not isinstance(reply, str):
+                                raise TypeError(type(reply).__name__)
+                        except (ValueError, TypeError, KeyError, IndexError, AttributeError):
+                            # An HTML error page or an error object behind a 200; treated like a 5xx
+                            error = f"Malformed response: {response.text[:200]}"
+                        else:
+                            if isinstance(used, (int, float)) and used:
+                                self.tokens.correct(used - estimated_tokens)
+                            return reply
+                    else:
+                        error = f"HTTP {response.status_code}: {response.text[:200]}"
+                    if response.status_code != 200 and response.status_code not in _RETRY_STATUSES:
+                        raise LlmError(error)
+                    try:
+                        retry_after = float(response.headers.get("retry-after", ""))
+                    except ValueError:
+                        pass
+            if attempt == self.max_retries:
+                raise LlmError(f"Giving up after {attempt + 1} attempts: {error}")
+            delay = min(_BACKOFF_MAX_SECONDS, _BACKOFF_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+            delay = max(delay, retry_after or 0)
+            logger.warning("LLM request failed (%s), retrying in %.1fs", error, delay)
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+class LlmRecognizer:
+    """Reads text crops, or whole pages, with a multimodal LLM.
+
+    ``recognize`` has the signature of the other engines' recognizers: crops
+    go out ``crops_per_request`` at a time, all batches of a call in
+    parallel, and each crop's text is cached on disk by its pixels, so
+    re-running detection only pays for crops that changed.
+    """
+
+    def __init__(self, client: LlmClient, cache: Optional[OCRResultCache], crops_per_request: int,
+                 page_max_side: int):
+        self.client = client
+        self.cache = cache
+        self.crops_per_request = max(1, crops_per_request)
+        self.page_max_side = page_max_side
+
+    def _cache_key(self, kind: str, png: bytes) -> str:
+        return OCRResultCache.make_key(hashlib.sha256(png).hexdigest(), {
+            "kind": kind, "model": self.client.model, "base_url": self.client.base_url, "prompt": PROMPT_VERSION,
+        })
+
+    def _cached(self, key: str) -> Optional[list]:
+        return self.cache.get(key) if self.cache is not None else None
+
+    def _store(self, key: str, value: list):
+        if self.cache is not None:
+            self.cache.put(key, value)
+
+    @staticmethod
+    def _png(image) -> tuple:
+        image = _to_pil(image).convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        return buffer.getvalue(), image.size
+
+    @staticmethod
+    def _image_part(png: bytes) -> dict:
+        url = "data:image/png;base64," + base64.b64encode(png).decode("ascii")
+        return {"type": "image_url", "image_url": {"url": url}}
+
+    def recognize(self, images: Sequence, max_batch_size: int = 32, bucket_width: int = 64) -> List[str]:
+        """Texts of RGB crops (arrays or PIL images), in input order."""
+        if not images:
+            return []
+        encoded = [self._png(image) for image in images]
+        # The cache does file I/O; keep it off the client loop that all jobs share
+        keys = [self._cache_key("crop", png) for png, _ in encoded]
+        texts: List[Optional[str]] = [None] * len(encoded)
+        missing = []
+        for i, key in enumerate(keys):
+            cached = self._cached(key)
+            if cached is not None:
+                texts[i] = cached[0]
+            else:
+                missing.append(i)
+        if missing:
+            results = self.client.run(self._recognize([encoded[i] for i in missing]))
+            for i, text in zip(missing, results):
+                # None: the reply could not be read, so nothing is cached and the crop is retried next time
+                if text is not None:
+                    self._store(keys[i], [text])
+                texts[i] = text or ""
+        return texts
+
+    async def _recognize(self, encoded: List[tuple]) -> List[Optional[str]]:
+        batches = [encoded[i:i + self.crops_per_request] for i in range(0, len(encoded), self.crops_per_request)]
+        results = await asyncio.gather(*(self._recognize_batch(batch) for batch in batches))
+        return [text for batch_texts in results for text in batch_texts]
+
+    async def _recognize_batch(self, encoded: List[tuple]) -> List[Optional[str]]:
+        content = [{"type": "text", "text": CROPS_PROMPT}] + [self._image_part(png) for png, _ in encoded]
+        estimated = len(CROPS_PROMPT) // 4 + sum(_image_tokens(*size) for _, size in encoded)
+        reply = await self.client.chat(content, estimated)
+        parsed = _parse_json(reply)
+        texts = parsed.get("texts") if isinstance(parsed, dict) else None
+        if isinstance(texts, list) and len(texts) == len(encoded):
+            return ["" if text is None else str(text) for text in texts]
+        if len(encoded) == 1:
+            # Malformed JSON or a refusal is not the crop's text
+            logger.warning("Unreadable LLM reply for a crop: %s", reply[:200])
+            return [None]
+        # Lost count of the images: ask again in halves
+        logger.warning("LLM returned %s texts for %d crops, splitting the batch",
+                       len(texts) if isinstance(texts, list) else "no", len(encoded))
+        half = len(encoded) // 2
+        first, second = await asyncio.gather(
+            self._recognize_batch(encoded[:half]), self._recognize_batch(encoded[half:])
+        )
+        return first + second
+
+    def read_page(self, image) -> List[dict]:
+        """Lines of a whole RGB page as ``{"bbox": [x1, y1, x2, y2], "text"}`` in the page's pixels."""
+        from PIL import Image
+
+        page = _to_pil(image).convert("RGB")
+        scale = min(1.0, self.page_max_side / max(page.size)) if self.page_max_side else 1.0
+        if scale < 1.0:
+            page = page.resize((max(1, round(page.width * scale)), max(1, round(page.height * scale))), Image.LANCZOS)
+        png, size = self._png(page)
+        key = self._cache_key("page", png)
+        lines = self._cached(key)
+        if lines is None:
+            lines = self.client.run(self._read_page(png, size))
+            self._store(key, lines)
+        return [
+            {"bbox": [value / scale for value in line["bbox"]], "text": line["text"]}
+            for line in lines
+        ]
+
+    async def _read_page(self, png: bytes, size: tuple) -> List[dict]:
+        prompt = PAGE_PROMPT.format(width=size[0], height=size[1])
+        content = [{"type": "text", "text": prompt}, self._image_part(png)]
+        reply = await self.client.chat(content, len(prompt) // 4 + _image_tokens(*size))
+        parsed = _parse_json(reply)
+        if not isinstance(parsed, dict) or not isinstance(parsed.get("lines"), list):
+            raise LlmError(f"Unexpected reply for a page: {reply[:200]}")
+        lines = []
+        for line in parsed["lines"]:
+            bbox = line.get("bbox") if isinstance(line, dict) else None
+            if not isinstance(bbox, list) or len(bbox) != 4:
+                continue
+            try:
+                x1, y1, x2, y2 = (float(value) for value in bbox)
+            except (TypeError, ValueError):
+                continue
+            x1, x2 = sorted((min(max(x1, 0), size[0]), min(max(x2, 0), size[0])))
+            y1, y2 = sorted((min(max(y1, 0), size[1]), min(max(y2, 0), size[1])))
+            if x2 > x1 and y2 > y1:
+                lines.append({"bbox": [x1, y1, x2, y2], "text": str(line.get("text") or "")})
+        return lines
+
+def _load_detector(name: str):
+    if not name:
+        return None
+    if name == "onnx":
+        from .onnx_engine import OnnxTextDetector, create_session, resolve_model_files
+        return OnnxTextDetector(create_session(resolve_model_files()["det"]))
+    if name == "paddle":
+        from paddlex import create_model
+        return create_model("PP-OCRv4_server_det")
+    raise ValueError(f"Unsupported LLM_DETECTOR: {name}")
+
+def model_version() -> str:
+    return f"llm:{config.LLM_MODEL}:{config.LLM_DETECTOR or 'page'}:prompt{PROMPT_VERSION}"
+
+def load_models() -> dict:
+    client = LlmClient(
+        config.LLM_BASE_URL,
+        config.LLM_API_KEY,
+        config.LLM_MODEL,
+        max_concurrency=config.LLM_MAX_CONCURRENCY,
+        requests_per_minute=config.LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute=config.LLM_TOKENS_PER_MINUTE,
+        timeout=config.LLM_TIMEOUT_SECONDS,
+        max_retries=config.LLM_MAX_RETRIES,
+        max_tokens=config.LLM_MAX_TOKENS,
+        json_mode=config.LLM_JSON_MODE,
+    )
+    cache = None
+    if config.LLM_CACHE_ENABLED:
+        cache = OCRResultCache(config.LLM_CACHE_DIR, config.LLM_CACHE_MAX_MB * 1024 * 1024)
+    return {
+        # None: the LLM reads whole pages and finds the lines itself
+        "detector": _load_detector(config.LLM_DETECTOR),
+        "recognizer": LlmRecognizer(client, cache, config.LLM_CROPS_PER_REQUEST, config.LLM_PAGE_MAX_SIDE),
+    }
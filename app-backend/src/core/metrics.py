@@ -0,0 +1,118 @@
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+# Sub-millisecond crops up to multi-second detections on large pages
+_STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being served", ["method"], multiprocess_mode="livesum"
+)
+OCR_STAGE_SECONDS = Histogram(
+    "ocr_stage_duration_seconds", "Time per OCR pipeline stage and image",
+    ["engine", "stage"], buckets=_STAGE_BUCKETS,
+)
+OCR_MODEL_LOADS = Counter("ocr_model_loads_total", "OCR engine model loads", ["engine", "result"])
+OCR_MODEL_LOAD_SECONDS = Histogram(
+    "ocr_model_load_duration_seconds", "Time to load (and warm up) an OCR engine",
+    ["engine"], buckets=(0.5, 1, 2.5, 5, 10, 20, 40, 80, 160),
+)
+OCR_JOBS = Counter("ocr_jobs_total", "Finished detect-text jobs", ["engine", "status", "cache"])
+DB_COMMITS = Counter("db_commits_total", "Database transaction commits")
+
+# Worker processes cannot be scraped. They record into this buffer instead and
+# hand the events back with each result, to be replayed in the serving process.
+_buffer: Optional[List[Tuple[str, tuple]]] = None
+_buffer_lock = threading.Lock()
+
+def buffer_events():
+    """Switch this process to buffering; call once in OCR worker processes."""
+    global _buffer
+    _buffer = []
+
+def drain() -> List[Tuple[str, tuple]]:
+    global _buffer
+    if _buffer is None:
+        return []
+    with _buffer_lock:
+        events, _buffer = _buffer, []
+    return events
+
+def replay(events: Iterable[Tuple[str, tuple]]):
+    for kind, args in events:
+        _RECORDERS[kind](*args)
+
+def _record(kind: str, *args):
+    if _buffer is not None:
+        with _buffer_lock:
+            _buffer.append((kind, args))
+    else:
+        _RECORDERS[kind](*args)
+
+def _observe_stage(engine: str, stage: str, seconds: float):
+    OCR_STAGE_SECONDS.labels(engine, stage).observe(seconds)
+
+def _model_load(engine: str, seconds: Optional[float], ok: bool):
+    OCR_MODEL_LOADS.labels(engine, "success" if ok else "failure").inc()
+    if ok and seconds is not None:
+        OCR_MODEL_LOAD_SECONDS.labels(engine).observe(seconds)
+
+_RECORDERS: Dict[str, Callable] = {
+    "stage": _observe_stage,
+    "model_load": _model_load,
+}
+
+def observe_stage(engine: str, stage: str, seconds: float):
+    _record("stage", engine, stage, seconds)
+
+def record_model_load(engine: str, seconds: Optional[float], ok: bool):
+    _record("model_load", engine, seconds, ok)
+
+class _CallbackGauge:
+    """Gauge read from a callback at scrape time, e.g. the size of a queue."""
+
+    def __init__(self, name: str, documentation: str, labels: List[str], callback: Callable[[], Iterable[tuple]]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.callback = callback
+
+    def collect(self):
+        family = GaugeMetricFamily(self.name, self.documentation, labels=self.labels)
+        for *label_values, value in self.callback():
+            family.add_metric([str(v) for v in label_values], value)
+        yield family
+
+_callback_gauges: List[_CallbackGauge] = []
+
+def register_gauge_callback(name: str, documentation: str, labels: List[str], callback: Callable[[], Iterable[tuple]]):
+    """``callback`` yields ``(*label_values, value)`` tuples."""
+    gauge = _CallbackGauge(name, documentation, labels, callback)
+    _callback_gauges.append(gauge)
+    REGISTRY.register(gauge)
+
+def multiprocess_mode() -> bool:
+    # Set by serve.py before anything imports prometheus_client
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+def render() -> Tuple[bytes, str]:
+    if not multiprocess_mode():
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    # Counters and histograms summed over all server workers; callback gauges
+    # describe the worker that happens to serve the scrape
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    for gauge in _callback_gauges:
+        registry.register(gauge)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid: int):
+    if multiprocess_mode():
+        multiprocess.mark_process_dead(pid)
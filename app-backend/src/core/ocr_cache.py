@@ -0,0 +1,141 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import List, Optional
+from . import config
+
+logger = logging.getLogger(__name__)
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class OCRResultCache:
+    """On-disk cache of ``TextRecognitionService.process_image`` results.
+
+    Entries are JSON files fanned out by key prefix. A hit touches the file's
+    mtime, so evicting the oldest mtimes first gives LRU behaviour that is
+    shared by every process pointing at the same directory.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(content_hash: str, params: dict) -> str:
+        payload = json.dumps({"image": content_hash, **params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key[2:4], f"{key}.json")
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                labels = json.load(f)["labels"]
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return labels
+
+    def put(self, key: str, labels: List[dict]):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps({"labels": labels, "created_at": time.time()}, ensure_ascii=False).encode("utf-8")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.exception("Failed to write OCR cache entry %s", key)
+            return
+        with self._lock:
+            self._size = (self._size if self._size is not None else self._scan_size()) + len(data)
+            over_limit = self._size > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def _entries(self) -> List[os.DirEntry]:
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        stack = [self.directory]
+        while stack:
+            for entry in os.scandir(stack.pop()):
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.name.endswith(".json"):
+                    entries.append(entry)
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def evict(self):
+        """Drop least recently used entries until the cache is at 90% of its limit."""
+        with self._lock:
+            entries = []
+            for entry in self._entries():
+                try:
+                    entries.append((entry.stat().st_mtime, entry.stat().st_size, entry.path))
+                except OSError:
+                    continue
+            size = sum(s for _, s, _ in entries)
+            target = int(self.max_bytes * 0.9)
+            for _, entry_size, path in sorted(entries):
+                if size <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                size -= entry_size
+                self.evictions += 1
+            self._size = size
+
+    def clear(self) -> int:
+        removed = 0
+        with self._lock:
+            for entry in self._entries():
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+            self._size = 0
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            lookups = self.hits + self.misses
+            return {
+                "enabled": config.OCR_CACHE_ENABLED,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+ocr_cache = OCRResultCache(config.OCR_CACHE_DIR, config.OCR_CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,460 @@
+import json
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import case, delete, or_, update
+from . import config, metrics, tracing
+from .engine_registry import available_engines, engine_status, get_engine, start_preload
+from .ocr_cache import file_sha256, ocr_cache
+from .ownership import current_owner, owner_alive
+from ..database.database import SessionLocal
+from ..models.ocr_job import OCRJobRecord
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+def _init_worker(engine: str, warmup: bool):
+    # Runs once in each worker process so the models stay resident between jobs
+    metrics.buffer_events()
+    try:
+        get_engine(engine).load(warmup=warmup)
+    except Exception:
+        # Logged by the registry; the first job will retry the load
+        pass
+
+def _ping(engine: str) -> dict:
+    return dict(get_engine(engine).status(), metric_events=metrics.drain())
+
+def _update_job(job_id: str, values: dict, *conditions) -> bool:
+    db = SessionLocal()
+    try:
+        result = db.execute(update(OCRJobRecord).where(OCRJobRecord.id == job_id, *conditions).values(**values))
+        db.commit()
+        return result.rowcount > 0
+    finally:
+        db.close()
+
+def _run_detection(engine: str, image_path: str, job_id: Optional[str] = None) -> dict:
+    from ..services.text_recognition_service import TextRecognitionService
+
+    # Any worker may have cancelled the job while it was queued
+    if job_id is not None and not _update_job(
+        job_id, {"status": "running"}, OCRJobRecord.status == "queued", OCRJobRecord.cancel_requested.is_(False)
+    ):
+        return {"cancelled": True, "labels": [], "stages": [], "metric_events": metrics.drain()}
+
+    # (stage, start, end) in wall-clock time, turned into spans by the serving process
+    stages = []
+    def on_stage(stage: str, seconds: float):
+        end = time.time()
+        stages.append((stage, end - seconds, end))
+
+    handle = get_engine(engine)
+    if not handle.ready:
+        started = time.time()
+        handle.load(warmup=False)
+        stages.append(("model_load", started, time.time()))
+    labels = TextRecognitionService(engine=engine, on_stage=on_stage).process_image(image_path)
+    # Metrics recorded in a worker process travel back with the result
+    return {"labels": labels, "stages": stages, "metric_events": metrics.drain()}
+
+def cache_params(engine: str) -> dict:
+    """Everything besides the image bytes that can change an engine's output."""
+    params = {
+        "engine": engine,
+        "version": get_engine(engine).version,
+        "cache_version": config.OCR_CACHE_VERSION,
+        # Boxes are found on the EXIF-upright image, downscaled past this size
+        "orientation": "exif",
+        "max_pixels": config.OCR_MAX_IMAGE_PIXELS,
+    }
+    if engine in ("paddle", "onnx"):
+        params["bucket_width"] = config.OCR_RECOGNIZER_BUCKET_WIDTH
+    if config.OCR_TILE_MIN_SIDE:
+        params["tiling"] = [config.OCR_TILE_MIN_SIDE, config.OCR_TILE_SIZE, config.OCR_TILE_OVERLAP]
+    return params
+
+def _persist_labels(image_id: int, labels: List[dict], replace: bool = False, merge: bool = False) -> List[dict]:
+    from ..database.database import SessionLocal
+    from ..schemas.label import Label as LabelSchema
+    from ..services.label_service import LabelService
+
+    db = SessionLocal()
+    try:
+        service = LabelService(db)
+        if merge and not replace:
+            merged = service.merge_labels(image_id, labels, config.LABEL_MERGE_IOU)
+            if merged is None:
+                raise ValueError(f"Image {image_id} not found")
+            created = merged["labels"]
+        else:
+            created = service.create_labels(image_id, labels, replace=replace)
+        return [LabelSchema.model_validate(label).model_dump() for label in created]
+    finally:
+        db.close()
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def _job_dict(record: OCRJobRecord, with_result: bool = False) -> dict:
+    job = {
+        "job_id": record.id,
+        "engine": record.engine,
+        "project_id": record.project_id,
+        "image_id": record.image_id,
+        "status": record.status,
+        "cache_hit": record.cache_hit,
+        "error": record.error,
+        "created_at": record.created_at,
+        "finished_at": record.finished_at,
+    }
+    if with_result:
+        job["result"] = json.loads(record.result) if record.result is not None else None
+    return job
+
+class OCRJob:
+    def __init__(self, engine: str, project_id: int, image_id: int, image_path: str, replace: bool = False,
+                 merge: bool = False):
+        self.id = uuid.uuid4().hex
+        self.engine = engine
+        self.project_id = project_id
+        self.image_id = image_id
+        self.image_path = image_path
+        self.replace = replace
+        self.merge = merge
+        self.cache_key: Optional[str] = None
+        self.cache_hit = False
+        self.status = "queued"
+        self.result: Optional[List[dict]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.cancel_requested = False
+        # Resolves once the job is finished *and* its labels are persisted
+        self.done: Future = Future()
+        self._future: Optional[Future] = None
+        # The submitting request's span, so the job shows up in its trace
+        self.trace_parent = tracing.current()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> dict:
+        status = self.status
+        if status == "queued" and self._future is not None and self._future.running():
+            status = "running"
+        return {
+            "job_id": self.id,
+            "engine": self.engine,
+            "project_id": self.project_id,
+            "image_id": self.image_id,
+            "status": status,
+            "cache_hit": self.cache_hit,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+class OCRJobManager:
+    """Runs detect-text jobs on a bounded executor per engine.
+
+    In ``process`` mode every engine gets its own pool of worker processes
+    that load the models once and keep them; ``thread`` mode runs jobs in
+    this process against the shared engine registry.
+
+    Job status and results are kept in the ``ocr_jobs`` table so any server
+    worker can report on or cancel a job; only the unfinished jobs of this
+    process are held in memory.
+    """
+
+    def __init__(self):
+        self._executors: Dict[str, Executor] = {}
+        self._jobs: Dict[str, OCRJob] = {}
+        self._worker_status: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+
+    def _create_executor(self, engine: str) -> Executor:
+        workers = config.ocr_job_workers(engine)
+        if config.OCR_WORKER_MODE == "thread":
+            return ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"ocr-{engine}")
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(engine, config.OCR_WARMUP),
+        )
+
+    def _executor(self, engine: str) -> Executor:
+        with self._lock:
+            executor = self._executors.get(engine)
+            if executor is None:
+                get_engine(engine)  # validate the name before spinning up workers
+                executor = self._create_executor(engine)
+                self._executors[engine] = executor
+            return executor
+
+    def _reset_executor(self, engine: str):
+        with self._lock:
+            executor = self._executors.pop(engine, None)
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def preload(self, engines: Iterable[str]):
+        engines = list(engines)
+        if config.OCR_WORKER_MODE == "thread":
+            start_preload(engines, warmup=config.OCR_WARMUP)
+            return
+        for engine in engines:
+            executor = self._executor(engine)
+            # Process pools spawn workers on demand; one ping per slot starts them all
+            for _ in range(config.ocr_job_workers(engine)):
+                future = executor.submit(_ping, engine)
+                future.add_done_callback(lambda f, engine=engine: self._on_ping(engine, f))
+
+    def _on_ping(self, engine: str, future: Future):
+        if not future.cancelled() and future.exception() is None:
+            status = future.result()
+            metrics.replay(status.pop("metric_events", []))
+            self._worker_status[engine] = status
+
+    def engine_status(self) -> List[dict]:
+        """Readiness as seen by whatever actually runs the jobs."""
+        if config.OCR_WORKER_MODE == "thread":
+            return engine_status()
+        statuses = []
+        for engine in available_engines():
+            status = self._worker_status.get(engine) or get_engine(engine).status()
+            statuses.append(dict(status, workers=config.ocr_job_workers(engine)))
+        return statuses
+
+    def submit(self, engine: str, project_id: int, image_id: int, image_path: str,
+               replace: bool = False, use_cache: bool = True, content_hash: Optional[str] = None,
+               merge: bool = False) -> OCRJob:
+        """Queue detection for one image; with ``replace`` its old labels are dropped on success.
+
+        With ``merge``, detections overlapping an existing label by LABEL_MERGE_IOU
+        are not added again and the job's result lists the labels they matched.
+
+        Without ``content_hash`` the image file is hashed here, so async callers
+        should run this off the event loop. With ``use_cache=False`` the cache
+        is bypassed but refreshed with the new result.
+        """
+        self._prune()
+        job = OCRJob(engine, project_id, image_id, image_path, replace=replace, merge=merge)
+        cached = None
+        if config.OCR_CACHE_ENABLED:
+            try:
+                job.cache_key = ocr_cache.make_key(content_hash or file_sha256(image_path), cache_params(engine))
+            except OSError:
+                # Unreadable file; let the worker report the real error
+                job.cache_key = None
+            if job.cache_key and use_cache:
+                cached = ocr_cache.get(job.cache_key)
+                job.cache_hit = cached is not None
+        self._insert(job)
+        if job.cache_hit:
+            future = Future()
+            future.set_running_or_notify_cancel()
+            future.set_result({"labels": cached, "stages": []})
+        else:
+            try:
+                future = self._executor(engine).submit(_run_detection, engine, image_path, job.id)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM); start a fresh pool and try once more
+                self._reset_executor(engine)
+                future = self._executor(engine).submit(_run_detection, engine, image_path, job.id)
+        job._future = future
+        with self._lock:
+            self._jobs[job.id] = job
+        future.add_done_callback(lambda f: self._on_done(job, f))
+        return job
+
+    def _insert(self, job: OCRJob):
+        db = SessionLocal()
+        try:
+            db.add(OCRJobRecord(
+                id=job.id, engine=job.engine, project_id=job.project_id, image_id=job.image_id,
+                cache_hit=job.cache_hit, owner=current_owner(), created_at=job.created_at,
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+    def job_info(self, job_id: str, with_result: bool = False) -> Optional[dict]:
+        """A job submitted to any worker, or None once unknown or pruned."""
+        db = SessionLocal()
+        try:
+            record = db.get(OCRJobRecord, job_id)
+            if record is None:
+                return None
+            self._check_owner(db, record)
+            return _job_dict(record, with_result)
+        finally:
+            db.close()
+
+    def list_jobs(self) -> List[dict]:
+        cutoff = time.time() - config.OCR_JOB_TTL_SECONDS
+        db = SessionLocal()
+        try:
+            records = (
+                db.query(OCRJobRecord)
+                .filter(or_(OCRJobRecord.finished_at.is_(None), OCRJobRecord.finished_at >= cutoff))
+                .order_by(OCRJobRecord.created_at)
+                .all()
+            )
+            for record in records:
+                self._check_owner(db, record)
+            return [_job_dict(record) for record in records]
+        finally:
+            db.close()
+
+    def _check_owner(self, db, record: OCRJobRecord):
+        if record.status in FINISHED_STATUSES or owner_alive(record.owner):
+            return
+        record.status = "failed"
+        record.error = "The worker running this job stopped"
+        record.finished_at = time.time()
+        db.commit()
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            job.cancel_requested = True
+            # Queued jobs are dropped right away; running ones finish but are not persisted
+            job._future.cancel()
+        # Jobs of other workers see the flag when they start or finish
+        queued = OCRJobRecord.status == "queued"
+        _update_job(
+            job_id,
+            {
+                "cancel_requested": True,
+                "status": case((queued, "cancelled"), else_=OCRJobRecord.status),
+                "finished_at": case((queued, time.time()), else_=OCRJobRecord.finished_at),
+            },
+            OCRJobRecord.status.in_(("queued", "running")),
+        )
+        return self.job_info(job_id)
+
+    def _cancel_requested(self, job: OCRJob) -> bool:
+        db = SessionLocal()
+        try:
+            return bool(db.query(OCRJobRecord.cancel_requested).filter(OCRJobRecord.id == job.id).scalar())
+        finally:
+            db.close()
+
+    def _on_done(self, job: OCRJob, future: Future):
+        stages = []
+        try:
+            if future.cancelled() or job.cancel_requested:
+                job.status = "cancelled"
+            elif future.exception() is not None:
+                job.status = "failed"
+                job.error = str(future.exception())
+            else:
+                output = future.result()
+                metrics.replay(output.get("metric_events", []))
+                if output.get("cancelled") or self._cancel_requested(job):
+                    job.status = "cancelled"
+                else:
+                    stages = list(output["stages"])
+                    labels = output["labels"]
+                    if job.cache_key and not job.cache_hit:
+                        ocr_cache.put(job.cache_key, labels)
+                    started = time.time()
+                    job.result = _persist_labels(job.image_id, labels, replace=job.replace, merge=job.merge)
+                    stages.append(("persist", started, time.time()))
+                    metrics.observe_stage(job.engine, "persist", stages[-1][2] - started)
+                    job.status = "succeeded"
+        except Exception as exc:
+            logger.exception("OCR job %s failed while saving results", job.id)
+            job.status = "failed"
+            job.error = str(exc)
+        finally:
+            job.finished_at = time.time()
+            self._store(job)
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            self._record(job, stages)
+            job.done.set_result(job)
+
+    def _store(self, job: OCRJob):
+        try:
+            _update_job(
+                job.id,
+                {
+                    "status": job.status,
+                    "error": job.error,
+                    "result": json.dumps(job.result, default=_json_default) if job.result is not None else None,
+                    "finished_at": job.finished_at,
+                },
+                # A queued job cancelled elsewhere is already final
+                OCRJobRecord.status.in_(("queued", "running")),
+            )
+        except Exception:
+            logger.exception("Could not store the outcome of OCR job %s", job.id)
+
+    def _record(self, job: OCRJob, stages: list):
+        cache = "off" if job.cache_key is None else ("hit" if job.cache_hit else "miss")
+        metrics.OCR_JOBS.labels(job.engine, job.status, cache).inc()
+        attributes = {"ocr.engine": job.engine, "ocr.image_id": job.image_id, "ocr.cache": cache}
+        context = tracing.record_span(
+            "ocr.job", job.created_at, job.finished_at, job.trace_parent,
+            status="OK" if job.status == "succeeded" else "ERROR", **attributes,
+        )
+        if context is None or not context.sampled:
+            return
+        worker_stages = [stage for stage in stages if stage[0] != "persist"]
+        if worker_stages:
+            # Time spent waiting for a free worker
+            tracing.record_span("ocr.queue", job.created_at, worker_stages[0][1], context, **attributes)
+        for stage, start, end in stages:
+            tracing.record_span(f"ocr.{stage}", start, end, context, **attributes)
+
+    def pending_counts(self):
+        """``(engine, state, count)`` for unfinished jobs, read by the queue depth gauge."""
+        counts: Dict[tuple, int] = {}
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if not job.finished:
+                state = "running" if job._future is not None and job._future.running() else "queued"
+                counts[(job.engine, state)] = counts.get((job.engine, state), 0) + 1
+        for engine in available_engines():
+            for state in ("queued", "running"):
+                yield engine, state, counts.get((engine, state), 0)
+
+    def _prune(self):
+        now = time.time()
+        if now - self._pruned_at < 60:
+            return
+        self._pruned_at = now
+        db = SessionLocal()
+        try:
+            db.execute(delete(OCRJobRecord).where(OCRJobRecord.finished_at < now - config.OCR_JOB_TTL_SECONDS))
+            db.commit()
+        finally:
+            db.close()
+
+    def shutdown(self):
+        with self._lock:
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+job_manager = OCRJobManager()
+metrics.register_gauge_callback(
+    "ocr_jobs_pending", "Unfinished detect-text jobs", ["engine", "state"], job_manager.pending_counts
+)
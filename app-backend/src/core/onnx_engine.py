@@ -0,0 +1,213 @@
+import json
+import logging
+import math
+import os
+from typing import Dict, List, Optional, Sequence
+from . import config
+from .recognition_batching import _make_buckets, _to_pil
+
+logger = logging.getLogger(__name__)
+
+# File names written by benchmarks/export_onnx.py
+DET_MODEL = "det.onnx"
+REC_ENCODER = "rec_encoder.onnx"
+REC_DECODER = "rec_decoder.onnx"
+REC_CONFIG = "rec_config.json"
+
+# PP-OCRv4 det preprocessing, applied to BGR input like PaddleOCR does
+_DET_MEAN = (0.485, 0.456, 0.406)
+_DET_STD = (0.229, 0.224, 0.225)
+
+def _quantized_name(name: str) -> str:
+    root, ext = os.path.splitext(name)
+    return f"{root}.int8{ext}"
+
+def resolve_model_files(model_dir: str = config.ONNX_MODEL_DIR, quantized: bool = config.ONNX_QUANTIZED) -> Dict[str, str]:
+    """Pick the int8 variant of each model when asked for and present, the float one otherwise."""
+    files = {}
+    for role, name in (("det", DET_MODEL), ("rec_encoder", REC_ENCODER), ("rec_decoder", REC_DECODER)):
+        path = os.path.join(model_dir, name)
+        int8_path = os.path.join(model_dir, _quantized_name(name))
+        files[role] = int8_path if quantized and os.path.exists(int8_path) else path
+    files["rec_config"] = os.path.join(model_dir, REC_CONFIG)
+    return files
+
+def model_version(model_dir: str = config.ONNX_MODEL_DIR, quantized: bool = config.ONNX_QUANTIZED) -> str:
+    """Names and sizes of the model files in use, so re-exports change the OCR cache key."""
+    parts = []
+    for role, path in resolve_model_files(model_dir, quantized).items():
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        parts.append(f"{os.path.basename(path)}:{size}")
+    return "onnx:" + ",".join(parts)
+
+def create_session(path: str, intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None):
+    import onnxruntime as ort
+
+    # Read at call time: serve.py adjusts the thread settings per worker
+    intra_op_threads = config.ONNX_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+    inter_op_threads = config.ONNX_INTER_OP_THREADS if inter_op_threads is None else inter_op_threads
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"ONNX model not found: {path} (run python -m benchmarks.export_onnx)")
+    options = ort.SessionOptions()
+    # 0 keeps onnxruntime's default of one thread per physical core
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.execution_mode = (
+        ort.ExecutionMode.ORT_PARALLEL if inter_op_threads > 1 else ort.ExecutionMode.ORT_SEQUENTIAL
+    )
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+def preprocess_det(image, limit_side_len: int):
+    """BGR ``H x W x 3`` uint8 -> normalized NCHW float32, sides rounded to multiples of 32."""
+    import cv2
+    import numpy as np
+
+    height, width = image.shape[:2]
+    ratio = min(1.0, limit_side_len / max(height, width))
+    resized_h = max(32, int(round(height * ratio / 32)) * 32)
+    resized_w = max(32, int(round(width * ratio / 32)) * 32)
+    resized = cv2.resize(image, (resized_w, resized_h))
+    tensor = (resized.astype(np.float32) / 255.0 - np.array(_DET_MEAN, np.float32)) / np.array(_DET_STD, np.float32)
+    return tensor.transpose(2, 0, 1)[np.newaxis]
+
+class OnnxTextDetector:
+    """PP-OCRv4 DB text detector on onnxruntime.
+
+    ``predict`` mirrors the PaddleX model it replaces: it takes a BGR array
+    and returns ``{"bbox": [x1, y1, x2, y2], "score"}`` dicts in reading order.
+    """
+
+    def __init__(self, session, limit_side_len: int = config.ONNX_DET_LIMIT_SIDE,
+                 thresh: float = 0.3, box_thresh: float = 0.6, unclip_ratio: float = 2.0,
+                 max_candidates: int = 1000, min_size: int = 3):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        self.limit_side_len = limit_side_len
+        self.thresh = thresh
+        self.box_thresh = box_thresh
+        self.unclip_ratio = unclip_ratio
+        self.max_candidates = max_candidates
+        self.min_size = min_size
+
+    def predict(self, image) -> List[dict]:
+        height, width = image.shape[:2]
+        tensor = preprocess_det(image, self.limit_side_len)
+        prob = self.session.run(None, {self.input_name: tensor})[0][0, 0]
+        return self._boxes(prob, height, width)
+
+    def _boxes(self, prob, height: int, width: int) -> List[dict]:
+        import cv2
+        import numpy as np
+
+        map_h, map_w = prob.shape
+        bitmap = (prob > self.thresh).astype(np.uint8)
+        contours, _ = cv2.findContours(bitmap, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = []
+        for contour in contours[:self.max_candidates]:
+            center, (rect_w, rect_h), angle = cv2.minAreaRect(contour)
+            if min(rect_w, rect_h) < self.min_size:
+                continue
+            x, y, box_w, box_h = cv2.boundingRect(contour)
+            mask = np.zeros((box_h, box_w), np.uint8)
+            cv2.fillPoly(mask, [contour - np.array([x, y])], 1)
+            score = cv2.mean(prob[y:y + box_h, x:x + box_w], mask)[0]
+            if score < self.box_thresh:
+                continue
+            # DB "unclip": grow the shrunk text kernel back by area * ratio / perimeter.
+            # For the rectangles we keep this is exactly what a polygon offset gives.
+            distance = rect_w * rect_h * self.unclip_ratio / (2 * (rect_w + rect_h))
+            grown = (rect_w + 2 * distance, rect_h + 2 * distance)
+            if min(grown) < self.min_size + 2:
+                continue
+            points = cv2.boxPoints((center, grown, angle))
+            points[:, 0] = np.clip(points[:, 0] * width / map_w, 0, width)
+            points[:, 1] = np.clip(points[:, 1] * height / map_h, 0, height)
+            x1, y1 = points.min(axis=0)
+            x2, y2 = points.max(axis=0)
+            boxes.append({"bbox": [float(x1), float(y1), float(x2), float(y2)], "score": float(score)})
+        boxes.sort(key=lambda box: (round(box["bbox"][1] / 10), box["bbox"][0]))
+        return boxes
+
+class OnnxRecognizer:
+    """VietOCR ``vgg_transformer`` split into an encoder (CNN + transformer
+    encoder) and a decoder step, decoded greedily like ``vietocr.tool.translate``."""
+
+    def __init__(self, encoder, decoder, rec_config: dict):
+        self.encoder = encoder
+        self.decoder = decoder
+        self.vocab = rec_config["vocab"]
+        self.image_height = rec_config["image_height"]
+        self.image_min_width = rec_config["image_min_width"]
+        self.image_max_width = rec_config["image_max_width"]
+        self.max_seq_length = rec_config["max_seq_length"]
+        self.sos = rec_config.get("sos", 1)
+        self.eos = rec_config.get("eos", 2)
+        # vietocr.model.vocab.Vocab: ids 0-3 are pad, go, eos and mask
+        self._chars = {i + 4: c for i, c in enumerate(self.vocab)}
+
+    def _prepare(self, image):
+        import numpy as np
+        from PIL import Image
+
+        image = _to_pil(image).convert("RGB")
+        # Same width rule as vietocr.tool.translate.resize
+        new_w = int(self.image_height * float(image.width) / float(image.height))
+        new_w = math.ceil(new_w / 10) * 10
+        new_w = min(max(new_w, self.image_min_width), self.image_max_width)
+        image = image.resize((new_w, self.image_height), Image.LANCZOS)
+        return np.asarray(image, dtype=np.float32).transpose(2, 0, 1) / 255.0
+
+    def _decode(self, ids: Sequence[int]) -> str:
+        ids = list(ids)
+        first = 1 if ids and ids[0] == self.sos else 0
+        last = ids.index(self.eos) if self.eos in ids else None
+        return "".join(self._chars.get(i, "") for i in ids[first:last])
+
+    def _translate(self, batch) -> List[str]:
+        import numpy as np
+
+        memory = self.encoder.run(None, {"img": batch})[0]
+        tokens = np.full((1, batch.shape[0]), self.sos, dtype=np.int64)
+        finished = np.zeros(batch.shape[0], dtype=bool)
+        for _ in range(self.max_seq_length):
+            probs = self.decoder.run(None, {"tgt": tokens, "memory": memory})[0]
+            next_tokens = probs[:, -1, :].argmax(axis=-1)
+            tokens = np.concatenate([tokens, next_tokens[np.newaxis]], axis=0)
+            finished |= next_tokens == self.eos
+            if finished.all():
+                break
+        return [self._decode(sample) for sample in tokens.T.tolist()]
+
+    def recognize(self, images: Sequence, max_batch_size: int = 32, bucket_width: int = 64) -> List[str]:
+        """Batched recognition with the same width bucketing as ``recognize_batched``."""
+        import numpy as np
+
+        if not images:
+            return []
+        arrays = [self._prepare(image) for image in images]
+        widths = [array.shape[-1] for array in arrays]
+        order = sorted(range(len(arrays)), key=lambda i: widths[i])
+        texts: List[str] = [""] * len(arrays)
+        for bucket in _make_buckets(order, widths, max(1, max_batch_size), bucket_width):
+            target_width = max(widths[i] for i in bucket)
+            batch = np.stack([
+                np.pad(arrays[i], ((0, 0), (0, 0), (0, target_width - widths[i])), constant_values=1.0)
+                for i in bucket
+            ]).astype(np.float32)
+            for index, text in zip(bucket, self._translate(batch)):
+                texts[index] = text
+        return texts
+
+def load_models(model_dir: str = config.ONNX_MODEL_DIR, quantized: bool = config.ONNX_QUANTIZED) -> dict:
+    files = resolve_model_files(model_dir, quantized)
+    with open(files["rec_config"], "r", encoding="utf-8") as f:
+        rec_config = json.load(f)
+    logger.info("Loading ONNX models %s", ", ".join(os.path.basename(p) for p in files.values()))
+    return {
+        "detector": OnnxTextDetector(create_session(files["det"])),
+        "recognizer": OnnxRecognizer(
+            create_session(files["rec_encoder"]), create_session(files["rec_decoder"]), rec_config
+        ),
+        "files": files,
+    }
@@ -0,0 +1,26 @@
+import os
+import socket
+
+def current_owner() -> str:
+    """``host:pid`` of this process, stored with the jobs and runs it works on.
+
+    Read on every call: workers are forked after this module is imported.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def owner_alive(owner: str) -> bool:
+    """Whether the process behind ``owner`` may still be running.
+
+    Only processes on this host can be checked; others are assumed alive.
+    """
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user
+        return True
+    return True
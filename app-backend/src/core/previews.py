@@ -0,0 +1,182 @@
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from . import config
+from .image_io import open_upright
+
+logger = logging.getLogger(__name__)
+
+def preview_key(image) -> str:
+    """Derived files follow the image content; legacy images fall back to id + mtime."""
+    if image.blob_sha256:
+        return image.blob_sha256
+    return f"image-{image.id}-{os.stat(image.file_path).st_mtime_ns}"
+
+class PreviewStore:
+    """Thumbnails and a tile pyramid per image, generated once and kept on disk.
+
+    Level 0 of the pyramid is the original resolution and every further level
+    halves it, until the whole image fits in a single tile. ``info.json``
+    records each level's and thumbnail's exact scale factors, so clients can
+    map canvas coordinates back to original-image pixels.
+    """
+
+    def __init__(self, directory: str, tile_size: int, thumbnail_sizes: List[int],
+                 quality: int, workers: int):
+        self.directory = directory
+        self.tile_size = tile_size
+        self.thumbnail_sizes = sorted(thumbnail_sizes)
+        self.quality = quality
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key[2:4], key)
+
+    def thumbnail_path(self, key: str, size: int) -> str:
+        return os.path.join(self._dir(key), "thumbnails", f"{size}.jpg")
+
+    def tile_path(self, key: str, level: int, column: int, row: int) -> str:
+        return os.path.join(self._dir(key), "tiles", str(level), f"{column}_{row}.jpg")
+
+    def thumbnail_size(self, requested: Optional[int]) -> int:
+        """Smallest configured thumbnail at least ``requested`` pixels on its long side."""
+        if requested is None:
+            return self.thumbnail_sizes[0]
+        return next((size for size in self.thumbnail_sizes if size >= requested), self.thumbnail_sizes[-1])
+
+    def info(self, key: str, source_path: str) -> dict:
+        """Pyramid metadata, generating the previews first if needed. Blocking."""
+        with open(os.path.join(self.ensure(key, source_path), "info.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def ensure(self, key: str, source_path: str) -> str:
+        directory = self._dir(key)
+        if os.path.exists(os.path.join(directory, "info.json")):
+            return directory
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # Concurrent tile requests for a fresh image wait for one generation
+        with key_lock:
+            if not os.path.exists(os.path.join(directory, "info.json")):
+                self._generate(source_path, directory)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return directory
+
+    def schedule(self, items: Iterable[tuple]):
+        """Generate previews for ``(key, source_path)`` pairs on the background workers."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="previews")
+            executor = self._executor
+        for key, source_path in items:
+            executor.submit(self._ensure_logged, key, source_path)
+
+    def _ensure_logged(self, key: str, source_path: str):
+        try:
+            self.ensure(key, source_path)
+        except OSError as e:
+            # Not an image PIL can decode; requests for it will report the same error
+            logger.warning("Failed to generate previews for %s: %s", source_path, e)
+        except Exception:
+            logger.exception("Failed to generate previews for %s", source_path)
+
+    def _save(self, img, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        img.save(path, format="JPEG", quality=self.quality)
+
+    def _generate(self, source_path: str, directory: str):
+        from PIL import Image as PILImage
+
+        # Build next to the target and rename, so a half-written pyramid is never served
+        tmp_dir = f"{directory}.{uuid.uuid4().hex}.tmp"
+        try:
+            # Same upright orientation the OCR pipeline detects boxes on
+            current, width, height = open_upright(source_path)
+            levels, thumbnails = [], []
+            pending = list(reversed(self.thumbnail_sizes))
+            level = 0
+            while True:
+                columns = math.ceil(current.width / self.tile_size)
+                rows = math.ceil(current.height / self.tile_size)
+                for row in range(rows):
+                    for column in range(columns):
+                        left, top = column * self.tile_size, row * self.tile_size
+                        box = (left, top, min(left + self.tile_size, current.width),
+                               min(top + self.tile_size, current.height))
+                        self._save(current.crop(box), os.path.join(tmp_dir, "tiles", str(level), f"{column}_{row}.jpg"))
+                levels.append({
+                    "level": level,
+                    "width": current.width,
+                    "height": current.height,
+                    "scale_x": current.width / width,
+                    "scale_y": current.height / height,
+                    "columns": columns,
+                    "rows": rows,
+                })
+                last = max(current.size) <= self.tile_size
+                next_long_side = math.ceil(max(current.size) / 2)
+                # Each thumbnail is cut from the smallest level still larger than it
+                while pending and (last or pending[0] > next_long_side):
+                    size = pending.pop(0)
+                    thumbnail = current.copy()
+                    thumbnail.thumbnail((size, size), PILImage.LANCZOS)
+                    self._save(thumbnail, os.path.join(tmp_dir, "thumbnails", f"{size}.jpg"))
+                    thumbnails.append({
+                        "size": size,
+                        "width": thumbnail.width,
+                        "height": thumbnail.height,
+                        "scale_x": thumbnail.width / width,
+                        "scale_y": thumbnail.height / height,
+                    })
+                if last:
+                    break
+                current = current.reduce(2)
+                level += 1
+
+            info = {
+                "width": width,
+                "height": height,
+                "tile_size": self.tile_size,
+                "format": "jpeg",
+                "levels": levels,
+                "thumbnails": sorted(thumbnails, key=lambda t: t["size"]),
+            }
+            with open(os.path.join(tmp_dir, "info.json"), "w", encoding="utf-8") as f:
+                json.dump(info, f)
+            os.makedirs(os.path.dirname(directory), exist_ok=True)
+            try:
+                os.replace(tmp_dir, directory)
+            except OSError:
+                # Another process finished the same pyramid first
+                if not os.path.exists(os.path.join(directory, "info.json")):
+                    raise
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def remove(self, key: str):
+        shutil.rmtree(self._dir(key), ignore_errors=True)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+previews = PreviewStore(
+    config.PREVIEW_DIR,
+    config.PREVIEW_TILE_SIZE,
+    config.PREVIEW_THUMBNAIL_SIZES,
+    config.PREVIEW_QUALITY,
+    config.PREVIEW_WORKERS,
+)
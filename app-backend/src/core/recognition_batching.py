@@ -0,0 +1,63 @@
+from typing import List, Sequence
+
+def _make_buckets(order: List[int], widths: List[int], max_batch_size: int, bucket_width: int) -> List[List[int]]:
+    # `order` is sorted by width, so each bucket is a contiguous run of similar widths
+    buckets = []
+    current: List[int] = []
+    for index in order:
+        if current and (
+            len(current) >= max_batch_size
+            or widths[index] - widths[current[0]] > bucket_width
+        ):
+            buckets.append(current)
+            current = []
+        current.append(index)
+    if current:
+        buckets.append(current)
+    return buckets
+
+def _to_pil(image):
+    import numpy as np
+    from PIL import Image
+    return Image.fromarray(image) if isinstance(image, np.ndarray) else image
+
+def recognize_batched(predictor, images: Sequence, max_batch_size: int = 32, bucket_width: int = 64) -> List[str]:
+    """Run a VietOCR ``Predictor`` over many crops with batched forward passes.
+
+    ``images`` are PIL images or RGB arrays (views are fine). Crops are
+    resized the same way ``Predictor.predict`` does, grouped into buckets of
+    similar width, right-padded with white to the widest crop of their bucket
+    and decoded together. Results come back in input order.
+    """
+    if not images:
+        return []
+    # VietOCR resizes through PIL; only the crop itself is copied, never the page
+    images = [_to_pil(image) for image in images]
+
+    config = predictor.config
+    if config['predictor'].get('beamsearch'):
+        # Beam search in vietocr only decodes one sample at a time
+        return [predictor.predict(image) for image in images]
+
+    import torch
+    import torch.nn.functional as F
+    from vietocr.tool.translate import process_input, translate
+
+    dataset = config['dataset']
+    tensors = [
+        process_input(image, dataset['image_height'], dataset['image_min_width'], dataset['image_max_width'])
+        for image in images
+    ]
+    widths = [tensor.shape[-1] for tensor in tensors]
+    order = sorted(range(len(tensors)), key=lambda i: widths[i])
+
+    texts: List[str] = [""] * len(images)
+    for bucket in _make_buckets(order, widths, max(1, max_batch_size), bucket_width):
+        target_width = max(widths[i] for i in bucket)
+        batch = torch.cat([
+            F.pad(tensors[i], (0, target_width - widths[i]), value=1.0) for i in bucket
+        ]).to(config['device'])
+        sents, _ = translate(batch, predictor.model)
+        for index, text in zip(bucket, predictor.vocab.batch_decode(sents.tolist())):
+            texts[index] = text
+    return texts
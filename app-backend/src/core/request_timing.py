@@ -0,0 +1,56 @@
+import time
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from . import tracing
+from .metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_PROGRESS
+
+def _route_template(scope: Scope) -> str:
+    # The template, not the raw path, keeps label cardinality bounded
+    route = scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
+
+class RequestTimingMiddleware:
+    """Latency histogram per route and, when tracing is on, one root span per request.
+
+    The response carries ``X-Trace-Id``; an incoming W3C ``traceparent`` header
+    makes the request part of the caller's trace. Server-sent event streams
+    are left out of the histogram, their duration is the client's session.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        streaming = False
+        started = time.perf_counter()
+        parent = tracing.parse_traceparent(Headers(scope=scope).get("traceparent"))
+
+        with tracing.span(f"{method} {scope['path']}", parent=parent, **{"http.method": method}) as context:
+            async def send_timed(message: Message):
+                nonlocal status, streaming
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    headers = MutableHeaders(scope=message)
+                    streaming = headers.get("content-type", "").startswith("text/event-stream")
+                    if context is not None and context.sampled:
+                        headers["X-Trace-Id"] = context.trace_id
+                await send(message)
+
+            in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+            in_progress.inc()
+            try:
+                await self.app(scope, receive, send_timed)
+            finally:
+                in_progress.dec()
+                route = _route_template(scope)
+                if not streaming:
+                    HTTP_REQUEST_SECONDS.labels(method, route, str(status)).observe(time.perf_counter() - started)
+                if context is not None and context.sampled:
+                    # Renamed after routing, like OpenTelemetry's ASGI instrumentation
+                    tracing.annotate(name=f"{method} {route}", **{"http.route": route, "http.status_code": status})
@@ -0,0 +1,115 @@
+import math
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+from . import config
+
+# x1, y1, x2, y2 in image pixels
+Box = Tuple[float, float, float, float]
+
+# Boxes spanning more cells than this are checked on every query instead
+_MAX_CELLS_PER_BOX = 64
+
+def iou(a: Box, b: Box) -> float:
+    inter_w = min(a[2], b[2]) - max(a[0], b[0])
+    inter_h = min(a[3], b[3]) - max(a[1], b[1])
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+class GridIndex:
+    """Uniform grid over the boxes of one image, for rectangle and point queries.
+
+    The cell size follows the typical box, so a query touches a handful of
+    cells holding a handful of boxes each, however dense the page is.
+    """
+
+    def __init__(self, boxes: Iterable[Tuple[int, Box]] = (), cell_size: Optional[float] = None):
+        boxes = list(boxes)
+        if cell_size is None:
+            sides = sorted(max(box[2] - box[0], box[3] - box[1]) for _, box in boxes)
+            cell_size = 2 * sides[len(sides) // 2] if sides else 64.0
+        self.cell_size = max(8.0, cell_size)
+        self.boxes: Dict[int, Box] = {}
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        self._large: Set[int] = set()
+        for key, box in boxes:
+            self.insert(key, box)
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def _span(self, box: Box) -> Tuple[range, range]:
+        size = self.cell_size
+        return (
+            range(math.floor(box[0] / size), math.floor(box[2] / size) + 1),
+            range(math.floor(box[1] / size), math.floor(box[3] / size) + 1),
+        )
+
+    def insert(self, key: int, box: Box):
+        self.boxes[key] = box
+        columns, rows = self._span(box)
+        if len(columns) * len(rows) > _MAX_CELLS_PER_BOX:
+            self._large.add(key)
+            return
+        for column in columns:
+            for row in rows:
+                self._cells.setdefault((column, row), []).append(key)
+
+    def query(self, box: Box) -> List[int]:
+        """Keys of the boxes intersecting ``box``, edges included, so a zero-size box hit-tests a point."""
+        columns, rows = self._span(box)
+        if len(columns) * len(rows) > len(self.boxes):
+            candidates = self.boxes.keys()
+        else:
+            candidates = set(self._large)
+            for column in columns:
+                for row in rows:
+                    candidates.update(self._cells.get((column, row), ()))
+        x1, y1, x2, y2 = box
+        return [
+            key for key in candidates
+            if self.boxes[key][0] <= x2 and self.boxes[key][2] >= x1
+            and self.boxes[key][1] <= y2 and self.boxes[key][3] >= y1
+        ]
+
+    def best_match(self, box: Box) -> Tuple[Optional[int], float]:
+        """The indexed box with the highest IoU against ``box``, and that IoU."""
+        best, best_iou = None, 0.0
+        for key in self.query(box):
+            overlap = iou(box, self.boxes[key])
+            if overlap > best_iou:
+                best, best_iou = key, overlap
+        return best, best_iou
+
+class SpatialIndexCache:
+    """Most recently used per-image indexes, each tagged with the image's version.
+
+    Every label change bumps ``Image.version``, so an index built for an older
+    version is never served: it is rebuilt on the next query. This also keeps
+    indexes correct across server workers without any invalidation messages.
+    """
+
+    def __init__(self, max_images: int):
+        self.max_images = max_images
+        self._indexes: "OrderedDict[int, Tuple[Hashable, GridIndex]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, image_id: int, version: Hashable, build: Callable[[], GridIndex]) -> GridIndex:
+        with self._lock:
+            entry = self._indexes.get(image_id)
+            if entry is not None and entry[0] == version:
+                self._indexes.move_to_end(image_id)
+                return entry[1]
+        index = build()
+        if self.max_images > 0:
+            with self._lock:
+                self._indexes[image_id] = (version, index)
+                self._indexes.move_to_end(image_id)
+                while len(self._indexes) > self.max_images:
+                    self._indexes.popitem(last=False)
+        return index
+
+spatial_indexes = SpatialIndexCache(config.SPATIAL_INDEX_CACHE_IMAGES)
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import tarfile
+import uuid
+import zipfile
+from typing import BinaryIO, List
+from . import config
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp", ".gif")
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+def is_image_filename(filename: str) -> bool:
+    return filename.lower().endswith(IMAGE_EXTENSIONS)
+
+def blob_path(sha256: str, extension: str, blob_dir: str = config.BLOB_DIR) -> str:
+    # Two levels of fan-out keep directories small with millions of images
+    return f"{blob_dir}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+def _store_blob(source: BinaryIO, filename: str, blob_dir: str, chunk_size: int) -> dict:
+    # Archive members may carry directories (or "../"); only the base name is kept
+    filename = os.path.basename(filename.replace("\\", "/"))
+    extension = os.path.splitext(filename)[1].lower()
+    staging_dir = os.path.join(blob_dir, "tmp")
+    os.makedirs(staging_dir, exist_ok=True)
+    # The address is only known once the last byte is read, so stage first and rename
+    tmp_path = os.path.join(staging_dir, f"{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as target:
+            for chunk in iter(lambda: source.read(chunk_size), b""):
+                digest.update(chunk)
+                target.write(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+        file_path = blob_path(sha256, extension, blob_dir)
+        # Renamed over an existing copy too: a delete or GC may be unlinking it until
+        # this batch holds a reference, and the fresh mtime keeps them off it meanwhile
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {"filename": filename, "file_path": file_path, "sha256": sha256, "size": size}
+
+def store_upload(source: BinaryIO, filename: str, blob_dir: str = config.BLOB_DIR,
+                 chunk_size: int = config.UPLOAD_CHUNK_SIZE) -> List[dict]:
+    """Write an uploaded image, or every image inside a zip/tar archive, to the blob store.
+
+    Files are addressed by the sha256 of their content, so identical images
+    share one file on disk. Data is copied in ``chunk_size`` pieces so no file
+    is ever fully held in memory. Blocking; call it from a worker thread in
+    async code. Returns ``{"filename", "file_path", "sha256", "size"}`` per image.
+    """
+    lowered = filename.lower()
+
+    if lowered.endswith(".zip"):
+        stored = []
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not is_image_filename(info.filename):
+                    continue
+                with archive.open(info) as member:
+                    stored.append(_store_blob(member, info.filename, blob_dir, chunk_size))
+        return stored
+
+    if lowered.endswith(TAR_SUFFIXES):
+        stored = []
+        # "r|*" reads the archive strictly front to back, whatever its compression
+        with tarfile.open(fileobj=source, mode="r|*") as archive:
+            for member in archive:
+                if not member.isfile() or not is_image_filename(member.name):
+                    continue
+                stored.append(_store_blob(archive.extractfile(member), member.name, blob_dir, chunk_size))
+        return stored
+
+    return [_store_blob(source, filename, blob_dir, chunk_size)]
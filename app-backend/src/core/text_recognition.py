@@ -1,9 +1,14 @@
-from easyocr import Reader
+import argparse
+import json
 
-def text_recognition(image_path):
-    reader = Reader(['en'], gpu=False)
-    result = reader.readtext(image_path)
-    return result
+def text_recognition(image_path, engine="easyocr"):
+    from ..services.text_recognition_service import TextRecognitionService
+    return TextRecognitionService(engine=engine).process_image(image_path)
 
-
-print(text_recognition("/home/bachcorn/Desktop/code/Auto-OCR-Labeller/app-backend/uploads/Screenshot_20241207_090853.png"))
\ No newline at end of file
+if __name__ == "__main__":
+    # python -m src.core.text_recognition path/to/image.png [--engine paddle]
+    parser = argparse.ArgumentParser(description="Detect and recognize text in one image")
+    parser.add_argument("image_path")
+    parser.add_argument("--engine", default="easyocr", choices=["easyocr", "paddle", "onnx", "llm"])
+    args = parser.parse_args()
+    print(json.dumps(text_recognition(args.image_path, args.engine), ensure_ascii=False, indent=2))
@@ -0,0 +1,88 @@
+import math
+from typing import List, Tuple
+import numpy as np
+
+# left, top, right, bottom in image pixels
+Tile = Tuple[int, int, int, int]
+
+# Boxes this close to an inner tile edge were probably cut off by it
+_EDGE_MARGIN = 2.0
+# A cut-off copy lies (almost) entirely inside the whole box
+_CONTAINED = 0.8
+
+def tile_grid(width: int, height: int, tile_size: int, overlap: int) -> List[Tile]:
+    """Tiles of at most ``tile_size`` px covering the image, neighbours overlapping by at least ``overlap`` px."""
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        count = math.ceil((length - overlap) / (tile_size - overlap))
+        # Spread evenly instead of leaving a sliver at the end
+        step = (length - tile_size) / (count - 1)
+        return [round(i * step) for i in range(count)]
+
+    return [
+        (left, top, min(left + tile_size, width), min(top + tile_size, height))
+        for top in starts(height)
+        for left in starts(width)
+    ]
+
+def cut_by_tile(boxes: np.ndarray, tile: Tile, width: int, height: int) -> np.ndarray:
+    """Which ``x1, y1, x2, y2`` boxes touch an edge of ``tile`` that lies inside the image."""
+    left, top, right, bottom = tile
+    boxes = boxes.reshape(-1, 4)
+    return (
+        ((left > 0) & (boxes[:, 0] <= left + _EDGE_MARGIN))
+        | ((top > 0) & (boxes[:, 1] <= top + _EDGE_MARGIN))
+        | ((right < width) & (boxes[:, 2] >= right - _EDGE_MARGIN))
+        | ((bottom < height) & (boxes[:, 3] >= bottom - _EDGE_MARGIN))
+    )
+
+def merge_tile_boxes(boxes: np.ndarray, cut: np.ndarray, threshold: float = 0.5) -> Tuple[List[int], np.ndarray]:
+    """Greedy NMS over ``x1, y1, x2, y2`` boxes detected on overlapping tiles.
+
+    Text inside an overlap is found by both tiles, once whole and often once
+    cut off by a tile edge. Two boxes are duplicates when their intersection
+    covers ``threshold`` of the smaller one; plain IoU would miss the cut-off
+    copy, which is much smaller than the whole box. Overlapping boxes on the
+    same line of which at least one is cut, and that no whole box explains,
+    are pieces of a line no tile saw whole and are fused into their union.
+    Whole boxes win over cut ones, then larger over smaller.
+
+    Returns the indices of the kept boxes and their final coordinates, which
+    differ from the input only for fused boxes.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    cut = np.asarray(cut, dtype=bool)
+    widths = np.clip(boxes[:, 2] - boxes[:, 0], 0, None)
+    heights = np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+    areas = widths * heights
+    order = np.lexsort((-areas, cut))
+
+    kept, merged = [], []
+    while order.size:
+        index, rest = order[0], order[1:]
+        box = boxes[index].copy()
+        is_cut = cut[index]
+        absorbed = np.zeros(rest.size, dtype=bool)
+        while True:
+            inter_w = np.clip(np.minimum(box[2], boxes[rest, 2]) - np.maximum(box[0], boxes[rest, 0]), 0, None)
+            inter_h = np.clip(np.minimum(box[3], boxes[rest, 3]) - np.maximum(box[1], boxes[rest, 1]), 0, None)
+            inter = inter_w * inter_h
+            area = (box[2] - box[0]) * (box[3] - box[1])
+            duplicate = (inter > 0) & (inter >= threshold * np.minimum(area, areas[rest]))
+            same_line = (inter > 0) & (inter_h >= 0.5 * np.minimum(box[3] - box[1], heights[rest]))
+            # Pieces of one line split by a seam, unless the whole line already contains the piece
+            fuse = same_line & ~absorbed
+            if not is_cut:
+                fuse &= cut[rest] & (inter < _CONTAINED * areas[rest])
+            duplicate &= ~fuse
+            absorbed |= duplicate | fuse
+            if not fuse.any():
+                break
+            # The grown box may now reach the next piece of the line
+            box[:2] = np.minimum(box[:2], boxes[rest[fuse], :2].min(axis=0))
+            box[2:] = np.maximum(box[2:], boxes[rest[fuse], 2:].max(axis=0))
+        kept.append(int(index))
+        merged.append(box)
+        order = rest[~absorbed]
+    return kept, np.array(merged).reshape(-1, 4)
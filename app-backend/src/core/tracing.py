@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator, Optional
+from . import config
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class SpanContext:
+    trace_id: str
+    span_id: str
+    # Unsampled contexts still propagate, so a trace is recorded whole or not at all
+    sampled: bool = True
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+_current: ContextVar[Optional[SpanContext]] = ContextVar("current_span", default=None)
+# Name and attributes of the current span, still open to annotate()
+_details: ContextVar[Optional[dict]] = ContextVar("current_span_details", default=None)
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+def parse_traceparent(header: Optional[str]) -> Optional[SpanContext]:
+    """W3C ``traceparent``, so a caller's trace can continue here."""
+    parts = (header or "").split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return SpanContext(parts[1], parts[2], sampled)
+
+class JsonLinesExporter:
+    """Appends finished spans, one JSON object per line, in OpenTelemetry's field names.
+
+    The file stays open; each process opens its own after fork().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+
+    def export(self, span: dict):
+        line = json.dumps(span, ensure_ascii=False, default=str) + "\n"
+        try:
+            with self._lock:
+                if self._file is None or self._pid != os.getpid():
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    self._file = open(self.path, "ab", buffering=0)
+                    self._pid = os.getpid()
+                # Unbuffered: one write per line, so lines from several workers do not interleave
+                self._file.write(line.encode("utf-8"))
+        except OSError:
+            logger.warning("Could not write span to %s", self.path, exc_info=True)
+            self._file = None
+
+exporter = JsonLinesExporter(config.TRACING_FILE)
+
+def current() -> Optional[SpanContext]:
+    return _current.get()
+
+def annotate(name: Optional[str] = None, **attributes):
+    """Rename the current span or add attributes to it before it is exported."""
+    details = _details.get()
+    if details is None:
+        return
+    if name:
+        details["name"] = name
+    details["attributes"].update(attributes)
+
+def _sample(parent: Optional[SpanContext]) -> bool:
+    # Decided once at the root of a trace, children follow their parent
+    return parent.sampled if parent else random.random() < config.TRACING_SAMPLE_RATE
+
+def _export(name: str, context: SpanContext, parent: Optional[SpanContext], start: float, end: float,
+            status: str, attributes: dict):
+    exporter.export({
+        "trace_id": context.trace_id,
+        "span_id": context.span_id,
+        "parent_span_id": parent.span_id if parent else None,
+        "name": name,
+        "start_time_unix_nano": int(start * 1e9),
+        "end_time_unix_nano": int(end * 1e9),
+        "duration_ms": (end - start) * 1000,
+        "status": status,
+        "attributes": attributes,
+    })
+
+def record_span(name: str, start: float, end: float, parent: Optional[SpanContext] = None,
+                status: str = "OK", **attributes) -> Optional[SpanContext]:
+    """Export a span measured elsewhere, e.g. in a worker process; times are ``time.time()`` seconds."""
+    if not config.TRACING_ENABLED:
+        return None
+    context = SpanContext(parent.trace_id if parent else _new_id(128), _new_id(64), _sample(parent))
+    if context.sampled:
+        _export(name, context, parent, start, end, status, attributes)
+    return context
+
+@contextmanager
+def span(name: str, parent: Optional[SpanContext] = None, **attributes) -> Iterator[Optional[SpanContext]]:
+    """Time a block as a child of ``parent`` or of the current span; a no-op when tracing is off."""
+    parent = parent or _current.get()
+    if not config.TRACING_ENABLED:
+        yield None
+        return
+    context = SpanContext(parent.trace_id if parent else _new_id(128), _new_id(64), _sample(parent))
+    details = {"name": name, "attributes": attributes}
+    token, details_token = _current.set(context), _details.set(details)
+    start = time.time()
+    status = "OK"
+    try:
+        yield context
+    except BaseException:
+        status = "ERROR"
+        raise
+    finally:
+        _current.reset(token)
+        _details.reset(details_token)
+        if context.sampled:
+            _export(details["name"], context, parent, start, time.time(), status, details["attributes"])
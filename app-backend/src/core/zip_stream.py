@@ -0,0 +1,83 @@
+import hashlib
+import io
+import os
+import zipfile
+from typing import Iterator, Optional
+
+CHUNK_SIZE = 1024 * 1024
+
+class ZipStream(io.RawIOBase):
+    """Write-only, unseekable sink for ``zipfile.ZipFile``.
+
+    zipfile falls back to data descriptors when it cannot seek, so an archive
+    can be produced front to back and handed out with ``drain()`` as it grows.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+def write_file(archive: zipfile.ZipFile, stream: ZipStream, path: str, arcname: str,
+               compress_type: int = zipfile.ZIP_STORED, chunk_size: int = CHUNK_SIZE,
+               digest: Optional[dict] = None) -> Iterator[bytes]:
+    """Copy ``path`` into the archive chunk by chunk, yielding the zip bytes produced so far.
+
+    If ``digest`` is given it receives the file's ``sha256`` and ``size``.
+    """
+    info = zipfile.ZipInfo.from_file(path, arcname)
+    info.compress_type = compress_type
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as source, archive.open(info, "w") as target:
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            target.write(chunk)
+            sha256.update(chunk)
+            size += len(chunk)
+            data = stream.drain()
+            if data:
+                yield data
+    if digest is not None:
+        digest.update(sha256=sha256.hexdigest(), size=size)
+    data = stream.drain()
+    if data:
+        yield data
+
+def write_bytes(archive: zipfile.ZipFile, stream: ZipStream, arcname: str, data: bytes,
+                compress_type: int = zipfile.ZIP_DEFLATED) -> Iterator[bytes]:
+    archive.writestr(arcname, data, compress_type=compress_type)
+    data = stream.drain()
+    if data:
+        yield data
+
+
+def iter_directory_zip(root: str, compress_type: int = zipfile.ZIP_DEFLATED) -> Iterator[bytes]:
+    """Stream every file below ``root`` as a zip, with paths relative to ``root``."""
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, "w") as archive:
+        for directory, _, filenames in os.walk(root):
+            for filename in sorted(filenames):
+                path = os.path.join(directory, filename)
+                # Tar shards hold PNGs already, compressing them again gains nothing
+                file_compression = zipfile.ZIP_STORED if filename.endswith(".tar") else compress_type
+                yield from write_file(
+                    archive, stream, path, os.path.relpath(path, root), compress_type=file_compression
+                )
+    data = stream.drain()
+    if data:
+        yield data
@@ -7,6 +7,10 @@ class ILabelRepository(ABC):
     def create_label(self, label_data: dict) -> Label:
         pass
     
+    @abstractmethod
+    def create_labels(self, image_id: int, labels_data: List[dict], replace: bool = False) -> List[Label]:
+        pass
+    
     @abstractmethod
     def get_image_labels(self, image_id: int) -> List[Label]:
         pass
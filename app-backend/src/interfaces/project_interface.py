@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 from ..models.project import Project, Image
 
 class IProjectRepository(ABC):
@@ -12,9 +13,14 @@ class IProjectRepository(ABC):
         pass
     
     @abstractmethod
-    def get_project_images(self, project_id: int) -> List[Image]:
+    def get_project_images(self, project_id: int, limit: Optional[int] = None, cursor: Optional[int] = None,
+                           labeled: Optional[bool] = None, updated_since: Optional[datetime] = None) -> List[Image]:
         pass
     
     @abstractmethod
     def save_image(self, image_data: dict) -> Image:
+        pass
+    
+    @abstractmethod
+    def save_images(self, project_id: int, images_data: List[dict], reuse_labels: bool = False) -> dict:
         pass 
\ No newline at end of file
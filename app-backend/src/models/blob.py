@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, String
+from .base import Base, TimeStampMixin
+
+class Blob(Base, TimeStampMixin):
+    __tablename__ = "blobs"
+
+    sha256 = Column(String, primary_key=True)
+    path = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # images pointing at this blob
@@ -0,0 +1,37 @@
+from sqlalchemy import Boolean, Column, Float, Integer, String, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from .base import Base, TimeStampMixin
+
+class DetectionRun(Base, TimeStampMixin):
+    __tablename__ = "detection_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, index=True)
+    engine = Column(String, nullable=False)
+    scope = Column(String, nullable=False, default="unlabeled")  # "unlabeled" or "all"
+    status = Column(String, nullable=False, default="running")  # running, completed, cancelled, failed
+    use_cache = Column(Boolean, nullable=False, default=True)
+    total = Column(Integer, nullable=False, default=0)
+    succeeded = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    cancel_requested = Column(Boolean, nullable=False, default=False, server_default="0")
+    driver = Column(String)  # host:pid of the worker processing the run
+    heartbeat_at = Column(Float)  # renewed by the driver; once stale another worker may take over
+
+    # Relationships
+    items = relationship("DetectionRunItem", back_populates="run", cascade="all, delete-orphan")
+
+class DetectionRunItem(Base, TimeStampMixin):
+    __tablename__ = "detection_run_items"
+    __table_args__ = (Index("ix_detection_run_items_run_id_status", "run_id", "status"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey("detection_runs.id"), nullable=False)
+    image_id = Column(Integer, ForeignKey("images.id", ondelete="CASCADE"), nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, succeeded, failed, skipped
+    label_count = Column(Integer, nullable=False, default=0)
+    error = Column(String)
+
+    # Relationships
+    run = relationship("DetectionRun", back_populates="items")
@@ -6,7 +6,7 @@ class Label(Base, TimeStampMixin):
     __tablename__ = "labels"
 
     id = Column(Integer, primary_key=True, index=True)
-    image_id = Column(Integer, ForeignKey("images.id"))
+    image_id = Column(Integer, ForeignKey("images.id"), index=True)
     x = Column(Float, nullable=True)
     y = Column(Float, nullable=True)
     width = Column(Float, nullable=True)
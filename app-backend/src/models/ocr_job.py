@@ -0,0 +1,19 @@
+from sqlalchemy import Boolean, Column, Float, Integer, String, Text
+from .base import Base
+
+class OCRJobRecord(Base):
+    """State of a detect-text job, so every server worker can answer for it."""
+    __tablename__ = "ocr_jobs"
+
+    id = Column(String, primary_key=True)
+    engine = Column(String, nullable=False)
+    project_id = Column(Integer, nullable=False)
+    image_id = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued, running, succeeded, failed, cancelled
+    cache_hit = Column(Boolean, nullable=False, default=False)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    error = Column(Text)
+    result = Column(Text)  # JSON of the persisted labels
+    owner = Column(String, nullable=False)  # host:pid of the worker running the job
+    created_at = Column(Float, nullable=False)
+    finished_at = Column(Float, index=True)
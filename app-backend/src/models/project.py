@@ -9,6 +9,7 @@ class Project(Base, TimeStampMixin):
     name = Column(String, nullable=False)
     description = Column(String)
     mode = Column(String, nullable=False, default="bbox")  # "bbox" or "text"
+    version = Column(Integer, nullable=False, default=0, server_default="0")  # bumped on any image or label change
     
     # Relationships
     images = relationship("Image", back_populates="project", cascade="all, delete-orphan")
@@ -17,9 +18,11 @@ class Image(Base, TimeStampMixin):
     __tablename__ = "images"
 
     id = Column(Integer, primary_key=True, index=True)
-    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, index=True)
     filename = Column(String, nullable=False)
     file_path = Column(String, nullable=False)
+    blob_sha256 = Column(String, ForeignKey("blobs.sha256"), nullable=True, index=True)
+    version = Column(Integer, nullable=False, default=0, server_default="0")  # bumped on any label change
     
     # Relationships
     project = relationship("Project", back_populates="images")
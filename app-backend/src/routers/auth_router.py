@@ -2,28 +2,27 @@ from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta
+from starlette.concurrency import run_in_threadpool
 from ..database.database import get_db
 from ..core.auth import (
-    verify_password,
+    verify_password_async,
     create_access_token,
-    get_password_hash,
+    get_password_hash_async,
     ACCESS_TOKEN_EXPIRE_MINUTES,
-    get_current_user
+    get_current_user,
+    UserPrincipal
 )
 from ..models.user import User
 from ..schemas.auth import UserCreate, Token, UserResponse
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
-@router.post("/register", response_model=UserResponse)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    # Check if user exists
-    if db.query(User).filter(User.username == user_data.username).first():
+def _check_available(db: Session, user_data: UserCreate):
+    if db.query(User.id).filter(User.username == user_data.username).first():
         raise HTTPException(status_code=400, detail="Username already registered")
-    if db.query(User).filter(User.email == user_data.email).first():
+    if db.query(User.id).filter(User.email == user_data.email).first():
         raise HTTPException(status_code=400, detail="Email already registered")
-    
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
+
+def _add_user(db: Session, user_data: UserCreate, hashed_password: str) -> User:
     db_user = User(
         username=user_data.username,
         email=user_data.email,
@@ -32,17 +31,28 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
-    
+    return db_user
+
+@router.post("/register", response_model=UserResponse)
+async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+    # Queries run in the threadpool, bcrypt on its own bounded executor
+    await run_in_threadpool(_check_available, db, user_data)
+    hashed_password = await get_password_hash_async(user_data.password)
+    db_user = await run_in_threadpool(_add_user, db, user_data, hashed_password)
+
     return UserResponse(
         id=db_user.id,
         username=db_user.username,
         email=db_user.email
     )
 
+def _get_user(db: Session, username: str):
+    return db.query(User).filter(User.username == username).first()
+
 @router.post("/token", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await run_in_threadpool(_get_user, db, form_data.username)
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=401,
             detail="Incorrect username or password",
@@ -56,7 +66,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     return {"access_token": access_token, "token_type": "bearer"} 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: UserPrincipal = Depends(get_current_user)):
     return UserResponse(
         id=current_user.id,
         username=current_user.username,
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, HTTPException
+from src.core import config
+from src.core.engine_registry import available_engines
+from src.core.ocr_cache import ocr_cache
+from src.core.ocr_jobs import job_manager
+
+router = APIRouter(prefix="/api/engines", tags=["engines"])
+
+def _get_status(engine: str) -> dict:
+    if engine not in available_engines():
+        raise HTTPException(status_code=404, detail=f"Unsupported engine: {engine}")
+    return next(s for s in job_manager.engine_status() if s["engine"] == engine)
+
+@router.get("")
+def get_engines():
+    engines = job_manager.engine_status()
+    return {
+        # Engines that are not preloaded load on first use and do not hold up readiness
+        "ready": all(e["ready"] for e in engines if e["engine"] in config.OCR_PRELOAD_ENGINES),
+        "worker_mode": config.OCR_WORKER_MODE,
+        "engines": engines,
+    }
+
+@router.get("/cache")
+def get_cache_stats():
+    return ocr_cache.stats()
+
+@router.delete("/cache")
+def clear_cache():
+    return {"status": "success", "deleted_count": ocr_cache.clear()}
+
+@router.get("/{engine}")
+def get_engine_status(engine: str):
+    return _get_status(engine)
+
+@router.post("/{engine}/load", status_code=202)
+def load_engine(engine: str):
+    status = _get_status(engine)
+    if not status["ready"]:
+        job_manager.preload([engine])
+    return status
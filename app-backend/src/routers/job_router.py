@@ -0,0 +1,32 @@
+from fastapi import APIRouter, HTTPException
+from src.core.ocr_jobs import FINISHED_STATUSES, job_manager
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+def _get_job(job_id: str, with_result: bool = False) -> dict:
+    job = job_manager.job_info(job_id, with_result=with_result)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("")
+def list_jobs():
+    return job_manager.list_jobs()
+
+@router.get("/{job_id}")
+def get_job(job_id: str):
+    return _get_job(job_id)
+
+@router.get("/{job_id}/result")
+def get_job_result(job_id: str):
+    job = _get_job(job_id, with_result=True)
+    if job["status"] not in FINISHED_STATUSES:
+        raise HTTPException(status_code=409, detail="Job has not finished yet")
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job {job['status']}: {job['error'] or ''}".strip())
+    return job["result"]
+
+@router.delete("/{job_id}")
+def cancel_job(job_id: str):
+    _get_job(job_id)
+    return job_manager.cancel(job_id)
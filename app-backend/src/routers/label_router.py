@@ -1,17 +1,26 @@
-import os
-import json
 import shutil
-from fastapi.responses import FileResponse
 from tempfile import mkdtemp
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Body, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
-from src.database.database import get_db
+from typing import List, Literal, Optional
+from datetime import datetime
+from src.database.database import get_db, SessionLocal
 from src.schemas import label as schemas
 from src.models import label as models
 from src.services.label_service import LabelService
+from src.services.recognition_dataset_service import RecognitionDatasetService
+from src.core import config
+from src.core.auth import get_current_user
+from src.core.http_cache import etag_matches, not_modified, set_etag
+from src.core.zip_stream import iter_directory_zip
+from src.services.versioning import image_etag
 
-router = APIRouter(prefix="/api/labels", tags=["labels"])
+router = APIRouter(
+    prefix="/api/labels",
+    tags=["labels"],
+    dependencies=[Depends(get_current_user)] if config.AUTH_PROTECT_LABELS else [],
+)
 
 @router.post("", response_model=schemas.Label)
 def create_label(label: schemas.LabelCreate, db: Session = Depends(get_db)):
@@ -23,11 +32,54 @@ def create_label(label: schemas.LabelCreate, db: Session = Depends(get_db)):
         return service.create_text_only_label(label.dict())
     return service.create_label(label.dict())
 
+@router.post("/bulk", response_model=List[schemas.Label])
+def create_labels(payload: schemas.LabelBulkCreate, db: Session = Depends(get_db)):
+    service = LabelService(db)
+    return service.create_labels(
+        payload.image_id,
+        [label.dict() for label in payload.labels],
+        replace=payload.replace
+    )
+
 @router.get("/image/{image_id}", response_model=List[schemas.Label])
-def get_image_labels(image_id: int, db: Session = Depends(get_db)):
+def get_image_labels(image_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    # One primary-key lookup decides whether the label rows need reading at all
+    etag = image_etag(db, image_id)
+    if etag:
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
     service = LabelService(db)
     return service.get_image_labels(image_id)
 
+@router.get("/image/{image_id}/region", response_model=List[schemas.Label])
+def get_labels_in_region(
+    image_id: int, x: float, y: float, width: float = 0, height: float = 0, db: Session = Depends(get_db)
+):
+    """Labels intersecting a rectangle, smallest first; without width and height, the labels under a point."""
+    if width < 0 or height < 0:
+        raise HTTPException(status_code=400, detail="width and height must not be negative")
+    labels = LabelService(db).get_labels_in_region(image_id, x, y, width, height)
+    if labels is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return labels
+
+@router.post("/image/{image_id}/merge", response_model=schemas.LabelMergeResult)
+def merge_labels(image_id: int, payload: schemas.LabelMerge, db: Session = Depends(get_db)):
+    """Add detections, skipping those that overlap an existing label by IoU, so re-detection adds no duplicates."""
+    iou_threshold = config.LABEL_MERGE_IOU if payload.iou_threshold is None else payload.iou_threshold
+    if not 0 < iou_threshold <= 1:
+        raise HTTPException(status_code=400, detail="iou_threshold must be in (0, 1]")
+    try:
+        result = LabelService(db).merge_labels(
+            image_id, [label.dict() for label in payload.labels], iou_threshold, update_text=payload.update_text
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return result
+
 @router.put("/{label_id}", response_model=schemas.Label)
 def update_label(label_id: int, label_update: schemas.LabelUpdate, db: Session = Depends(get_db)):
     service = LabelService(db)
@@ -49,13 +101,72 @@ def clean_image_labels(image_id: int, db: Session = Depends(get_db)):
     deleted = service.clean_image_labels(image_id)
     return {"status": "success", "deleted_count": deleted}
 
-@router.get("/project/{project_id}/export")
-def export_project_dataset(project_id: int, db: Session = Depends(get_db)):
+def _export_response(project_id: int, base_manifest: Optional[dict] = None, since: Optional[datetime] = None):
+    # The zip is generated while it is being sent, so the session must outlive this handler
+    db = SessionLocal()
     service = LabelService(db)
-    zip_path, filename = service.export_project_dataset(project_id)
-    return FileResponse(
-        zip_path,
+    chunks, filename = service.export_project_dataset(project_id, base_manifest=base_manifest, since=since)
+
+    def stream():
+        try:
+            yield from chunks
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type='application/zip',
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/project/{project_id}/export")
+def export_project_dataset(project_id: int, since: Optional[datetime] = None):
+    return _export_response(project_id, since=since)
+
+@router.post("/project/{project_id}/export/delta")
+def export_project_delta(project_id: int, manifest: dict = Body(...)):
+    """Export only what changed since the export that produced ``manifest``."""
+    if not isinstance(manifest.get("files"), dict):
+        raise HTTPException(status_code=400, detail="Manifest has no 'files' mapping")
+    if manifest.get("project_id") not in (None, project_id):
+        raise HTTPException(status_code=400, detail="Manifest belongs to another project")
+    return _export_response(project_id, base_manifest=manifest)
+
+
+@router.get("/project/{project_id}/export/vietocr")
+def export_recognition_dataset(
+    project_id: int,
+    format: Literal["lmdb", "tar"] = "lmdb",
+    image_height: Optional[int] = 32,
+    val_ratio: float = 0.1,
+    seed: int = 0,
+    db: Session = Depends(get_db)
+):
+    """Export cropped text lines for VietOCR training (train_lmdb/ + valid_lmdb/, or tar shards)."""
+    if not 0 <= val_ratio < 1:
+        raise HTTPException(status_code=400, detail="val_ratio must be in [0, 1)")
+    if image_height is not None and image_height <= 0:
+        image_height = None
+    output_dir = mkdtemp()
+    try:
+        RecognitionDatasetService(db).build_dataset(
+            project_id, output_dir, format=format, image_height=image_height, val_ratio=val_ratio, seed=seed
+        )
+    except ValueError as e:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+
+    def stream():
+        try:
+            yield from iter_directory_zip(output_dir)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    return StreamingResponse(
+        stream(),
         media_type='application/zip',
-        filename=filename,
-        background=shutil.rmtree(zip_path, ignore_errors=True)
+        headers={"Content-Disposition": f'attachment; filename="project_{project_id}_vietocr_{format}.zip"'}
     )
\ No newline at end of file
@@ -0,0 +1,9 @@
+from fastapi import APIRouter, Response
+from src.core import metrics
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
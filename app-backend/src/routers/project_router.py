@@ -1,21 +1,43 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import List, Literal
+from typing import List, Literal, Optional
+from datetime import datetime
 from src.database.database import get_db
 from src.schemas import project as schemas
-from src.models import project as models
-from src.models import label as label_models
 from src.services.project_service import ProjectService
-from src.services.text_recognition_service import TextRecognitionService
 from src.services.label_service import LabelService
+from src.services.versioning import project_etag
+from src.core import config
+from src.core.http_cache import etag_matches, not_modified, set_etag
+from src.core.ocr_jobs import job_manager
+from src.core.previews import preview_key, previews
+from src.core.storage import store_upload
+from src.core.bulk_detection import bulk_detection, FINISHED_RUN_STATUSES, RunEventPoller
+from src.core.engine_registry import EngineName
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import json
 import os
 
 router = APIRouter(prefix="/api/projects", tags=["projects"])
 
+def _set_next_cursor(response: Response, next_cursor: Optional[int]):
+    # Plain list endpoints keep their shape; the next page is announced in a header
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+
 @router.get("", response_model=List[schemas.Project])
-def get_projects(db: Session = Depends(get_db)):
+def get_projects(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
     project_service = ProjectService(db)
-    return project_service.get_projects()
+    projects, next_cursor = project_service.get_projects_page(limit, cursor)
+    _set_next_cursor(response, next_cursor)
+    return projects
 
 @router.post("", response_model=schemas.Project)
 def create_project(project: schemas.ProjectCreate, db: Session = Depends(get_db)):
@@ -28,78 +50,297 @@ def get_project(project_id: int, db: Session = Depends(get_db)):
     return project_service.get_project(project_id)
 
 @router.get("/{project_id}/images", response_model=List[schemas.Image])
-def get_project_images(project_id: int, db: Session = Depends(get_db)):
+def get_project_images(
+    project_id: int,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[int] = None,
+    labeled: Optional[bool] = None,
+    updated_since: Optional[datetime] = None,
+    db: Session = Depends(get_db)
+):
+    # The version is read before the rows, so a concurrent change can only make the tag stale, never wrong
+    etag = project_etag(db, project_id, "images", limit, cursor, labeled, updated_since)
+    if etag:
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
     project_service = ProjectService(db)
-    return project_service.get_project_images(project_id)
+    images, next_cursor = project_service.get_project_images_page(
+        project_id, limit, cursor, labeled, updated_since
+    )
+    _set_next_cursor(response, next_cursor)
+    return images
+
+@router.get("/{project_id}/images/summary", response_model=schemas.ImageSummaryPage)
+def get_project_image_summaries(
+    project_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[int] = None,
+    labeled: Optional[bool] = None,
+    updated_since: Optional[datetime] = None,
+    db: Session = Depends(get_db)
+):
+    """Keyset-paginated image list with per-image label counts."""
+    etag = project_etag(db, project_id, "summary", limit, cursor, labeled, updated_since)
+    if etag:
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+    project_service = ProjectService(db)
+    items, next_cursor = project_service.get_image_summaries(project_id, limit, cursor, labeled, updated_since)
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.post("/{project_id}/images/upload")
 async def upload_images(
     project_id: int,
     files: List[UploadFile] = File(...),
+    reuse_labels: bool = False,
     db: Session = Depends(get_db)
 ):
-    # Create project directory if it doesn't exist
-    project_dir = f"uploads/project_{project_id}"
-    os.makedirs(project_dir, exist_ok=True)
-    
-    uploaded_images = []
+    """Upload images, or zip/tar archives of images, into a project.
+
+    Archives are the better fit for very large batches: they count as one
+    multipart file and are unpacked member by member. Images whose content
+    was uploaded before share its file and are listed under ``duplicates``;
+    ``reuse_labels`` copies the existing labels onto them.
+    """
+    # Disk writes happen in the threadpool so other requests keep being served
+    stored = []
     for file in files:
-        # Save file to project-specific directory
-        file_path = f"{project_dir}/{file.filename}"
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Create image record
-        db_image = models.Image(
-            project_id=project_id,
-            filename=file.filename,
-            file_path=file_path
-        )
-        db.add(db_image)
-        db.commit()
-        db.refresh(db_image)
-        uploaded_images.append(db_image)
-    
-    return {"uploaded": len(uploaded_images)}
+        stored.extend(await run_in_threadpool(store_upload, file.file, file.filename))
+        await file.close()
+
+    # One transaction for the whole batch
+    try:
+        result = await run_in_threadpool(ProjectService(db).save_images, project_id, stored, reuse_labels)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    if config.PREVIEW_ON_UPLOAD:
+        previews.schedule({f["sha256"]: f["file_path"] for f in stored}.items())
+    return result
+
+def _get_project_image(project_service: ProjectService, project_id: int, image_id: int):
+    image = project_service.get_image(image_id)
+    if not image or image.project_id != project_id:
+        raise HTTPException(status_code=404, detail="Image not found in project")
+    return image
+
+def _preview_headers(etag: str) -> dict:
+    # Derived from immutable content, so clients may keep them as long as they like
+    return {"ETag": etag, "Cache-Control": f"public, max-age={config.PREVIEW_MAX_AGE}"}
+
+def _ensure_previews(key: str, source_path: str):
+    try:
+        previews.ensure(key, source_path)
+    except OSError as e:
+        raise HTTPException(status_code=422, detail=f"Cannot build previews: {e}")
+
+def _preview_file(request: Request, key: str, source_path: str, variant: str, path_for) -> Response:
+    etag = f'"{key}-{variant}"'
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=_preview_headers(etag))
+    _ensure_previews(key, source_path)
+    path = path_for()
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Preview not found")
+    return FileResponse(path, media_type="image/jpeg", headers=_preview_headers(etag))
+
+@router.get("/{project_id}/images/{image_id}/preview")
+def get_image_preview(project_id: int, image_id: int, db: Session = Depends(get_db)):
+    """Pyramid layout and scale factors; coordinates divide by a level's scale to get original pixels."""
+    image = _get_project_image(ProjectService(db), project_id, image_id)
+    key = preview_key(image)
+    _ensure_previews(key, image.file_path)
+    info = previews.info(key, image.file_path)
+    base_url = f"/api/projects/{project_id}/images/{image_id}"
+    for thumbnail in info["thumbnails"]:
+        thumbnail["url"] = f"{base_url}/thumbnail?size={thumbnail['size']}"
+    return dict(info, version=key, tile_url=base_url + "/tiles/{level}/{column}/{row}")
+
+@router.get("/{project_id}/images/{image_id}/thumbnail")
+def get_image_thumbnail(
+    request: Request,
+    project_id: int,
+    image_id: int,
+    size: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db)
+):
+    image = _get_project_image(ProjectService(db), project_id, image_id)
+    size = previews.thumbnail_size(size)
+    key = preview_key(image)
+    return _preview_file(request, key, image.file_path, f"thumbnail-{size}",
+                         lambda: previews.thumbnail_path(key, size))
+
+@router.get("/{project_id}/images/{image_id}/tiles/{level}/{column}/{row}")
+def get_image_tile(
+    request: Request,
+    project_id: int,
+    image_id: int,
+    level: int,
+    column: int,
+    row: int,
+    db: Session = Depends(get_db)
+):
+    image = _get_project_image(ProjectService(db), project_id, image_id)
+    key = preview_key(image)
+    return _preview_file(request, key, image.file_path, f"tile-{level}-{column}-{row}",
+                         lambda: previews.tile_path(key, level, column, row))
+
+@router.post("/{project_id}/images/{image_id}/detect-text/jobs", status_code=202)
+def submit_detect_text_job(
+    project_id: int,
+    image_id: int,
+    engine: EngineName = "easyocr",
+    use_cache: bool = True,
+    merge: bool = False,
+    db: Session = Depends(get_db)
+):
+    image = _get_project_image(ProjectService(db), project_id, image_id)
+    job = job_manager.submit(
+        engine, project_id, image_id, image.file_path, use_cache=use_cache, content_hash=image.blob_sha256,
+        merge=merge,
+    )
+    return job.to_dict()
+
+@router.delete("/{project_id}/images/{image_id}", response_model=dict)
+def delete_image(project_id: int, image_id: int, db: Session = Depends(get_db)):
+    """Delete an image and its labels; its file goes once no other image shares it."""
+    project_service = ProjectService(db)
+    project_service.delete_image(_get_project_image(project_service, project_id, image_id))
+    return {"status": "success", "image_id": image_id}
 
 @router.post("/{project_id}/images/{image_id}/detect-text")
 async def detect_text(
     project_id: int,
     image_id: int,
-    engine: Literal["easyocr", "paddle"] = "easyocr",
+    engine: EngineName = "easyocr",
+    use_cache: bool = True,
+    merge: bool = False,
     db: Session = Depends(get_db)
 ):
-    project_service = ProjectService(db)
-    image = project_service.get_image(image_id)
-    if not image or image.project_id != project_id:
-        raise HTTPException(status_code=404, detail="Image not found in project")
+    """With ``merge``, boxes matching an existing label by IoU are not added again."""
+    image = _get_project_image(ProjectService(db), project_id, image_id)
+
+    # Inference runs on the job workers; awaiting the job keeps the event loop free
+    job = await run_in_threadpool(
+        job_manager.submit, engine, project_id, image_id, image.file_path,
+        use_cache=use_cache, content_hash=image.blob_sha256, merge=merge
+    )
+    await asyncio.wrap_future(job.done)
+    if job.status != "succeeded":
+        raise HTTPException(status_code=500, detail=f"Text detection {job.status}: {job.error or ''}".strip())
+    return job.result
 
-    # Process image and create labels
-    text_recognition = TextRecognitionService(engine=engine)
-    detected_labels = text_recognition.process_image(image.file_path)
-    
-    # Save labels
-    label_service = LabelService(db)
-    created_labels = []
-    for label_data in detected_labels:
-        label_data['image_id'] = image_id
-        created_labels.append(label_service.create_label(label_data))
-    
-    return created_labels
+def _sse(event: dict) -> str:
+    return f"event: {event.get('type', 'progress')}\ndata: {json.dumps(event)}\n\n"
+
+async def _run_events(run_id: int):
+    # Subscribe before taking the snapshot so no event falls in between
+    queue = bulk_detection.subscribe(run_id)
+    poller = RunEventPoller(run_id)
+    try:
+        snapshot = await run_in_threadpool(bulk_detection.get_run, run_id)
+        yield _sse(dict(snapshot, type="snapshot"))
+        if snapshot["status"] in FINISHED_RUN_STATUSES:
+            return
+        quiet = 0
+        while True:
+            if bulk_detection.is_driving(run_id):
+                try:
+                    events = [await asyncio.wait_for(queue.get(), timeout=1)]
+                except asyncio.TimeoutError:
+                    events = []
+            else:
+                # Another worker processes the run; follow it through the database
+                events = await run_in_threadpool(poller.poll)
+                if not events:
+                    await asyncio.sleep(1)
+            for event in events:
+                poller.mark_sent(event)
+                yield _sse(event)
+                if event["type"] == "done":
+                    return
+            quiet = 0 if events else quiet + 1
+            if quiet >= 15:
+                yield ": keep-alive\n\n"
+                quiet = 0
+    finally:
+        bulk_detection.unsubscribe(run_id, queue)
+
+def _event_stream(run_id: int) -> StreamingResponse:
+    return StreamingResponse(
+        _run_events(run_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _get_project_run(project_id: int, run_id: int) -> dict:
+    run = bulk_detection.get_run(run_id)
+    if not run or run["project_id"] != project_id:
+        raise HTTPException(status_code=404, detail="Detection run not found in project")
+    return run
+
+@router.post("/{project_id}/detect-text")
+def detect_project_text(
+    project_id: int,
+    engine: EngineName = "easyocr",
+    scope: Literal["unlabeled", "all"] = "unlabeled",
+    stream: bool = True,
+    use_cache: bool = True,
+    db: Session = Depends(get_db)
+):
+    """Auto-label a whole project.
+
+    With scope "all" every image is re-detected and its labels replaced.
+    Progress is streamed as server-sent events unless ``stream`` is false,
+    in which case the run is returned and can be followed via its events URL.
+    """
+    if not ProjectService(db).get_project(project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    run = bulk_detection.create_run(db, project_id, engine, scope, use_cache=use_cache)
+    if stream:
+        return _event_stream(run["run_id"])
+    return run
+
+@router.get("/{project_id}/detect-text/runs/{run_id}")
+def get_detection_run(project_id: int, run_id: int):
+    return _get_project_run(project_id, run_id)
+
+@router.get("/{project_id}/detect-text/runs/{run_id}/events")
+def stream_detection_run(project_id: int, run_id: int):
+    _get_project_run(project_id, run_id)
+    return _event_stream(run_id)
+
+@router.post("/{project_id}/detect-text/runs/{run_id}/resume")
+def resume_detection_run(project_id: int, run_id: int, db: Session = Depends(get_db)):
+    _get_project_run(project_id, run_id)
+    return bulk_detection.resume(db, run_id)
+
+@router.delete("/{project_id}/detect-text/runs/{run_id}")
+def cancel_detection_run(project_id: int, run_id: int):
+    _get_project_run(project_id, run_id)
+    if not bulk_detection.cancel(run_id):
+        raise HTTPException(status_code=409, detail="Detection run is not active")
+    return {"status": "cancelling", "run_id": run_id}
 
 @router.delete("/{project_id}/labels", response_model=dict)
 def clean_project_labels(project_id: int, db: Session = Depends(get_db)):
     """Delete all labels for a specific project"""
-    # Get all images in the project
+    deleted_count = LabelService(db).clean_project_labels(project_id)
+    return {"status": "success", "deleted_count": deleted_count}
+
+@router.get("/{project_id}/stats", response_model=schemas.ProjectStats)
+def get_project_stats(project_id: int, db: Session = Depends(get_db)):
+    return ProjectService(db).get_project_stats(project_id)
+
+@router.post("/{project_id}/images/move", response_model=dict)
+def move_images(project_id: int, move: schemas.ImageMove, db: Session = Depends(get_db)):
     project_service = ProjectService(db)
-    images = project_service.get_project_images(project_id)
-    
-    # Delete all labels for each image
-    deleted_count = 0
-    for image in images:
-        deleted = db.query(label_models.Label).filter(label_models.Label.image_id == image.id).delete()
-        deleted_count += deleted
-    
-    db.commit()
-    return {"status": "success", "deleted_count": deleted_count}
\ No newline at end of file
+    if not project_service.get_project(move.target_project_id):
+        raise HTTPException(status_code=404, detail="Target project not found")
+    moved = project_service.move_images(project_id, move.target_project_id, move.image_ids)
+    return {"status": "success", "moved_count": moved}
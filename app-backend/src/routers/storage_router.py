@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from src.database.database import get_db
+from src.services.blob_service import BlobService
+
+router = APIRouter(prefix="/api/storage", tags=["storage"])
+
+@router.get("")
+def get_storage_stats(db: Session = Depends(get_db)):
+    return BlobService(db).stats()
+
+@router.post("/gc")
+def collect_garbage(db: Session = Depends(get_db)):
+    """Recount blob references and delete files no image points at any more."""
+    return BlobService(db).collect_garbage()
@@ -21,11 +21,34 @@ class Label(LabelCreate):
     id: int
 
     class Config:
-        orm_mode = True
+        from_attributes = True
 
 class LabelUpdate(BaseModel):
     text: str | None = None
     x: float | None = None
     y: float | None = None
     width: float | None = None
-    height: float | None = None 
\ No newline at end of file
+    height: float | None = None 
+
+class LabelBulkItem(BaseModel):
+    x: float | None = None
+    y: float | None = None
+    width: float | None = None
+    height: float | None = None
+    text: str
+
+class LabelBulkCreate(BaseModel):
+    image_id: int
+    labels: List[LabelBulkItem]
+    replace: bool = False
+
+class LabelMerge(BaseModel):
+    labels: List[LabelBulkItem]
+    iou_threshold: float | None = None  # defaults to LABEL_MERGE_IOU
+    update_text: bool = False
+
+class LabelMergeResult(BaseModel):
+    label_ids: List[int]  # per detection, the label it was created as or merged into
+    labels: List[Label]
+    created: int
+    updated: int
@@ -27,6 +27,26 @@ class ImageCreate(ImageBase):
 
 class Image(ImageBase, TimeStampSchema):
     id: int
+    blob_sha256: Optional[str] = None
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class ImageSummary(ImageBase, TimeStampSchema):
+    id: int
+    label_count: int
+
+class ImageSummaryPage(BaseModel):
+    items: List[ImageSummary]
+    next_cursor: Optional[int] = None
+
+class ProjectStats(BaseModel):
+    project_id: int
+    image_count: int
+    labeled_image_count: int
+    unlabeled_image_count: int
+    label_count: int
+
+class ImageMove(BaseModel):
+    target_project_id: int
+    image_ids: Optional[List[int]] = None
\ No newline at end of file
@@ -0,0 +1,187 @@
+import logging
+import os
+import time
+from collections import Counter
+from typing import Dict, List
+from sqlalchemy import bindparam, delete, func, select, update
+from sqlalchemy.orm import Session
+from ..core import config
+from ..core.previews import previews
+from ..models.blob import Blob
+from ..models.project import Image
+
+logger = logging.getLogger(__name__)
+
+_blobs = Blob.__table__
+
+def _recent(path: str) -> bool:
+    try:
+        return time.time() - os.path.getmtime(path) < config.BLOB_GRACE_SECONDS
+    except OSError:
+        return False
+
+def remove_blob_file(path: str, drop_previews: bool = True) -> bool:
+    """Unlink a blob file and its previews, unless an upload stored or reused it lately.
+
+    An upload takes its reference only when its batch commits; until then the
+    file's fresh mtime is all that protects it. Files left behind this way are
+    swept by ``collect_garbage`` once they are older than the grace period.
+    """
+    if _recent(path):
+        return False
+    if drop_previews:
+        # Previews are keyed by the content hash, which is also the blob's file name
+        previews.remove(os.path.splitext(os.path.basename(path))[0])
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.exception("Failed to remove blob file %s", path)
+        return False
+    return True
+
+def _insert_missing(db: Session):
+    """INSERT into blobs that skips hashes another transaction has stored meanwhile."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(Blob).on_conflict_do_nothing(index_elements=["sha256"])
+
+class BlobService:
+    """Bookkeeping for the content-addressed image store.
+
+    ``ref_count`` is the number of ``Image`` rows pointing at a blob. Methods
+    that change it leave the commit to the caller, so image rows and their
+    references are written in one transaction.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def acquire(self, files: List[dict]) -> Dict[str, Blob]:
+        """Add one reference per stored file, creating blob rows as needed.
+
+        Each file's ``file_path`` is pointed at the blob's canonical path; a
+        copy stored under a different extension is dropped. Returns the blobs
+        that already existed before this batch, keyed by hash.
+        """
+        hashes = {f["sha256"] for f in files}
+        if not hashes:
+            return {}
+        existing = {
+            blob.sha256: blob
+            for blob in self.db.query(Blob).filter(Blob.sha256.in_(hashes))
+        }
+        canonical = {sha256: blob.path for sha256, blob in existing.items()}
+        new_rows = []
+        for f in files:
+            if f["sha256"] not in canonical:
+                canonical[f["sha256"]] = f["file_path"]
+                new_rows.append({"sha256": f["sha256"], "path": f["file_path"], "size": f["size"], "ref_count": 0})
+        if new_rows:
+            # A concurrent upload of the same new content may have created the row first;
+            # its path is the canonical one then
+            self.db.execute(_insert_missing(self.db), new_rows)
+            canonical.update(self.db.execute(
+                select(Blob.sha256, Blob.path).where(Blob.sha256.in_([row["sha256"] for row in new_rows]))
+            ).all())
+        for f in files:
+            path = canonical[f["sha256"]]
+            if f["file_path"] != path and os.path.exists(path):
+                # Same bytes stored before under another extension. Only this copy
+                # goes: the previews, keyed by hash, belong to the canonical blob.
+                try:
+                    os.remove(f["file_path"])
+                except FileNotFoundError:
+                    pass
+            elif f["file_path"] != path and os.path.exists(f["file_path"]):
+                # The canonical file was unlinked; this upload brings the bytes back
+                os.replace(f["file_path"], path)
+            elif not os.path.exists(path):
+                raise ValueError(f"Stored file for {f['filename']} disappeared; upload it again")
+            f["file_path"] = path
+        counts = Counter(f["sha256"] for f in files)
+        self.db.execute(
+            update(_blobs)
+            .where(_blobs.c.sha256 == bindparam("_sha256"))
+            .values(ref_count=_blobs.c.ref_count + bindparam("_count")),
+            [{"_sha256": sha256, "_count": count} for sha256, count in counts.items()],
+        )
+        return existing
+
+    def release(self, sha256: str) -> List[str]:
+        """Drop one reference; returns the files to unlink once the caller has committed."""
+        self.db.execute(
+            update(Blob).where(Blob.sha256 == sha256)
+            .values(ref_count=Blob.ref_count - 1)
+            .execution_options(synchronize_session=False)
+        )
+        path = self.db.execute(
+            delete(Blob).where(Blob.sha256 == sha256, Blob.ref_count <= 0).returning(Blob.path)
+        ).scalar()
+        return [path] if path else []
+
+    def collect_garbage(self, staging_max_age: int = 3600) -> dict:
+        """Recount references from the images table and delete unreferenced blobs.
+
+        Also clears staging files left behind by interrupted uploads.
+        """
+        image_count = (
+            select(func.count(Image.id)).where(Image.blob_sha256 == Blob.sha256).scalar_subquery()
+        )
+        self.db.execute(update(Blob).values(ref_count=image_count).execution_options(synchronize_session=False))
+        removed = self.db.execute(
+            delete(Blob).where(Blob.ref_count <= 0).returning(Blob.path, Blob.size)
+        ).all()
+        self.db.commit()
+        for path, _ in removed:
+            remove_blob_file(path)
+
+        # Files no blob row points at: released during an upload's grace period, or
+        # copies under another extension whose batch failed
+        rows = self.db.query(Blob.sha256, Blob.path).all()
+        known_paths = {os.path.normpath(path) for _, path in rows}
+        known_hashes = {sha256 for sha256, _ in rows}
+        orphans_removed = 0
+        for root, directories, names in os.walk(config.BLOB_DIR):
+            if root == config.BLOB_DIR:
+                directories[:] = [d for d in directories if d != "tmp"]
+            for name in names:
+                path = os.path.join(root, name)
+                if os.path.normpath(path) in known_paths:
+                    continue
+                # A stray copy of a live blob must not take the blob's previews along
+                live = os.path.splitext(name)[0] in known_hashes
+                if remove_blob_file(path, drop_previews=not live):
+                    orphans_removed += 1
+
+        staging_removed = 0
+        staging_dir = os.path.join(config.BLOB_DIR, "tmp")
+        if os.path.isdir(staging_dir):
+            cutoff = time.time() - staging_max_age
+            for entry in os.scandir(staging_dir):
+                if entry.is_file() and entry.stat().st_mtime < cutoff and remove_blob_file(entry.path):
+                    staging_removed += 1
+        return {
+            "removed_blobs": len(removed),
+            "freed_bytes": sum(size for _, size in removed),
+            "removed_orphan_files": orphans_removed,
+            "removed_staging_files": staging_removed,
+        }
+
+    def stats(self) -> dict:
+        blob_count, stored_bytes, logical_bytes, references = self.db.query(
+            func.count(Blob.sha256),
+            func.coalesce(func.sum(Blob.size), 0),
+            func.coalesce(func.sum(Blob.size * Blob.ref_count), 0),
+            func.coalesce(func.sum(Blob.ref_count), 0),
+        ).one()
+        return {
+            "blob_count": blob_count,
+            "reference_count": references,
+            "stored_bytes": stored_bytes,
+            "logical_bytes": logical_bytes,
+            "deduplicated_bytes": logical_bytes - stored_bytes,
+        }
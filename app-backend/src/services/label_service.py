@@ -1,12 +1,19 @@
+from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Iterator, List, Optional
+from datetime import datetime, timezone
 import os
 import json
-import shutil
-from tempfile import mkdtemp
+import hashlib
+import zipfile
+from ..core.ocr_cache import file_sha256
+from ..core.spatial_index import Box, GridIndex, spatial_indexes
+from ..core.zip_stream import ZipStream, write_bytes, write_file
 from ..interfaces.label_interface import ILabelRepository
 from ..models.label import Label
+from ..models.project import Image
 from ..services.project_service import ProjectService
+from ..services.versioning import bump_images, bump_project_images
 
 class LabelService(ILabelRepository):
     def __init__(self, db: Session):
@@ -15,18 +22,129 @@ class LabelService(ILabelRepository):
     def create_label(self, label_data: dict) -> Label:
         db_label = Label(**label_data)
         self.db.add(db_label)
+        bump_images(self.db, [label_data["image_id"]])
         self.db.commit()
         self.db.refresh(db_label)
         return db_label
     
+    def create_labels(self, image_id: int, labels_data: List[dict], replace: bool = False) -> List[Label]:
+        """Insert all labels of an image in one transaction, optionally replacing its current labels."""
+        rows = [dict(label_data, image_id=image_id) for label_data in labels_data]
+        try:
+            if replace:
+                self.db.query(Label).filter(Label.image_id == image_id).delete(synchronize_session=False)
+            label_ids = _insert_labels(self.db, rows)
+            bump_images(self.db, [image_id])
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return self._load_labels(label_ids)
+    
+    def _load_labels(self, label_ids: List[int]) -> List[Label]:
+        # One query for rows a commit just expired, instead of a refresh per label
+        if not label_ids:
+            return []
+        return self.db.query(Label).filter(Label.id.in_(label_ids)).order_by(Label.id).all()
+
     def get_image_labels(self, image_id: int) -> List[Label]:
         return self.db.query(Label).filter(Label.image_id == image_id).all()
+
+    def _spatial_index(self, image_id: int) -> Optional[GridIndex]:
+        """Index over the image's boxed labels; ``None`` if the image does not exist."""
+        row = self.db.execute(select(Image.version, Image.created_at).where(Image.id == image_id)).first()
+        if row is None:
+            return None
+
+        def build() -> GridIndex:
+            rows = self.db.execute(
+                select(Label.id, Label.x, Label.y, Label.width, Label.height).where(
+                    Label.image_id == image_id,
+                    Label.x.is_not(None), Label.y.is_not(None), Label.width.is_not(None), Label.height.is_not(None),
+                )
+            )
+            return GridIndex((label_id, _box(x, y, width, height)) for label_id, x, y, width, height in rows)
+
+        return spatial_indexes.get(image_id, tuple(row), build)
+
+    def get_labels_in_region(self, image_id: int, x: float, y: float, width: float = 0,
+                             height: float = 0) -> Optional[List[Label]]:
+        """Labels intersecting a rectangle, smallest first; ``None`` if the image does not exist."""
+        index = self._spatial_index(image_id)
+        if index is None:
+            return None
+        label_ids = index.query(_box(x, y, width, height))
+        if not label_ids:
+            return []
+        labels = self.db.query(Label).filter(Label.id.in_(label_ids)).all()
+        # Under a cursor the innermost box is usually the one meant
+        labels.sort(key=lambda label: abs(label.width * label.height))
+        return labels
+
+    def merge_labels(self, image_id: int, labels_data: List[dict], iou_threshold: float,
+                     update_text: bool = False) -> Optional[dict]:
+        """Add detections to an image unless they repeat an existing label or an earlier detection.
+
+        A detection whose IoU with a label reaches ``iou_threshold`` is merged
+        into it; with ``update_text`` the label takes the detection's text.
+        Returns ``label_ids`` (the label each detection ended up as, in
+        order), ``labels`` (those labels, once each), ``created`` and
+        ``updated``; ``None`` if the image does not exist.
+        """
+        index = self._spatial_index(image_id)
+        if index is None:
+            return None
+        # Rows inserted by this call, indexed apart so the shared index stays read-only
+        added = GridIndex(cell_size=index.cell_size)
+        rows, texts = [], {}
+        # Per detection: ("label", id) for an existing label, ("row", i) for rows[i]
+        targets = []
+        for label_data in labels_data:
+            if any(label_data.get(key) is None for key in ("x", "y", "width", "height")):
+                raise ValueError("Every detection needs x, y, width and height")
+            box = _box(label_data["x"], label_data["y"], label_data["width"], label_data["height"])
+            label_id, overlap = index.best_match(box)
+            if label_id is not None and overlap >= iou_threshold:
+                targets.append(("label", label_id))
+                if update_text and label_data.get("text") is not None:
+                    texts[label_id] = label_data["text"]
+                continue
+            row, overlap = added.best_match(box)
+            if row is not None and overlap >= iou_threshold:
+                targets.append(("row", row))
+                continue
+            added.insert(len(rows), box)
+            targets.append(("row", len(rows)))
+            rows.append(dict(label_data, image_id=image_id))
+
+        try:
+            created = _insert_labels(self.db, rows)
+            if texts:
+                self.db.execute(update(Label), [{"id": label_id, "text": text} for label_id, text in texts.items()])
+            if rows or texts:
+                bump_images(self.db, [image_id])
+                self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        label_ids = [created[i] if kind == "row" else i for kind, i in targets]
+        distinct_ids = list(dict.fromkeys(label_ids))
+        by_id = {label.id: label for label in self._load_labels(distinct_ids)}
+        return {
+            "label_ids": label_ids,
+            "labels": [by_id[label_id] for label_id in distinct_ids],
+            "created": len(created),
+            "updated": len(texts),
+        }
     
     def update_label(self, label_id: int, label_data: dict) -> Label:
         db_label = self.db.query(Label).filter(Label.id == label_id).first()
         if db_label:
+            image_ids = [db_label.image_id]
             for key, value in label_data.items():
                 setattr(db_label, key, value)
+            bump_images(self.db, image_ids + [db_label.image_id])
             self.db.commit()
             self.db.refresh(db_label)
         return db_label
@@ -35,6 +153,7 @@ class LabelService(ILabelRepository):
         db_label = self.db.query(Label).filter(Label.id == label_id).first()
         if db_label:
             self.db.delete(db_label)
+            bump_images(self.db, [db_label.image_id])
             self.db.commit()
             return True
         return False 
@@ -46,90 +165,192 @@ class LabelService(ILabelRepository):
         ).first()
         if existing_label:
             self.db.delete(existing_label)
+            bump_images(self.db, [existing_label.image_id])
             self.db.commit()
         
         return self.create_label(label_data)
 
     def clean_image_labels(self, image_id: int) -> int:
         deleted = self.db.query(Label).filter(Label.image_id == image_id).delete()
+        bump_images(self.db, [image_id])
         self.db.commit()
         return deleted
 
-    def export_project_dataset(self, project_id: int) -> tuple[str, str]:
-        # Create temporary directory for export
-        export_dir = mkdtemp()
-        images_dir = os.path.join(export_dir, "images")
-        labels_dir = os.path.join(export_dir, "labels")
-        os.makedirs(images_dir)
-        os.makedirs(labels_dir)
-
-        # Get all images and their labels
-        project_service = ProjectService(self.db)
-        images = project_service.get_project_images(project_id)
-
-        # Create a single labels file for text-only projects
-        text_only_labels_file = os.path.join(labels_dir, 'labels.txt')
-        text_only_file = None
-
-        for image in images:
-            # Copy image to export directory
-            image_filename = os.path.basename(image.file_path)
-            shutil.copy2(image.file_path, os.path.join(images_dir, image_filename))
-
-            # Get labels for image
-            labels = self.get_image_labels(image.id)
-
-            project_type = self._get_project_type(labels)
-            if project_type == "text_only":
-                # Open the labels file in append mode if not already open
-                if text_only_file is None:
-                    text_only_file = open(text_only_labels_file, 'w', encoding='utf-8')
-                
-                # Export text-only labels
-                text_only_labels = []
-                for label in labels:
-                    if label.x is None and label.y is None and label.width is None and label.height is None:
-                        text_only_labels.append(label.text)
-                
-                # Write to single file
-                text_only_file.write(f"{image_filename}\t" + "\t".join(text_only_labels) + "\n")
-            else:
-                # Export regular labels
-                paddle_labels = []
-                for label in labels:
-                    label_data = {
-                        "transcription": label.text,
-                        "points": [
-                            [label.x, label.y],
-                            [label.x + label.width, label.y],
-                            [label.x + label.width, label.y + label.height],
-                            [label.x, label.y + label.height]
-                        ],
-                        "difficult": False,
-                        "direction": 0
-                    }
-                    paddle_labels.append(label_data)
-
-                # Save label file
-                label_filename = os.path.splitext(image_filename)[0] + '.txt'
-                with open(os.path.join(labels_dir, label_filename), 'w', encoding='utf-8') as f:
-                    json.dump(paddle_labels, f, ensure_ascii=False, indent=2)
-
-        # Close the text-only labels file if it was opened
-        if text_only_file is not None:
-            text_only_file.close()
-
-        # Create zip file
-        shutil.make_archive(export_dir, 'zip', export_dir)
-        zip_path = f"{export_dir}.zip"
-
-        # Clean up the temporary directory
-        shutil.rmtree(export_dir)
-
-        return zip_path, f'project_{project_id}_dataset.zip' 
+    def clean_project_labels(self, project_id: int) -> int:
+        # Single DELETE driven by the images.project_id and labels.image_id indexes
+        project_images = select(Image.id).where(Image.project_id == project_id)
+        result = self.db.execute(
+            delete(Label).where(Label.image_id.in_(project_images)).execution_options(synchronize_session=False)
+        )
+        bump_project_images(self.db, project_id)
+        self.db.commit()
+        return result.rowcount
+
+    def count_project_labels(self, project_id: int) -> int:
+        return self.db.execute(
+            select(func.count(Label.id))
+            .join(Image, Image.id == Label.image_id)
+            .where(Image.project_id == project_id)
+        ).scalar_one()
+
+    def export_project_dataset(self, project_id: int, base_manifest: Optional[dict] = None,
+                               since: Optional[datetime] = None) -> tuple[Iterator[bytes], str]:
+        """Export a project as a zip stream.
+
+        Without arguments everything is exported. Given the ``manifest.json``
+        of an earlier export, only files that were added or changed since are
+        included and removed ones are listed as deleted. ``since`` does the
+        same based on ``updated_at``, but cannot see deleted images or labels.
+        Every export carries a full manifest to diff the next one against.
+        """
+        if since is not None and since.tzinfo is not None:
+            # Timestamps are stored as naive UTC
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        if base_manifest is None and since is None:
+            filename = f'project_{project_id}_dataset.zip'
+        else:
+            filename = f'project_{project_id}_delta_{datetime.utcnow():%Y%m%dT%H%M%S}.zip'
+        return self._iter_project_dataset(project_id, base_manifest, since), filename
+
+    def _iter_project_dataset(self, project_id: int, base_manifest: Optional[dict] = None,
+                              since: Optional[datetime] = None) -> Iterator[bytes]:
+        # Images are read once straight into the zip; label files are generated on the fly
+        base_files = base_manifest.get("files", {}) if base_manifest is not None else None
+        files = {}
+        changes = {"added": [], "modified": [], "deleted": []}
+
+        def changed(arcname: str, entry: dict, created_since: bool, updated_since: bool) -> bool:
+            if base_files is None and since is None:
+                return True
+            if base_files is not None:
+                previous = base_files.get(arcname)
+                if previous is not None and previous.get("sha256") == entry.get("sha256"):
+                    return False
+                changes["modified" if previous is not None else "added"].append(arcname)
+                return True
+            if not updated_since:
+                return False
+            changes["added" if created_since else "modified"].append(arcname)
+            return True
+
+        stream = ZipStream()
+        with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            project_service = ProjectService(self.db)
+            images = project_service.get_project_images(project_id)
+
+            # Text-only projects share a single labels file, written at the end
+            text_only_lines = []
+            text_only_changed = False
+
+            for image in images:
+                # Stored files are named by content hash and uploaded names repeat; the id
+                # keeps archive names unique, the manifest keeps the uploaded name
+                original_filename = os.path.basename(image.filename)
+                image_filename = f"{image.id}_{original_filename}"
+                arcname = f"images/{image_filename}"
+                entry = {
+                    "image_id": image.id,
+                    "filename": original_filename,
+                    "updated_at": image.updated_at.isoformat() if image.updated_at else None,
+                }
+                created_since = since is not None and image.created_at is not None and image.created_at > since
+                updated_since = since is not None and image.updated_at is not None and image.updated_at > since
+
+                previous = base_files.get(arcname) if base_files is not None else None
+                if previous is not None and previous.get("sha256") and all(
+                    previous.get(key) == entry[key] for key in ("image_id", "updated_at")
+                ):
+                    # Same row, untouched since the base export: trust its hash instead of re-reading
+                    entry.update(sha256=previous["sha256"], size=previous.get("size"))
+                elif previous is not None:
+                    entry.update(
+                        sha256=image.blob_sha256 or file_sha256(image.file_path),
+                        size=os.path.getsize(image.file_path),
+                    )
+
+                if changed(arcname, entry, created_since, updated_since):
+                    # Images are already compressed, store them as-is
+                    yield from write_file(archive, stream, image.file_path, arcname, digest=entry)
+                files[arcname] = entry
+
+                labels = self.get_image_labels(image.id)
+                labels_updated_since = since is not None and (updated_since or any(
+                    label.updated_at is not None and label.updated_at > since for label in labels
+                ))
+
+                project_type = self._get_project_type(labels)
+                if project_type == "text_only":
+                    text_only_labels = []
+                    for label in labels:
+                        if label.x is None and label.y is None and label.width is None and label.height is None:
+                            text_only_labels.append(label.text)
+                    text_only_lines.append(f"{image_filename}\t" + "\t".join(text_only_labels) + "\n")
+                    text_only_changed = text_only_changed or labels_updated_since
+                else:
+                    paddle_labels = [self._to_paddle_label(label) for label in labels]
+                    label_arcname = "labels/" + os.path.splitext(image_filename)[0] + '.txt'
+                    data = json.dumps(paddle_labels, ensure_ascii=False, indent=2).encode('utf-8')
+                    label_entry = {"image_id": image.id, "sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+                    if changed(label_arcname, label_entry, created_since, labels_updated_since):
+                        yield from write_bytes(archive, stream, label_arcname, data)
+                    files[label_arcname] = label_entry
+
+            if text_only_lines:
+                data = "".join(text_only_lines).encode('utf-8')
+                entry = {"sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+                if changed("labels/labels.txt", entry, False, text_only_changed):
+                    yield from write_bytes(archive, stream, "labels/labels.txt", data)
+                files["labels/labels.txt"] = entry
+
+            if base_files is not None:
+                changes["deleted"] = sorted(set(base_files) - set(files))
+
+            manifest = {
+                "version": 1,
+                "project_id": project_id,
+                "generated_at": datetime.utcnow().isoformat(),
+                "base_generated_at": base_manifest.get("generated_at") if base_manifest is not None else None,
+                "since": since.isoformat() if since is not None else None,
+                "incremental": base_manifest is not None or since is not None,
+                "changes": changes,
+                "files": files,
+            }
+            yield from write_bytes(
+                archive, stream, "manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+            )
+
+        # Central directory is written when the archive closes
+        data = stream.drain()
+        if data:
+            yield data
+
+    def _to_paddle_label(self, label: Label) -> dict:
+        return {
+            "transcription": label.text,
+            "points": [
+                [label.x, label.y],
+                [label.x + label.width, label.y],
+                [label.x + label.width, label.y + label.height],
+                [label.x, label.y + label.height]
+            ],
+            "difficult": False,
+            "direction": 0
+        }
     
     def _get_project_type(self, labels: List[Label]) -> str:
         for label in labels:
             if label.x is None and label.y is None and label.width is None and label.height is None:
                 return "text_only"
-        return "regular"
\ No newline at end of file
+        return "regular"
+
+def _box(x: float, y: float, width: float, height: float) -> Box:
+    # Boxes drawn right-to-left or bottom-up may be stored with negative sizes
+    return (min(x, x + width), min(y, y + height), max(x, x + width), max(y, y + height))
+
+def _insert_labels(db: Session, rows: List[dict]) -> List[int]:
+    """Insert label rows with multi-row INSERTs; returns their ids in ``rows`` order."""
+    if not rows:
+        return []
+    # Asking for parameter order makes SQLite fall back to one INSERT per row. Rows
+    # are numbered in the order they are inserted, so sorting the ids restores it.
+    return sorted(db.scalars(insert(Label).returning(Label.id), rows))
@@ -1,7 +1,32 @@
+from datetime import datetime
+from collections import defaultdict
+from sqlalchemy import delete, func, insert, literal, select, update
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from src.interfaces.project_interface import IProjectRepository
+from src.models.detection_run import DetectionRunItem
+from src.models.label import Label
 from src.models.project import Project, Image
+from src.services.blob_service import BlobService, remove_blob_file
+from src.services.versioning import bump_projects
+
+MAX_PAGE_SIZE = 1000
+
+def _keyset(query, id_column, limit: Optional[int], cursor: Optional[int]) -> Tuple[list, Optional[int]]:
+    """Page ``query`` by ascending id, returning the rows and the cursor of the next page."""
+    if cursor is not None:
+        query = query.filter(id_column > cursor)
+    query = query.order_by(id_column)
+    if limit is None:
+        return query.all(), None
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    # One extra row tells us whether another page exists
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, (last.id if hasattr(last, "id") else last[0])
 
 class ProjectService(IProjectRepository):
     def __init__(self, db: Session):
@@ -17,18 +42,204 @@ class ProjectService(IProjectRepository):
     def get_project(self, project_id: int) -> Project:
         return self.db.query(Project).filter(Project.id == project_id).first()
     
-    def get_project_images(self, project_id: int) -> List[Image]:
-        return self.db.query(Image).filter(Image.project_id == project_id).all()
+    def get_project_images(self, project_id: int, limit: Optional[int] = None, cursor: Optional[int] = None,
+                           labeled: Optional[bool] = None, updated_since: Optional[datetime] = None) -> List[Image]:
+        return self.get_project_images_page(project_id, limit, cursor, labeled, updated_since)[0]
+
+    def get_project_images_page(self, project_id: int, limit: Optional[int] = None, cursor: Optional[int] = None,
+                                labeled: Optional[bool] = None,
+                                updated_since: Optional[datetime] = None) -> Tuple[List[Image], Optional[int]]:
+        query = self._filter_images(self.db.query(Image), project_id, labeled, updated_since)
+        return _keyset(query, Image.id, limit, cursor)
+
+    def get_image_summaries(self, project_id: int, limit: Optional[int] = 100, cursor: Optional[int] = None,
+                            labeled: Optional[bool] = None,
+                            updated_since: Optional[datetime] = None) -> Tuple[List[dict], Optional[int]]:
+        """Image rows plus their label counts, aggregated in the same query."""
+        label_count = func.count(Label.id).label("label_count")
+        query = (
+            self.db.query(
+                Image.id, Image.project_id, Image.filename, Image.file_path,
+                Image.created_at, Image.updated_at, label_count
+            )
+            .outerjoin(Label, Label.image_id == Image.id)
+            .filter(Image.project_id == project_id)
+            .group_by(Image.id)
+        )
+        if labeled is True:
+            query = query.having(label_count > 0)
+        elif labeled is False:
+            query = query.having(label_count == 0)
+        if updated_since is not None:
+            query = query.filter(Image.updated_at > updated_since)
+        rows, next_cursor = _keyset(query, Image.id, limit, cursor)
+        return [row._asdict() for row in rows], next_cursor
+
+    def _filter_images(self, query, project_id: int, labeled: Optional[bool], updated_since: Optional[datetime]):
+        query = query.filter(Image.project_id == project_id)
+        if labeled is True:
+            query = query.filter(Image.labels.any())
+        elif labeled is False:
+            query = query.filter(~Image.labels.any())
+        if updated_since is not None:
+            query = query.filter(Image.updated_at > updated_since)
+        return query
     
     def save_image(self, image_data: dict) -> Image:
         db_image = Image(**image_data)
         self.db.add(db_image)
+        bump_projects(self.db, [image_data["project_id"]])
         self.db.commit()
         self.db.refresh(db_image)
         return db_image 
+
+    def save_images(self, project_id: int, images_data: List[dict], reuse_labels: bool = False) -> dict:
+        """Register a whole upload batch, and its blob references, in one transaction.
+
+        Images whose content is already stored under another image are
+        reported as duplicates; with ``reuse_labels`` they also get a copy of
+        the labels of the best-labelled earlier image with the same content.
+        """
+        if not images_data:
+            return {"uploaded": 0, "duplicates": [], "reused_label_count": 0}
+        try:
+            BlobService(self.db).acquire([f for f in images_data if f.get("sha256")])
+            rows = [
+                {
+                    "project_id": project_id,
+                    "filename": image_data["filename"],
+                    "file_path": image_data["file_path"],
+                    "blob_sha256": image_data.get("sha256"),
+                }
+                for image_data in images_data
+            ]
+            # Asking for parameter order makes SQLite fall back to one INSERT per row; the
+            # ids are handed out in insertion order, so sorting them restores it
+            new_ids = sorted(self.db.scalars(insert(Image).returning(Image.id), rows))
+            duplicates, reused = self._link_duplicates(dict(zip(new_ids, rows)), reuse_labels)
+            bump_projects(self.db, [project_id])
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return {"uploaded": len(new_ids), "duplicates": duplicates, "reused_label_count": reused}
+
+    def _link_duplicates(self, new_images: Dict[int, dict], reuse_labels: bool) -> Tuple[List[dict], int]:
+        hashes = {row["blob_sha256"] for row in new_images.values() if row["blob_sha256"]}
+        if not hashes:
+            return [], 0
+        # Every earlier image sharing content with this batch, best labelled first
+        label_count = func.count(Label.id).label("label_count")
+        earlier = (
+            self.db.query(Image.id, Image.project_id, Image.blob_sha256, label_count)
+            .outerjoin(Label, Label.image_id == Image.id)
+            .filter(Image.blob_sha256.in_(hashes), Image.id.notin_(list(new_images)))
+            .group_by(Image.id)
+            .order_by(label_count.desc(), Image.id)
+            .all()
+        )
+        by_hash = defaultdict(list)
+        for row in earlier:
+            by_hash[row.blob_sha256].append(row)
+        # Copies within the batch are duplicates of its first image with that content
+        batch_first = {}
+        for image_id, row in new_images.items():
+            if row["blob_sha256"]:
+                batch_first.setdefault(row["blob_sha256"], image_id)
+
+        duplicates = []
+        reused = 0
+        for image_id, row in new_images.items():
+            matches = by_hash.get(row["blob_sha256"], [])
+            first = batch_first.get(row["blob_sha256"])
+            existing_ids = [match.id for match in matches]
+            if first is not None and first != image_id:
+                existing_ids.append(first)
+            if not existing_ids:
+                continue
+            duplicate = {
+                "image_id": image_id,
+                "filename": row["filename"],
+                "sha256": row["blob_sha256"],
+                "existing_image_ids": existing_ids,
+                "reused_labels_from": None,
+            }
+            # Images of this batch have no labels yet
+            source = matches[0] if matches else None
+            if reuse_labels and source is not None and source.label_count:
+                columns = [Label.x, Label.y, Label.width, Label.height, Label.text]
+                now = literal(datetime.utcnow())
+                self.db.execute(
+                    insert(Label).from_select(
+                        ["image_id", "x", "y", "width", "height", "text", "created_at", "updated_at"],
+                        select(literal(image_id), *columns, now, now)
+                        .where(Label.image_id == source.id)
+                        .order_by(Label.id),
+                    )
+                )
+                duplicate["reused_labels_from"] = source.id
+                reused += source.label_count
+            duplicates.append(duplicate)
+        return duplicates, reused
+
+    def delete_image(self, image: Image):
+        """Delete an image with its labels and drop its blob reference."""
+        orphaned = []
+        try:
+            sha256, project_id = image.blob_sha256, image.project_id
+            # Tables created before the foreign key cascaded still need this
+            self.db.execute(delete(DetectionRunItem).where(DetectionRunItem.image_id == image.id))
+            self.db.delete(image)
+            # The image row goes first: it references the blob row release() may delete
+            self.db.flush()
+            if sha256:
+                orphaned = BlobService(self.db).release(sha256)
+            bump_projects(self.db, [project_id])
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        # Only unlink once nothing in the database can point at the file any more
+        for path in orphaned:
+            remove_blob_file(path)
+
+    def get_projects(self, limit: Optional[int] = None, cursor: Optional[int] = None) -> List[Project]:
+        return self.get_projects_page(limit, cursor)[0]
+
+    def get_projects_page(self, limit: Optional[int] = None,
+                          cursor: Optional[int] = None) -> Tuple[List[Project], Optional[int]]:
+        return _keyset(self.db.query(Project), Project.id, limit, cursor)
     
-    def get_projects(self):
-        return self.db.query(Project).all() 
-    
+    def get_project_stats(self, project_id: int) -> dict:
+        """Image, labelled-image and label counts in one aggregate over images joined with labels."""
+        image_count, labeled_count, label_count = self.db.query(
+            func.count(func.distinct(Image.id)),
+            func.count(func.distinct(Label.image_id)),
+            func.count(Label.id),
+        ).select_from(Image).outerjoin(Label, Label.image_id == Image.id).filter(
+            Image.project_id == project_id
+        ).one()
+        return {
+            "project_id": project_id,
+            "image_count": image_count,
+            "labeled_image_count": labeled_count,
+            "unlabeled_image_count": image_count - labeled_count,
+            "label_count": label_count,
+        }
+
+    def move_images(self, source_project_id: int, target_project_id: int,
+                    image_ids: Optional[List[int]] = None) -> int:
+        """Move images (all, or the given ids) with their labels to another project in one UPDATE."""
+        statement = update(Image).where(Image.project_id == source_project_id)
+        if image_ids is not None:
+            statement = statement.where(Image.id.in_(image_ids))
+        result = self.db.execute(
+            statement.values(project_id=target_project_id, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        bump_projects(self.db, [source_project_id, target_project_id])
+        self.db.commit()
+        return result.rowcount
+
     def get_image(self, image_id: int) -> Image:
         return self.db.query(Image).filter(Image.id == image_id).first() 
\ No newline at end of file
@@ -0,0 +1,189 @@
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tarfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from typing import List, Literal, Optional
+from sqlalchemy.orm import Session
+from ..core import config
+from ..models.label import Label
+from ..models.project import Image
+
+def _crop_image_labels(file_path: str, labels: List[tuple], image_height: Optional[int]) -> dict:
+    """Cut every label region out of one image. Runs in a worker process."""
+    from PIL import Image as PILImage
+    from ..core.image_io import open_upright
+
+    samples = []
+    try:
+        # Labels live in EXIF-upright coordinates
+        with open_upright(file_path)[0] as img:
+            for label_id, x, y, width, height, text in labels:
+                if x is None or y is None or width is None or height is None:
+                    # Text-only labels transcribe the whole image
+                    crop = img
+                else:
+                    left, top = max(0, int(round(x))), max(0, int(round(y)))
+                    right = min(img.width, int(round(x + width)))
+                    bottom = min(img.height, int(round(y + height)))
+                    if right <= left or bottom <= top:
+                        continue
+                    crop = img.crop((left, top, right, bottom))
+                if image_height:
+                    new_width = max(1, round(crop.width * image_height / crop.height))
+                    crop = crop.resize((new_width, image_height), PILImage.BILINEAR)
+                buffer = io.BytesIO()
+                crop.save(buffer, format="PNG")
+                samples.append((label_id, buffer.getvalue(), text))
+    except OSError as e:
+        return {"samples": samples, "error": f"{file_path}: {e}"}
+    return {"samples": samples, "error": None}
+
+class _LmdbWriter:
+    """Writes the key layout read by ``vietocr.loader.dataloader.OCRDataset``."""
+
+    def __init__(self, path: str, map_size: int, commit_every: int = 1000):
+        import lmdb
+        self.env = lmdb.open(path, map_size=map_size)
+        self.commit_every = commit_every
+        self.count = 0
+        self._cache = {}
+
+    def add(self, name: str, data: bytes, text: str):
+        index = self.count
+        self._cache[f"image-{index:09d}".encode()] = data
+        self._cache[f"label-{index:09d}".encode()] = text.encode("utf-8")
+        self._cache[f"path-{index:09d}".encode()] = name.encode("utf-8")
+        self.count += 1
+        if self.count % self.commit_every == 0:
+            self._flush()
+
+    def _flush(self):
+        with self.env.begin(write=True) as txn:
+            for key, value in self._cache.items():
+                txn.put(key, value)
+        self._cache = {}
+
+    def close(self):
+        self._cache[b"num-samples"] = str(self.count).encode()
+        self._flush()
+        self.env.close()
+
+class _TarShardWriter:
+    """Sharded tars of ``<split>/<key>.png`` + ``.txt`` pairs plus a VietOCR annotation file."""
+
+    def __init__(self, output_dir: str, split: str, shard_size: int):
+        self.output_dir = output_dir
+        self.split = split
+        self.shard_size = shard_size
+        self.count = 0
+        self._tar = None
+        self._annotation = open(os.path.join(output_dir, f"{split}_annotation.txt"), "w", encoding="utf-8")
+
+    def _add_member(self, name: str, data: bytes):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def add(self, name: str, data: bytes, text: str):
+        if self.count % self.shard_size == 0:
+            if self._tar is not None:
+                self._tar.close()
+            shard = self.count // self.shard_size
+            self._tar = tarfile.open(os.path.join(self.output_dir, f"{self.split}-{shard:06d}.tar"), "w")
+        self._add_member(f"{self.split}/{name}.png", data)
+        self._add_member(f"{self.split}/{name}.txt", text.encode("utf-8"))
+        self._annotation.write(f"{self.split}/{name}.png\t{text}\n")
+        self.count += 1
+
+    def close(self):
+        if self._tar is not None:
+            self._tar.close()
+        self._annotation.close()
+
+class RecognitionDatasetService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _split(self, image_id: int, val_ratio: float, seed: int) -> str:
+        # Split per image, so lines of one page never leak between train and valid
+        digest = hashlib.sha1(f"{seed}:{image_id}".encode()).digest()
+        return "valid" if int.from_bytes(digest[:4], "big") / 2**32 < val_ratio else "train"
+
+    def _tasks(self, project_id: int):
+        rows = (
+            self.db.query(Image.id, Image.file_path, Label.id, Label.x, Label.y, Label.width, Label.height, Label.text)
+            .join(Label, Label.image_id == Image.id)
+            .filter(Image.project_id == project_id, Label.text.isnot(None), Label.text != "")
+            .order_by(Image.id, Label.id)
+            .yield_per(1000)
+        )
+        for (image_id, file_path), group in groupby(rows, key=lambda row: (row[0], row[1])):
+            yield image_id, file_path, [tuple(row[2:]) for row in group]
+
+    def build_dataset(self, project_id: int, output_dir: str,
+                      format: Literal["lmdb", "tar"] = "lmdb",
+                      image_height: Optional[int] = 32,
+                      val_ratio: float = 0.1,
+                      seed: int = 0,
+                      shard_size: int = 10000,
+                      workers: Optional[int] = None) -> dict:
+        """Crop every labelled line of a project into a VietOCR recognition dataset.
+
+        Crops are produced by a process pool and written by this process as
+        they arrive, so memory stays bounded by the in-flight window.
+        """
+        if format == "lmdb":
+            try:
+                import lmdb  # noqa: F401
+            except ImportError:
+                raise ValueError("LMDB export requires the 'lmdb' package; use format=tar instead")
+            map_size = config.EXPORT_LMDB_MAP_SIZE_GB * 1024 ** 3
+            writers = {
+                split: _LmdbWriter(os.path.join(output_dir, f"{split}_lmdb"), map_size)
+                for split in ("train", "valid")
+            }
+        else:
+            writers = {split: _TarShardWriter(output_dir, split, shard_size) for split in ("train", "valid")}
+
+        workers = workers or config.EXPORT_CROP_WORKERS
+        errors = []
+        in_flight = deque()
+
+        def drain_one():
+            image_id, future = in_flight.popleft()
+            result = future.result()
+            if result["error"]:
+                errors.append(result["error"])
+            writer = writers[self._split(image_id, val_ratio, seed)]
+            for label_id, data, text in result["samples"]:
+                writer.add(f"{image_id:09d}_{label_id:09d}", data, text)
+
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                for image_id, file_path, labels in self._tasks(project_id):
+                    if len(in_flight) >= workers * 4:
+                        drain_one()
+                    in_flight.append((image_id, pool.submit(_crop_image_labels, file_path, labels, image_height)))
+                while in_flight:
+                    drain_one()
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        stats = {
+            "project_id": project_id,
+            "format": format,
+            "image_height": image_height,
+            "val_ratio": val_ratio,
+            "seed": seed,
+            "samples": {split: writer.count for split, writer in writers.items()},
+            "errors": errors,
+        }
+        with open(os.path.join(output_dir, "dataset.json"), "w", encoding="utf-8") as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+        return stats
@@ -1,33 +1,38 @@
-from functools import lru_cache
-from typing import Literal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from ..core import config, metrics
+from ..core.engine_registry import EngineName, get_engine
+from ..core.image_io import DecodedImage, ImageSource, decode_image
+from ..core.recognition_batching import recognize_batched
+
+# Called with (stage, seconds) for "decode", "detect", "crop" and "recognize"
+StageCallback = Callable[[str, float], None]
+# ((x1, y1, x2, y2), engine-specific payload) in decoded-image pixels
+Detection = Tuple[Sequence[float], Any]
 
 class TextRecognitionService:
-    def __init__(self, engine: Literal["easyocr", "paddle"] = "easyocr"):
+    def __init__(self, engine: EngineName = "easyocr", batch_size: Optional[int] = None,
+                 on_stage: Optional[StageCallback] = None, tile_min_side: Optional[int] = None):
         self.engine = engine
-        self._reader = None
-        self._detector = None
-        self._recognizer = None
-
-    @lru_cache(maxsize=1)
-    def _get_easyocr(self):
-        import easyocr
-        return easyocr.Reader(['vi'])
-
-    @lru_cache(maxsize=1)
-    def _get_paddle_detector(self):
-        from paddlex import create_model
-        return create_model("PP-OCRv4_server_det")
-
-    @lru_cache(maxsize=1)
-    def _get_vietocr_recognizer(self):
-        import torch
-        from vietocr.tool.predictor import Predictor
-        from vietocr.tool.config import Cfg
-        
-        config = Cfg.load_config_from_name('vgg_transformer')
-        config['device'] = 'cuda:0' if torch.cuda.is_available() else 'cpu'
-        config['cnn']['pretrained'] = False
-        return Predictor(config)
+        self.batch_size = batch_size or config.OCR_RECOGNIZER_BATCH_SIZE
+        self.on_stage = on_stage
+        # Longer side from which detection runs on tiles; 0 never tiles
+        self.tile_min_side = config.OCR_TILE_MIN_SIDE if tile_min_side is None else tile_min_side
+        self._handle = get_engine(engine)
+
+    @contextmanager
+    def _stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            metrics.observe_stage(self.engine, name, seconds)
+            if self.on_stage is not None:
+                self.on_stage(name, seconds)
 
     def _convert_paddle_bbox(self, bbox):
         # Convert [x1, y1, x2, y2] to [x, y, width, height]
@@ -45,61 +50,191 @@ class TextRecognitionService:
         height = max(bbox[2][1], bbox[3][1]) - y
         return x, y, width, height
 
-    def process_image(self, image_path: str):
-        if self.engine == "easyocr":
-            return self._process_with_easyocr(image_path)
-        elif self.engine == "paddle":
-            return self._process_with_paddle(image_path)
-        else:
+    def _decode(self, image: ImageSource) -> DecodedImage:
+        # PaddleX and the ONNX detector, like OpenCV, expect BGR; EasyOCR works on RGB
+        channel_order = "RGB" if self.engine == "easyocr" else "BGR"
+        with self._stage("decode"):
+            return decode_image(image, channel_order, max_pixels=config.OCR_MAX_IMAGE_PIXELS or None)
+
+    def process_image(self, image: ImageSource):
+        """Detect and recognize text in a file path, encoded bytes or an RGB ``H x W x 3`` array.
+
+        The image is decoded once; boxes are returned in upright original-image pixels.
+        """
+        if self.engine not in ("easyocr", "paddle", "onnx", "llm"):
+            raise ValueError(f"Unsupported engine: {self.engine}")
+        decoded = self._decode(image)
+        with self._handle.acquire() as models:
+            if self.engine == "easyocr":
+                return self._process_with_easyocr(models, decoded)
+            if models["detector"] is None:
+                return self._process_with_llm_page(models, decoded)
+            return self._process_with_paddle(models, decoded)
+
+    def process_images(self, images: List[ImageSource]) -> List[list]:
+        """Process several images at once, batching recognition across all of them."""
+        if self.engine not in ("easyocr", "paddle", "onnx", "llm"):
             raise ValueError(f"Unsupported engine: {self.engine}")
+        with self._handle.acquire() as models:
+            if self.engine == "easyocr":
+                return [self._process_with_easyocr(models, self._decode(image)) for image in images]
+            if models["detector"] is None:
+                return [self._process_with_llm_page(models, self._decode(image)) for image in images]
+            return self._process_many_with_paddle(models, images)
+
+    def _label(self, decoded: DecodedImage, x, y, width, height, text: str) -> dict:
+        x, y, width, height = decoded.to_original(x, y, width, height)
+        return {
+            'x': float(x),
+            'y': float(y),
+            'width': float(width),
+            'height': float(height),
+            'text': text,
+        }
+
+    def _detect_tiled(self, decoded: DecodedImage,
+                      detect_tile: Callable[..., List[Detection]]) -> Optional[List[Detection]]:
+        """Run ``detect_tile(view, left, top)`` on overlapping tiles of a large image.
+
+        Returns None for images below ``tile_min_side``. Tiles are views into
+        the decoded buffer and only boxes are kept per tile, so detector memory
+        does not grow with the image. Duplicates at the seams are suppressed;
+        lines fused from pieces come back with a None payload.
+        """
+        rows, columns = decoded.array.shape[:2]
+        if not self.tile_min_side or max(rows, columns) <= self.tile_min_side:
+            return None
+        import numpy as np
+        from ..core.tiling import cut_by_tile, merge_tile_boxes, tile_grid
+
+        tiles = tile_grid(columns, rows, config.OCR_TILE_SIZE, config.OCR_TILE_OVERLAP)
+        def run(tile):
+            left, top, right, bottom = tile
+            return detect_tile(decoded.array[top:bottom, left:right], left, top)
+
+        workers = min(config.OCR_TILE_WORKERS, len(tiles))
+        if self._handle.thread_safe and workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr-tile") as pool:
+                per_tile = list(pool.map(run, tiles))
+        else:
+            per_tile = [run(tile) for tile in tiles]
+
+        detections, cut = [], []
+        for tile, found in zip(tiles, per_tile):
+            if found:
+                detections.extend(found)
+                cut.append(cut_by_tile(np.array([box for box, _ in found], dtype=np.float64), tile, columns, rows))
+        if not detections:
+            return []
+        boxes = np.array([box for box, _ in detections], dtype=np.float64)
+        kept, merged = merge_tile_boxes(boxes, np.concatenate(cut))
+        results = []
+        for index, box in zip(kept, merged):
+            fused = not np.array_equal(box, boxes[index])
+            results.append((box.tolist(), None if fused else detections[index][1]))
+        # Reading order, like a single detector pass
+        results.sort(key=lambda result: (round(result[0][1] / 10), result[0][0]))
+        return results
+
+    def _detect_easyocr(self, reader, decoded: DecodedImage):
+        def detect(view, left: int, top: int) -> List[Detection]:
+            horizontal_list, free_list = reader.detect(view, reformat=False)
+            found = []
+            for x_min, x_max, y_min, y_max in horizontal_list[0]:
+                found.append(((x_min + left, y_min + top, x_max + left, y_max + top), None))
+            for polygon in free_list[0]:
+                points = [[x + left, y + top] for x, y in polygon]
+                xs, ys = zip(*points)
+                found.append(((min(xs), min(ys), max(xs), max(ys)), points))
+            return found
+
+        detections = self._detect_tiled(decoded, detect)
+        if detections is None:
+            horizontal_list, free_list = reader.detect(decoded.array, reformat=False)
+            return horizontal_list[0], free_list[0]
+        horizontal, free = [], []
+        for (x1, y1, x2, y2), polygon in detections:
+            if polygon is None:
+                horizontal.append([int(x1), int(x2), int(y1), int(y2)])
+            else:
+                free.append(polygon)
+        return horizontal, free
+
+    def _detect_paddle(self, detector, decoded: DecodedImage) -> List[list]:
+        def detect(view, left: int, top: int) -> List[Detection]:
+            found = []
+            for result in detector.predict(view):
+                x1, y1, x2, y2 = result['bbox']
+                found.append(((x1 + left, y1 + top, x2 + left, y2 + top), None))
+            return found
+
+        detections = self._detect_tiled(decoded, detect)
+        if detections is None:
+            return [result['bbox'] for result in detector.predict(decoded.array)]
+        return [list(box) for box, _ in detections]
+
+    def _process_with_easyocr(self, models: dict, decoded: DecodedImage):
+        import cv2
+
+        reader = models["reader"]
+        # readtext() would re-read a path twice (colour and greyscale); feed the
+        # stages it chains with the decoded buffer instead
+        with self._stage("detect"):
+            horizontal_list, free_list = self._detect_easyocr(reader, decoded)
+        # EasyOCR crops inside recognize()
+        with self._stage("recognize"):
+            grey = cv2.cvtColor(decoded.array, cv2.COLOR_RGB2GRAY)
+            results = reader.recognize(grey, horizontal_list, free_list, reformat=False)
 
-    def _process_with_easyocr(self, image_path: str):
-        reader = self._get_easyocr()
-        results = reader.readtext(image_path)
-        
         labels = []
         for bbox, text, confidence in results:
-            x, y, width, height = self._convert_easyocr_bbox(bbox)
-            labels.append({
-                'x': float(x),
-                'y': float(y),
-                'width': float(width),
-                'height': float(height),
-                'text': text,
-            })
+            labels.append(self._label(decoded, *self._convert_easyocr_bbox(bbox), text))
         return labels
 
-    def _process_with_paddle(self, image_path: str):
-        from PIL import Image
-        
-        # Lazy load models
-        if not self._detector:
-            self._detector = self._get_paddle_detector()
-        if not self._recognizer:
-            self._recognizer = self._get_vietocr_recognizer()
-
-        # Detect text regions
-        detection_results = self._detector.predict(image_path)
-        
-        # Load image for recognition
-        img = Image.open(image_path)
-        
-        labels = []
-        for bbox in detection_results:
-            # Extract and convert coordinates
-            x, y, width, height = self._convert_paddle_bbox(bbox['bbox'])
-            
-            # Crop text region
-            text_region = img.crop((x, y, x + width, y + height))
-            
-            # Recognize text
-            text = self._recognizer.predict(text_region)
-            
-            labels.append({
-                'x': float(x),
-                'y': float(y),
-                'width': float(width),
-                'height': float(height),
-                'text': text,
-            })
-        return labels 
\ No newline at end of file
+    def _process_with_llm_page(self, models: dict, decoded: DecodedImage):
+        # Without a detector the LLM finds the lines and reads them in the same request
+        with self._stage("recognize"):
+            lines = models["recognizer"].read_page(decoded.rgb(decoded.array))
+        return [self._label(decoded, *self._convert_paddle_bbox(line["bbox"]), line["text"]) for line in lines]
+
+    def _process_with_paddle(self, models: dict, decoded: DecodedImage):
+        return self._process_many_with_paddle(models, [decoded])[0]
+
+    def _process_many_with_paddle(self, models: dict, images: List):
+        detector = models["detector"]
+        recognizer = models["recognizer"]
+
+        # Detect and crop every image first so recognition can batch across all of them
+        boxes_per_image = []
+        crops = []
+        for image in images:
+            decoded = image if isinstance(image, DecodedImage) else self._decode(image)
+            # The detector reads the shared buffer; crops are views into it
+            with self._stage("detect"):
+                detected = self._detect_paddle(detector, decoded)
+
+            boxes = []
+            with self._stage("crop"):
+                for bbox in detected:
+                    x, y, width, height = self._convert_paddle_bbox(bbox)
+                    crop = decoded.crop(x, y, width, height)
+                    if crop is None:
+                        continue
+                    crops.append(decoded.rgb(crop))
+                    boxes.append((x, y, width, height))
+            boxes_per_image.append((decoded, boxes))
+
+        # The ONNX engine runs the same PP-OCRv4 + VietOCR pipeline, with its own batched decoder;
+        # the LLM engine sends the crops out in batches instead
+        recognize = recognizer.recognize if self.engine in ("onnx", "llm") else partial(recognize_batched, recognizer)
+        with self._stage("recognize"):
+            texts = iter(recognize(
+                crops,
+                max_batch_size=self.batch_size,
+                bucket_width=config.OCR_RECOGNIZER_BUCKET_WIDTH,
+            ))
+
+        results = []
+        for decoded, boxes in boxes_per_image:
+            results.append([self._label(decoded, *box, next(texts)) for box in boxes])
+        return results
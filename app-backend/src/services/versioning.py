@@ -0,0 +1,58 @@
+import hashlib
+from typing import Iterable, Optional
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from ..models.project import Image, Project
+
+# Counters are bumped inside the mutating transaction, so a version never
+# names content that was rolled back. ETags built from them can be checked
+# with a single primary-key lookup instead of reading any label rows.
+# Bumps keep updated_at as it is: a label change is not a change of the
+# image or project row, and delta exports compare updated_at.
+
+def bump_images(db: Session, image_ids: Iterable[int]):
+    """Mark the labels of these images, and their projects, as changed."""
+    image_ids = list(set(image_ids))
+    if not image_ids:
+        return
+    db.execute(
+        update(Image).where(Image.id.in_(image_ids))
+        .values(version=Image.version + 1, updated_at=Image.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    _bump_projects(db, select(Image.project_id).where(Image.id.in_(image_ids)))
+
+def bump_project_images(db: Session, project_id: int):
+    db.execute(
+        update(Image).where(Image.project_id == project_id)
+        .values(version=Image.version + 1, updated_at=Image.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    bump_projects(db, [project_id])
+
+def bump_projects(db: Session, project_ids: Iterable[int]):
+    _bump_projects(db, list(set(project_ids)))
+
+def _bump_projects(db: Session, project_ids):
+    db.execute(
+        update(Project).where(Project.id.in_(project_ids))
+        .values(version=Project.version + 1, updated_at=Project.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+
+def _etag(kind: str, row_id: int, version: int, created_at, *params) -> str:
+    # created_at tells apart rows that reuse the id of a deleted one
+    tag = f"{kind}-{row_id}-{version}-{created_at.timestamp() if created_at else 0}"
+    if params:
+        tag += "-" + hashlib.sha1(repr(params).encode()).hexdigest()[:12]
+    return f'"{tag}"'
+
+def image_etag(db: Session, image_id: int) -> Optional[str]:
+    """ETag for an image's labels; ``None`` if the image does not exist."""
+    row = db.execute(select(Image.version, Image.created_at).where(Image.id == image_id)).first()
+    return _etag("image", image_id, *row) if row else None
+
+def project_etag(db: Session, project_id: int, *params) -> Optional[str]:
+    """ETag for a view of a project's images; ``params`` distinguish pages and filters."""
+    row = db.execute(select(Project.version, Project.created_at).where(Project.id == project_id)).first()
+    return _etag("project", project_id, *row, *params) if row else None
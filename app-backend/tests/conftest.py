@@ -0,0 +1,112 @@
+"""Every test runs against a throwaway database, blob store and caches.
+
+Run from app-backend/:  python -m pytest
+"""
+import itertools
+import os
+import tempfile
+from contextlib import contextmanager
+
+_tmp = tempfile.mkdtemp()
+# Read by src.core.config at import time, so set before anything imports it
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(_tmp, 'test.db')}",
+    BLOB_DIR=os.path.join(_tmp, "blobs"),
+    PREVIEW_DIR=os.path.join(_tmp, "previews"),
+    PREVIEW_ON_UPLOAD="false",
+    OCR_CACHE_DIR=os.path.join(_tmp, "ocr-cache"),
+    LLM_CACHE_DIR=os.path.join(_tmp, "llm-cache"),
+    OCR_PRELOAD_ENGINES="",
+    OCR_WORKER_MODE="thread",
+    BULK_DETECTION_RESUME="false",
+    TRACING_ENABLED="false",
+)
+
+import pytest  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from src.database.database import SessionLocal, engine, init_db  # noqa: E402
+from src.services.project_service import ProjectService  # noqa: E402
+
+@event.listens_for(engine, "connect")
+def _enforce_foreign_keys(dbapi_connection, connection_record):
+    # As PostgreSQL always does; SQLite needs asking per connection
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+init_db()
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def project_id(db):
+    return ProjectService(db).create_project({"name": "test", "mode": "bbox"}).id
+
+@pytest.fixture
+def image_id(db, project_id):
+    return ProjectService(db).save_image({"project_id": project_id, "filename": "a.png", "file_path": "a.png"}).id
+
+@pytest.fixture
+def page(db, project_id, tmp_path):
+    """An image with a few lines of text, detected by the model-free stub engine as "onnx"."""
+    from benchmarks import stub_engine, synthetic_pages
+
+    stub_engine.install()
+    image, _ = synthetic_pages.make_page(0, width=800, height=300, lines=3)
+    path = tmp_path / "page.jpg"
+    path.write_bytes(synthetic_pages.encode(image))
+    return ProjectService(db).save_image({"project_id": project_id, "filename": "page.jpg", "file_path": str(path)})
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    from app import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+@contextmanager
+def count_statements():
+    """SQL statements sent while the block runs."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+_png_count = itertools.count()
+
+def png(color: str) -> bytes:
+    """A small PNG, different from every earlier call's: tests share one database and blob store."""
+    import io
+    from PIL import Image as PILImage
+    from PIL.PngImagePlugin import PngInfo
+
+    info = PngInfo()
+    info.add_text("n", str(next(_png_count)))
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (8, 8), color).save(buffer, "PNG", pnginfo=info)
+    return buffer.getvalue()
+
+def upload(client, project_id: int, *files) -> dict:
+    """Upload ``(filename, bytes)`` pairs through the API."""
+    response = client.post(
+        f"/api/projects/{project_id}/images/upload", files=[("files", (name, data)) for name, data in files]
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def read_zip(chunks) -> "zipfile.ZipFile":
+    import io
+    import zipfile
+
+    return zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
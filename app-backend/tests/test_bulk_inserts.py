@@ -0,0 +1,66 @@
+"""Bulk writes must stay a fixed number of statements, however many rows they carry."""
+import os
+from conftest import count_statements
+from src.core.storage import blob_path
+from src.services.label_service import LabelService
+from src.services.project_service import ProjectService
+
+def _labels(count: int, prefix: str = "t", x0: float = 0.0) -> list:
+    return [
+        {"x": x0 + i * 10.0, "y": 0.0, "width": 5.0, "height": 5.0, "text": f"{prefix}{i}"}
+        for i in range(count)
+    ]
+
+def test_create_labels_statement_count(db, image_id):
+    with count_statements() as statements:
+        created = LabelService(db).create_labels(image_id, _labels(50))
+        texts = [label.text for label in created]
+    # INSERT, the two version bumps and one reload
+    assert len(statements) == 4
+    assert texts == [f"t{i}" for i in range(50)]
+
+def test_merge_labels_statement_count(db, image_id):
+    LabelService(db).create_labels(image_id, _labels(5))
+    detections = _labels(30, "m", x0=1000.0) + _labels(5)
+    with count_statements() as statements:
+        result = LabelService(db).merge_labels(image_id, detections, iou_threshold=0.5)
+        texts = [label.text for label in result["labels"]]
+    # Image lookup, index build, INSERT, the two version bumps and one reload
+    assert len(statements) == 6
+    assert result["created"] == 30
+    assert texts == [f"m{i}" for i in range(30)] + [f"t{i}" for i in range(5)]
+
+def test_save_images_statement_count(db):
+    project_id = ProjectService(db).create_project({"name": "upload", "mode": "bbox"}).id
+    images = [{"filename": f"{i}.png", "file_path": f"uploads/{i}.png"} for i in range(100)]
+    with count_statements() as statements:
+        result = ProjectService(db).save_images(project_id, images)
+    # INSERT and the project version bump
+    assert len(statements) == 2
+    assert result["uploaded"] == 100
+    paths = [image.file_path for image in ProjectService(db).get_project_images(project_id)]
+    assert paths == [image["file_path"] for image in images]
+
+def test_save_images_ids_follow_rows_with_shared_paths(db):
+    # Content-addressed paths repeat across batches and projects
+    def upload(name: str) -> dict:
+        sha256 = name[0] * 64
+        file_path = blob_path(sha256, ".png")
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(name[0].encode())
+        return {"filename": name, "file_path": file_path, "sha256": sha256, "size": 1}
+
+    service = ProjectService(db)
+    other_id = service.create_project({"name": "other", "mode": "bbox"}).id
+    service.save_images(other_id, [upload("a0.png")])
+    project_id = service.create_project({"name": "shared", "mode": "bbox"}).id
+    result = service.save_images(project_id, [upload(name) for name in ("a1.png", "b1.png", "a2.png", "b2.png")])
+
+    ids = {image.filename: image.id for image in service.get_project_images(project_id)}
+    first_id = service.get_project_images(other_id)[0].id
+    assert [(d["image_id"], d["filename"], d["existing_image_ids"]) for d in result["duplicates"]] == [
+        (ids["a1.png"], "a1.png", [first_id]),
+        (ids["a2.png"], "a2.png", [first_id, ids["a1.png"]]),
+        (ids["b2.png"], "b2.png", [ids["b1.png"]]),
+    ]
@@ -0,0 +1,74 @@
+"""Incremental dataset exports: against an earlier manifest, or since a point in time."""
+import json
+import time
+from datetime import datetime
+from conftest import png, read_zip, upload
+
+def _export(response) -> tuple:
+    assert response.status_code == 200, response.text
+    archive = read_zip([response.content])
+    return archive, json.loads(archive.read("manifest.json"))
+
+def _image_ids(client, project_id: int) -> list:
+    return [image["id"] for image in client.get(f"/api/projects/{project_id}/images").json()]
+
+def _add_label(client, image_id: int, text: str) -> dict:
+    response = client.post(
+        "/api/labels", json={"image_id": image_id, "x": 1.0, "y": 2.0, "width": 3.0, "height": 4.0, "text": text}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_delta_against_an_earlier_manifest(client, project_id):
+    upload(client, project_id, ("a.png", png("red")), ("b.png", png("green")))
+    a, b = _image_ids(client, project_id)
+    label = _add_label(client, a, "first")
+    _, base = _export(client.get(f"/api/labels/project/{project_id}/export"))
+    assert not base["incremental"]
+
+    client.put(f"/api/labels/{label['id']}", json=dict(label, text="second"))
+    client.delete(f"/api/projects/{project_id}/images/{b}")
+    upload(client, project_id, ("c.png", png("blue")))
+    c = _image_ids(client, project_id)[-1]
+
+    archive, manifest = _export(client.post(f"/api/labels/project/{project_id}/export/delta", json=base))
+    assert manifest["changes"] == {
+        "added": [f"images/{c}_c.png", f"labels/{c}_c.txt"],
+        "modified": [f"labels/{a}_a.txt"],
+        "deleted": [f"images/{b}_b.png", f"labels/{b}_b.txt"],
+    }
+    changed = manifest["changes"]["added"] + manifest["changes"]["modified"]
+    assert sorted(archive.namelist()) == sorted(changed + ["manifest.json"])
+    assert json.loads(archive.read(f"labels/{a}_a.txt"))[0]["transcription"] == "second"
+    # The manifest still lists everything, for the next delta
+    assert set(manifest["files"]) == {
+        f"images/{a}_a.png", f"labels/{a}_a.txt", f"images/{c}_c.png", f"labels/{c}_c.txt"
+    }
+
+    archive, manifest = _export(client.post(f"/api/labels/project/{project_id}/export/delta", json=manifest))
+    assert manifest["changes"] == {"added": [], "modified": [], "deleted": []}
+    assert archive.namelist() == ["manifest.json"]
+
+def test_delta_rejects_foreign_manifests(client, project_id):
+    url = f"/api/labels/project/{project_id}/export/delta"
+    assert client.post(url, json={"version": 1}).status_code == 400
+    assert client.post(url, json={"project_id": project_id + 1, "files": {}}).status_code == 400
+
+def test_export_since(client, project_id):
+    upload(client, project_id, ("a.png", png("red")), ("b.png", png("green")))
+    a, b = _image_ids(client, project_id)
+    since = datetime.utcnow()
+    time.sleep(0.01)
+    _add_label(client, b, "new")
+    upload(client, project_id, ("c.png", png("blue")))
+    c = _image_ids(client, project_id)[-1]
+
+    response = client.get(f"/api/labels/project/{project_id}/export", params={"since": since.isoformat()})
+    archive, manifest = _export(response)
+    assert manifest["incremental"]
+    assert manifest["changes"] == {
+        "added": [f"images/{c}_c.png", f"labels/{c}_c.txt"],
+        "modified": [f"labels/{b}_b.txt"],
+        "deleted": [],
+    }
+    assert f"images/{a}_a.png" not in archive.namelist()
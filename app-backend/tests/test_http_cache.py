@@ -0,0 +1,63 @@
+"""Version counters, ETags and compression of the label and image listings."""
+import json
+import time
+from datetime import datetime
+from conftest import read_zip
+from src.models.project import Image
+from src.services.label_service import LabelService
+
+def _label(image_id: int, text: str = "t") -> dict:
+    return {"image_id": image_id, "x": 1.0, "y": 2.0, "width": 3.0, "height": 4.0, "text": text}
+
+def test_image_labels_etag_and_304(client, image_id):
+    client.post("/api/labels", json=_label(image_id))
+    first = client.get(f"/api/labels/image/{image_id}")
+    etag = first.headers["ETag"]
+
+    cached = client.get(f"/api/labels/image/{image_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+
+    client.post("/api/labels", json=_label(image_id, "second"))
+    changed = client.get(f"/api/labels/image/{image_id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert [label["text"] for label in changed.json()] == ["t", "second"]
+
+def test_project_images_etag_follows_uploads(client, db, project_id, image_id):
+    etag = client.get(f"/api/projects/{project_id}/images").headers["ETag"]
+    assert client.get(f"/api/projects/{project_id}/images", headers={"If-None-Match": etag}).status_code == 304
+    client.post("/api/labels", json=_label(image_id))
+    assert client.get(f"/api/projects/{project_id}/images", headers={"If-None-Match": etag}).status_code == 200
+
+def test_large_json_is_gzipped_and_keeps_matching(client, image_id):
+    labels = [_label(image_id, f"text {i}") for i in range(200)]
+    client.post("/api/labels/bulk", json={"image_id": image_id, "labels": labels})
+    response = client.get(f"/api/labels/image/{image_id}", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert len(response.json()) == 200
+    etag = response.headers["ETag"]
+    assert etag.endswith('-gzip"')
+    cached = client.get(
+        f"/api/labels/image/{image_id}", headers={"Accept-Encoding": "gzip", "If-None-Match": etag}
+    )
+    assert cached.status_code == 304
+
+def test_label_change_bumps_version_but_not_image_timestamp(db, image_id):
+    image = db.get(Image, image_id)
+    version, updated_at = image.version, image.updated_at
+    since = datetime.utcnow()
+    time.sleep(0.01)
+    service = LabelService(db)
+    label = service.create_label(_label(image_id))
+    service.update_label(label.id, {"text": "edited"})
+    db.refresh(image)
+    assert image.version > version
+    assert image.updated_at == updated_at
+
+    # A delta export since then carries the label file, not the unchanged image
+    chunks, _ = service.export_project_dataset(image.project_id, since=since)
+    archive = read_zip(chunks)
+    changes = json.loads(archive.read("manifest.json"))["changes"]
+    assert changes["modified"] == [f"labels/{image_id}_a.txt"]
+    assert not any(name.startswith("images/") for name in archive.namelist())
@@ -0,0 +1,65 @@
+"""Detect-text results are cached on disk by image content and engine settings."""
+import os
+from src.core.ocr_cache import OCRResultCache
+from src.core.ocr_jobs import cache_params, job_manager
+
+LABELS = [{"x": 1.0, "y": 2.0, "width": 3.0, "height": 4.0, "text": "hello"}]
+
+def test_miss_then_hit(tmp_path):
+    cache = OCRResultCache(str(tmp_path), max_bytes=1 << 20)
+    key = cache.make_key("a" * 64, {"engine": "onnx", "version": "1"})
+    assert cache.get(key) is None
+    cache.put(key, LABELS)
+    assert cache.get(key) == LABELS
+    # Any process pointing at the same directory sees the entry
+    assert OCRResultCache(str(tmp_path), max_bytes=1 << 20).get(key) == LABELS
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_key_covers_engine_settings(tmp_path):
+    cache = OCRResultCache(str(tmp_path), max_bytes=1 << 20)
+    cache.put(cache.make_key("a" * 64, {"engine": "onnx", "version": "1"}), LABELS)
+    assert cache.get(cache.make_key("a" * 64, {"engine": "onnx", "version": "2"})) is None
+    assert cache.get(cache.make_key("b" * 64, {"engine": "onnx", "version": "1"})) is None
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = OCRResultCache(str(tmp_path), max_bytes=1 << 20)
+    keys = [cache.make_key(name * 64, {}) for name in "abc"]
+    for age, key in zip((200, 100), keys):
+        cache.put(key, LABELS)
+        os.utime(cache._path(key), (age, age))
+    size = os.path.getsize(cache._path(keys[0]))
+    cache.get(keys[0])  # now the most recently used
+    # Room for two entries once trimmed to 90%; sizes vary by a byte or two with created_at
+    cache.max_bytes = int((2 * size + 20) / 0.9)
+    cache.put(keys[2], LABELS)
+    assert [cache.get(key) is not None for key in keys] == [True, False, True]
+    assert cache.evictions == 1
+
+def test_second_job_on_the_same_content_is_a_hit(page):
+    first = job_manager.submit("onnx", page.project_id, page.id, page.file_path, merge=True)
+    first.done.result(timeout=30)
+    second = job_manager.submit("onnx", page.project_id, page.id, page.file_path, merge=True)
+    second.done.result(timeout=30)
+    assert (first.status, first.cache_hit) == ("succeeded", False)
+    assert (second.status, second.cache_hit) == ("succeeded", True)
+    assert second.cache_key == first.cache_key
+    assert [label["text"] for label in second.result] == [label["text"] for label in first.result]
+
+    # Bypassing the cache runs the engine again but keeps the entry fresh
+    third = job_manager.submit("onnx", page.project_id, page.id, page.file_path, use_cache=False, merge=True)
+    third.done.result(timeout=30)
+    assert (third.status, third.cache_hit) == ("succeeded", False)
+
+def test_new_engine_version_misses(page):
+    from benchmarks import stub_engine
+
+    job_manager.submit("onnx", page.project_id, page.id, page.file_path, merge=True).done.result(timeout=30)
+    params = cache_params("onnx")
+    stub_engine.install(detect_ms=1)
+    try:
+        assert cache_params("onnx")["version"] != params["version"]
+        job = job_manager.submit("onnx", page.project_id, page.id, page.file_path, merge=True)
+        job.done.result(timeout=30)
+        assert not job.cache_hit
+    finally:
+        stub_engine.install()
@@ -0,0 +1,70 @@
+"""Hot label/image queries must not fall back to full table scans.
+
+Each service call runs while its SQL is captured; every captured statement
+is then re-run under ``EXPLAIN QUERY PLAN``. A ``SCAN labels`` or
+``SCAN images`` step means an index is missing or not usable.
+"""
+import re
+import pytest
+from sqlalchemy import event
+from src.database.database import SessionLocal, engine
+from src.models.label import Label
+from src.models.project import Image, Project
+from src.services.label_service import LabelService
+from src.services.project_service import ProjectService
+
+FULL_SCAN = re.compile(r"\bSCAN (labels|images)\b")
+
+@pytest.fixture(scope="module")
+def seeded():
+    db = SessionLocal()
+    projects = [Project(name=f"plans {i}", mode="bbox") for i in range(3)]
+    db.add_all(projects)
+    db.flush()
+    image_ids = []
+    for project in projects:
+        images = [Image(project_id=project.id, filename=f"{i}.png", file_path=f"{i}.png") for i in range(20)]
+        db.add_all(images)
+        db.flush()
+        db.add_all(Label(image_id=image.id, x=1, y=1, width=1, height=1, text="t") for image in images[:10])
+        image_ids.append([image.id for image in images])
+    project_ids = [project.id for project in projects]
+    db.commit()
+    db.close()
+    return project_ids, image_ids
+
+OPERATIONS = {
+    "get_image_labels": lambda db, p, i: LabelService(db).get_image_labels(i[0][0]),
+    "clean_image_labels": lambda db, p, i: LabelService(db).clean_image_labels(i[0][1]),
+    "count_project_labels": lambda db, p, i: LabelService(db).count_project_labels(p[0]),
+    "clean_project_labels": lambda db, p, i: LabelService(db).clean_project_labels(p[1]),
+    "get_project_images_page": lambda db, p, i: ProjectService(db).get_project_images_page(
+        p[0], limit=5, cursor=i[0][2]
+    ),
+    "get_image_summaries": lambda db, p, i: ProjectService(db).get_image_summaries(p[0], limit=5, labeled=False),
+    "get_project_stats": lambda db, p, i: ProjectService(db).get_project_stats(p[0]),
+    "move_images": lambda db, p, i: ProjectService(db).move_images(p[2], p[0], i[2][:2]),
+}
+
+@pytest.mark.parametrize("name", OPERATIONS)
+def test_no_full_scans(seeded, name):
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    db = SessionLocal()
+    try:
+        OPERATIONS[name](db, *seeded)
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", capture)
+
+    assert captured
+    with engine.connect() as conn:
+        for statement, parameters in captured:
+            details = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+            scans = [detail for detail in details if FULL_SCAN.search(detail) and "INDEX" not in detail]
+            assert not scans, f"{statement}\n{' | '.join(details)}"
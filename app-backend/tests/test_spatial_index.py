@@ -0,0 +1,100 @@
+"""Grid index over label boxes: region queries and IoU merging of detections."""
+import random
+from src.core.spatial_index import GridIndex, SpatialIndexCache, iou
+from src.services.label_service import LabelService
+
+def _label(x: float, y: float, width: float = 40.0, height: float = 20.0, text: str = "t") -> dict:
+    return {"x": x, "y": y, "width": width, "height": height, "text": text}
+
+def test_iou():
+    assert iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert iou((0, 0, 10, 10), (5, 0, 15, 10)) == 50 / 150
+    # Touching edges share no area
+    assert iou((0, 0, 10, 10), (10, 0, 20, 10)) == 0.0
+    assert iou((0, 0, 0, 0), (0, 0, 0, 0)) == 0.0
+
+def test_query_matches_brute_force():
+    generator = random.Random(0)
+    boxes = []
+    for key in range(500):
+        x, y = generator.uniform(0, 2000), generator.uniform(0, 2000)
+        boxes.append((key, (x, y, x + generator.uniform(1, 120), y + generator.uniform(1, 40))))
+    # A page-wide box lands in the large set rather than in hundreds of cells
+    boxes.append((500, (0, 0, 2000, 2000)))
+    index = GridIndex(boxes)
+    assert 500 in index._large
+
+    for _ in range(50):
+        x, y = generator.uniform(0, 2000), generator.uniform(0, 2000)
+        query = (x, y, x + generator.uniform(0, 300), y + generator.uniform(0, 300))
+        expected = [
+            key for key, box in boxes
+            if box[0] <= query[2] and box[2] >= query[0] and box[1] <= query[3] and box[3] >= query[1]
+        ]
+        assert sorted(index.query(query)) == expected
+
+def test_point_query_and_best_match():
+    index = GridIndex([(1, (0, 0, 100, 50)), (2, (10, 10, 30, 20)), (3, (200, 0, 240, 20))])
+    assert sorted(index.query((15, 15, 15, 15))) == [1, 2]
+    assert index.query((150, 100, 150, 100)) == []
+    assert index.best_match((12, 10, 30, 20)) == (2, iou((12, 10, 30, 20), (10, 10, 30, 20)))
+    assert index.best_match((500, 500, 510, 510)) == (None, 0.0)
+
+def test_cache_rebuilds_on_new_version():
+    cache = SpatialIndexCache(max_images=2)
+    builds = []
+
+    def build():
+        builds.append(1)
+        return GridIndex()
+
+    first = cache.get(1, 1, build)
+    assert cache.get(1, 1, build) is first
+    assert cache.get(1, 2, build) is not first
+    cache.get(2, 1, build)
+    cache.get(3, 1, build)  # evicts image 1
+    cache.get(1, 2, build)
+    assert len(builds) == 5
+
+def test_merge_skips_overlapping_detections(db, image_id):
+    service = LabelService(db)
+    existing = service.create_labels(image_id, [_label(0, 0, text="old")])[0]
+    result = service.merge_labels(
+        image_id,
+        [
+            _label(2, 1, text="same"),     # IoU with the label is well above 0.5
+            _label(300, 0, text="new"),
+            _label(301, 1, text="again"),  # repeats the previous detection
+        ],
+        iou_threshold=0.5,
+    )
+    assert result["created"] == 1 and result["updated"] == 0
+    new_id = result["label_ids"][1]
+    assert result["label_ids"] == [existing.id, new_id, new_id]
+    assert sorted(label.text for label in service.get_image_labels(image_id)) == ["new", "old"]
+
+    # Detecting again adds nothing, or only corrects texts when asked to
+    again = service.merge_labels(image_id, [_label(1, 0, text="fixed")], iou_threshold=0.5, update_text=True)
+    assert (again["created"], again["updated"]) == (0, 1)
+    assert sorted(label.text for label in service.get_image_labels(image_id)) == ["fixed", "new"]
+
+def test_merge_sees_labels_added_since_the_index_was_built(db, image_id):
+    service = LabelService(db)
+    service.merge_labels(image_id, [_label(0, 0)], iou_threshold=0.5)
+    service.create_label(dict(_label(500, 0, text="manual"), image_id=image_id))
+    result = service.merge_labels(image_id, [_label(501, 0)], iou_threshold=0.5)
+    assert result["created"] == 0
+
+def test_region_endpoint(client, db, image_id):
+    service = LabelService(db)
+    outer, inner, far = service.create_labels(image_id, [
+        _label(0, 0, 200, 100, "outer"), _label(10, 10, 20, 10, "inner"), _label(900, 900, 10, 10, "far"),
+    ])
+    under_point = client.get(f"/api/labels/image/{image_id}/region", params={"x": 15, "y": 15}).json()
+    # Smallest first: under a cursor the innermost box is usually meant
+    assert [label["id"] for label in under_point] == [inner.id, outer.id]
+    url = f"/api/labels/image/{image_id}/region"
+    region = client.get(url, params={"x": 850, "y": 850, "width": 100, "height": 100}).json()
+    assert [label["id"] for label in region] == [far.id]
+    assert client.get(url, params={"x": 0, "y": 0, "width": -1}).status_code == 400
+    assert client.get("/api/labels/image/999999/region", params={"x": 0, "y": 0}).status_code == 404
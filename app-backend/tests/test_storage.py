@@ -0,0 +1,79 @@
+"""Content-addressed storage: deduplication, reference counts and deletion."""
+import io
+import os
+import pytest
+from conftest import png, upload
+from src.core import config
+from src.core.storage import store_upload
+from src.models.blob import Blob
+from src.models.detection_run import DetectionRun, DetectionRunItem
+from src.services.blob_service import BlobService
+from src.services.project_service import ProjectService
+
+def test_delete_image_of_a_bulk_run(db, project_id, image_id):
+    run = DetectionRun(project_id=project_id, engine="onnx", total=1)
+    db.add(run)
+    db.flush()
+    db.add(DetectionRunItem(run_id=run.id, image_id=image_id))
+    db.commit()
+    service = ProjectService(db)
+    service.delete_image(service.get_image(image_id))
+    assert service.get_image(image_id) is None
+    assert db.query(DetectionRunItem).filter(DetectionRunItem.run_id == run.id).count() == 0
+
+def test_identical_uploads_share_one_blob(client, db, project_id):
+    red = png("red")
+    first = upload(client, project_id, ("a.png", red))
+    second = upload(client, project_id, ("b.png", red), ("c.png", red))
+    assert first["duplicates"] == []
+    assert [d["filename"] for d in second["duplicates"]] == ["b.png", "c.png"]
+    images = ProjectService(db).get_project_images(project_id)
+    assert len({image.file_path for image in images}) == 1
+    blob = db.get(Blob, images[0].blob_sha256)
+    assert blob.ref_count == 3
+
+def test_reused_file_survives_release_before_commit(db, project_id, monkeypatch):
+    data = png("green")
+    service = ProjectService(db)
+    service.save_images(project_id, store_upload(io.BytesIO(data), "a.png"))
+    original = service.get_project_images(project_id)[0]
+    monkeypatch.setattr(config, "BLOB_GRACE_SECONDS", 3600)
+
+    # A second upload has stored the bytes but not committed yet, when the last image goes
+    stored = store_upload(io.BytesIO(data), "b.png")
+    service.delete_image(original)
+    assert os.path.exists(stored[0]["file_path"])
+
+    service.save_images(project_id, stored)
+    image = service.get_project_images(project_id)[0]
+    assert os.path.exists(image.file_path)
+    assert db.get(Blob, image.blob_sha256).ref_count == 1
+
+def test_missing_blob_file_is_restored_or_refused(db, project_id):
+    data = png("blue")
+    service = ProjectService(db)
+    stored = store_upload(io.BytesIO(data), "a.png")
+    service.save_images(project_id, stored)
+    canonical = stored[0]["file_path"]
+
+    # Same bytes under another extension bring the canonical file back
+    os.remove(canonical)
+    service.save_images(project_id, store_upload(io.BytesIO(data), "b.jpg"))
+    assert os.path.exists(canonical)
+
+    os.remove(canonical)
+    with pytest.raises(ValueError):
+        service.save_images(project_id, [dict(stored[0])])
+
+def test_gc_sweeps_orphans_after_the_grace_period(db, project_id, monkeypatch):
+    orphan = store_upload(io.BytesIO(png("yellow")), "orphan.png")[0]["file_path"]
+    live = store_upload(io.BytesIO(png("purple")), "live.png")
+    ProjectService(db).save_images(project_id, live)
+
+    BlobService(db).collect_garbage()
+    assert os.path.exists(orphan)
+    monkeypatch.setattr(config, "BLOB_GRACE_SECONDS", 0)
+    # Other tests may have left orphans of their own in the shared store
+    assert BlobService(db).collect_garbage()["removed_orphan_files"] >= 1
+    assert not os.path.exists(orphan)
+    assert os.path.exists(live[0]["file_path"])
@@ -0,0 +1,62 @@
+"""Detection on overlapping tiles of large images, and merging the boxes back across seams."""
+import numpy as np
+from src.core import config
+from src.core.tiling import cut_by_tile, merge_tile_boxes, tile_grid
+
+def test_tile_grid_covers_the_image_with_overlap():
+    tiles = tile_grid(1000, 700, tile_size=400, overlap=64)
+    covered = np.zeros((700, 1000), dtype=bool)
+    for left, top, right, bottom in tiles:
+        assert right - left <= 400 and bottom - top <= 400
+        covered[top:bottom, left:right] = True
+    assert covered.all()
+
+    lefts = sorted({tile[0] for tile in tiles})
+    rights = sorted({tile[2] for tile in tiles})
+    assert all(right - left >= 64 for left, right in zip(lefts[1:], rights[:-1]))
+    assert tile_grid(300, 200, tile_size=400, overlap=64) == [(0, 0, 300, 200)]
+
+def test_only_inner_tile_edges_cut_boxes():
+    boxes = np.array([
+        [0, 10, 50, 30],      # on the image border
+        [150, 10, 200, 30],   # touches the tile's right edge, inside the image
+        [60, 10, 100, 30],    # well inside
+    ], dtype=np.float64)
+    assert cut_by_tile(boxes, (0, 0, 200, 100), width=400, height=100).tolist() == [False, True, False]
+
+def test_cut_copy_in_the_overlap_is_suppressed():
+    whole = [300, 10, 420, 30]
+    cut_copy = [300, 10, 350, 30]  # the same word, cut off by the right edge of the first tile
+    kept, merged = merge_tile_boxes(np.array([cut_copy, whole]), np.array([True, False]))
+    assert kept == [1]
+    assert merged.tolist() == [whole]
+
+def test_line_no_tile_saw_whole_is_fused():
+    # A long line spanning a seam: each tile only has a cut piece of it
+    left_piece = [100, 10, 350, 30]
+    right_piece = [300, 11, 600, 31]
+    other_line = [100, 60, 600, 80]
+    kept, merged = merge_tile_boxes(
+        np.array([left_piece, right_piece, other_line]), np.array([True, True, False])
+    )
+    assert sorted(kept) == [1, 2]
+    assert sorted(merged.tolist()) == [[100, 10, 600, 31], other_line]
+
+def test_zero_area_boxes_suppress_nothing():
+    boxes = np.array([[5, 0, 5, 10], [0, 0, 20, 10], [0, 40, 20, 40]], dtype=np.float64)
+    kept, _ = merge_tile_boxes(boxes, np.array([False, True, False]))
+    assert sorted(kept) == [0, 1, 2]
+
+def test_tiled_detection_matches_whole_image(page, monkeypatch):
+    from src.services.text_recognition_service import TextRecognitionService
+
+    def boxes(labels):
+        return [(round(l["x"]), round(l["y"]), round(l["width"]), round(l["height"])) for l in labels]
+
+    whole = TextRecognitionService(engine="onnx", tile_min_side=0).process_image(page.file_path)
+    # Tiles narrower than the text lines, so every line crosses a seam
+    monkeypatch.setattr(config, "OCR_TILE_SIZE", 240)
+    monkeypatch.setattr(config, "OCR_TILE_OVERLAP", 48)
+    tiled = TextRecognitionService(engine="onnx", tile_min_side=100).process_image(page.file_path)
+    assert len(whole) == 3
+    assert boxes(tiled) == boxes(whole)
@@ -0,0 +1,110 @@
+"""Job and bulk-run state lives in the database, so every server worker can serve it."""
+import os
+import socket
+import subprocess
+import sys
+import time
+from src.core.bulk_detection import RunEventPoller, bulk_detection
+from src.core.ocr_jobs import _run_detection, job_manager
+from src.models.detection_run import DetectionRun, DetectionRunItem
+from src.models.ocr_job import OCRJobRecord
+
+def _other_worker() -> str:
+    # Alive, on this host, and not us
+    return f"{socket.gethostname()}:{os.getppid()}"
+
+def _dead_worker() -> str:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return f"{socket.gethostname()}:{process.pid}"
+
+def _job(db, owner: str, status: str = "queued") -> str:
+    job_id = f"job-{time.monotonic_ns()}"
+    db.add(OCRJobRecord(
+        id=job_id, engine="onnx", project_id=1, image_id=1, status=status, owner=owner, created_at=time.time()
+    ))
+    db.commit()
+    return job_id
+
+def _run(db, image, driver=None) -> int:
+    run = DetectionRun(
+        project_id=image.project_id, engine="onnx", scope="all", total=1,
+        driver=driver, heartbeat_at=time.time() if driver else None,
+    )
+    db.add(run)
+    db.flush()
+    db.add(DetectionRunItem(run_id=run.id, image_id=image.id))
+    db.commit()
+    return run.id
+
+def test_finished_job_is_served_from_the_database(client, page):
+    job = job_manager.submit("onnx", page.project_id, page.id, page.file_path, use_cache=False)
+    job.done.result(timeout=30)
+    assert job.status == "succeeded" and job.result
+    assert job.id not in job_manager._jobs
+
+    assert client.get(f"/api/jobs/{job.id}").json()["status"] == "succeeded"
+    assert job.id in [listed["job_id"] for listed in client.get("/api/jobs").json()]
+    result = client.get(f"/api/jobs/{job.id}/result").json()
+    assert [label["text"] for label in result] == [label["text"] for label in job.result]
+
+def test_job_queued_on_another_worker_can_be_cancelled(client, db):
+    job_id = _job(db, _other_worker())
+    assert client.delete(f"/api/jobs/{job_id}").json()["status"] == "cancelled"
+    # The other worker drops it when it comes up
+    assert _run_detection("onnx", "missing.png", job_id)["cancelled"]
+
+def test_job_running_on_another_worker_is_flagged(client, db):
+    job_id = _job(db, _other_worker(), status="running")
+    assert client.delete(f"/api/jobs/{job_id}").json()["status"] == "running"
+    assert db.get(OCRJobRecord, job_id).cancel_requested
+
+def test_job_of_a_dead_worker_fails(client, db):
+    job_id = _job(db, _dead_worker(), status="running")
+    job = client.get(f"/api/jobs/{job_id}").json()
+    assert job["status"] == "failed"
+    assert client.get(f"/api/jobs/{job_id}/result").status_code == 409
+
+def test_cancel_run_of_another_worker(client, db, page):
+    run_id = _run(db, page, driver=_other_worker())
+    response = client.delete(f"/api/projects/{page.project_id}/detect-text/runs/{run_id}")
+    assert response.status_code == 200
+    run = db.get(DetectionRun, run_id)
+    db.refresh(run)
+    # Left for its worker to wind down
+    assert (run.status, run.cancel_requested) == ("running", True)
+
+def test_cancel_run_nobody_processes(client, db, page):
+    run_id = _run(db, page, driver=_dead_worker())
+    assert client.delete(f"/api/projects/{page.project_id}/detect-text/runs/{run_id}").status_code == 200
+    assert client.get(f"/api/projects/{page.project_id}/detect-text/runs/{run_id}").json()["status"] == "cancelled"
+    assert client.delete(f"/api/projects/{page.project_id}/detect-text/runs/{run_id}").status_code == 409
+
+def test_run_is_taken_over_only_from_dead_workers(db, page):
+    run_id = _run(db, page, driver=_other_worker())
+    assert not bulk_detection.start(run_id)
+
+    run = db.get(DetectionRun, run_id)
+    run.driver = _dead_worker()
+    db.commit()
+    assert bulk_detection.start(run_id)
+    bulk_detection._states[run_id].thread.join(timeout=30)
+    db.refresh(run)
+    assert (run.status, run.succeeded, run.driver) == ("completed", 1, None)
+
+def test_events_of_a_run_on_another_worker(db, page):
+    run_id = _run(db, page, driver=_other_worker())
+    poller = RunEventPoller(run_id)
+    assert poller.poll() == []
+
+    run = db.get(DetectionRun, run_id)
+    run.items[0].status = "succeeded"
+    run.items[0].label_count = 3
+    run.succeeded = 1
+    db.commit()
+    events = poller.poll()
+    assert [(event["type"], event["image_id"], event["labels"]) for event in events] == [("image", page.id, 3)]
+
+    run.status = "completed"
+    db.commit()
+    assert [event["type"] for event in poller.poll()] == ["done"]